@@ -38,6 +38,122 @@ class TestSessionManager(unittest.TestCase):
         self.assertEqual(session.active_editor, self.test_file)
         self.assertFalse(session.showid[self.test_file])
 
+    def _write_session(self, files, active):
+        with open('session_state.json', 'w') as f:
+            json.dump({"files": files, "active_editor": active, "showid": {}}, f)
+
+    def test_lazy_restore(self):
+        # 延迟恢复只登记文件，切换到该文件时才解析
+        self._write_session([self.test_file], self.test_file)
+        session = SessionManager(restore_mode="lazy")
+        editor = session.editors[self.test_file]
+        self.assertFalse(editor.is_loaded())
+        self.assertEqual(session.modified_files, set())
+        session.edit_switch(self.test_file)
+        self.assertTrue(editor.is_loaded())
+        self.assertIn('h1', editor.document.get_element_ids())
+
+    def test_parallel_restore(self):
+        # 并行恢复得到的文档与逐个解析的结果一致
+        with open('second.html', 'w') as f:
+            f.write('<html><body><ul id="list"><li id="a">A</li><li id="b">B</li></ul></body></html>')
+        self._write_session([self.test_file, 'second.html', 'missing.html'], 'second.html')
+        eager = SessionManager(restore_mode="eager")
+        parallel = SessionManager(restore_mode="parallel")
+        self.assertEqual(list(parallel.editors), list(eager.editors))
+        for filename in eager.editors:
+            self.assertEqual(parallel.editors[filename].document._to_html_string(),
+                             eager.editors[filename].document._to_html_string())
+        self.assertEqual(parallel.active_editor, 'second.html')
+        self.assertTrue(parallel.editors['second.html'].document.whether_exists_id('b'))
+
+    def test_tree_cache(self):
+        # 未修改的文件第二次打开时读取缓存，不再解析；文件变化后缓存失效
+        with open(self.test_file, 'w') as f:
+            f.write('<html><head><title>Test</title></head><body><h1>Test</h1><p id="p">Same text</p>'
+                    '<div id="d"><p id="q">Same text</p></div></body></html>')
+        first = SessionManager()
+        first.load_editor(self.test_file)
+        expected = first.editors[self.test_file].document._to_html_string()
+        with patch('model.html_editor.NativeTreeBuilder') as builder:
+            second = SessionManager()
+            second.load_editor(self.test_file)
+            builder.assert_not_called()
+        document = second.editors[self.test_file].document
+        self.assertEqual(document._to_html_string(), expected)
+        self.assertEqual(document.get_element_content('q'), 'Same text')
+        with open(self.test_file, 'w') as f:
+            f.write('<html><body><p id="new">Changed file</p></body></html>')
+        third = SessionManager()
+        third.load_editor(self.test_file)
+        self.assertEqual(third.editors[self.test_file].document.get_element_content('new'), 'Changed file')
+
+    def test_native_loader_matches_bs4(self):
+        # HTMLParser直接建树的结果（id、标签、文本、结构、标题）与BeautifulSoup加载器一致
+        from model.html_editor import parse_html_file
+        with open('tricky.html', 'w') as f:
+            f.write('<!DOCTYPE html><div><title> T&amp;itle </title></div><html id=""><body>\n'
+                    '<p id="a">one<br>two</p><p id="b"><b> bold &#150; </b></p><p><!-- note --></p>'
+                    '<img id="i"></img><br/><span id="s">x<p>inner</span>tail</p>'
+                    '<pre>  \n</pre><ul><li id="l">&bogus; &#x41;<li>open</ul></body></html><p>after</p>')
+
+        def signature(parsed):
+            title, root, index = parsed
+            nodes, stack = [], [root]
+            while stack:
+                element = stack.pop()
+                nodes.append((element.tag, element.id, element.content, len(element.children)))
+                stack.extend(reversed(element.children))
+            return title, nodes, {key: [element.tag for element in bucket] for key, bucket in index.items()}
+
+        native = signature(parse_html_file('tricky.html'))
+        self.assertEqual(native, signature(parse_html_file('tricky.html', loader='bs4')))
+        self.assertEqual(native[0], ' T&itle ')
+        self.assertIn(('b', 'b', 'bold \u2013', 0), native[1])
+        self.assertIn(('p', 'p', 'note', 0), native[1])
+        self.assertIn(('li', 'li', 'open', 0), native[1])
+
+    def test_traversal_orders(self):
+        # 先序、后序和进入/离开事件的顺序
+        from model.traversal import preorder, postorder, walk, ENTER
+        self.session.load_editor(self.test_file)
+        html = self.session.editors[self.test_file].document.html
+        self.assertEqual([e.id for e in preorder(html)], ['html', 'head', 'title', 'body', 'h1'])
+        self.assertEqual([e.id for e in postorder(html)], ['title', 'head', 'h1', 'body', 'html'])
+        events = [('+' if event == ENTER else '-') + e.id + str(depth) for event, e, depth, _ in walk(html)]
+        self.assertEqual(events, ['+html0', '+head1', '+title2', '-title2', '-head1', '+body1', '+h12', '-h12', '-body1', '-html0'])
+
+    def test_deep_document(self):
+        # 10万层嵌套的文档：读取、查找、删除、撤销、保存都不依赖递归
+        depth = 100000
+        with open('deep.html', 'w') as f:
+            f.write('<html><body>' + ''.join(f'<div id="d{i}">' for i in range(depth)) + 'leaf'
+                    + '</div>' * depth + '</body></html>')
+        self.session.load_editor('deep.html')
+        editor = self.session.editors['deep.html']
+        document = editor.document
+        self.assertEqual(document.get_element_content(f'd{depth - 1}'), 'leaf')
+        ids = []
+        document.html.collect_ids(ids)
+        self.assertEqual(len(ids), depth + 2)
+        self.assertIs(document.html.find_element_by_id('d500'), document.get_element('d500'))
+        editor.delete_element('d10')
+        self.assertFalse(document.whether_exists_id(f'd{depth - 1}'))
+        editor.undo()
+        self.assertTrue(document.whether_exists_id(f'd{depth - 1}'))
+        self.assertTrue(editor.save('deep_copy.html'))
+        with open('deep_copy.html') as f:
+            self.assertEqual(f.read().count('<div'), depth)
+        editor.delete_element('d3000')
+        with patch('builtins.print') as mock_print:
+            editor.print_tree()
+            editor.print_indent(1)
+        # 剩下html、body和d0~d2999，每个元素都沿唯一子元素链得到文本leaf：树格式每个元素两行，缩进格式开始和结束各一行
+        # 每种格式的全部输出一次打印
+        self.assertEqual(mock_print.call_count, 2)
+        lines = ''.join(call.args[0] for call in mock_print.call_args_list).splitlines()
+        self.assertEqual(len(lines), 3002 * 2 + 3002 * 2)
+
     def test_load_editor(self):
         # 加载一个新的编辑器
         new_file = 'new_test.html'
@@ -58,6 +174,63 @@ class TestSessionManager(unittest.TestCase):
             content = f.read()
         self.assertIn('<head id="head">Modified Test', content)
 
+    def test_save_as_keeps_modified(self):
+        # 另存为其他文件不把文档记为已保存；新文件的权限按umask
+        import stat
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        with patch('builtins.print'):
+            editor.add_into('body', 'p1', 'text', 'p')
+            self.assertTrue(editor.save('copy.html'))
+            self.assertTrue(editor.document.is_modified())
+            self.assertTrue(editor.save(os.path.join('.', self.test_file)))
+            self.assertFalse(editor.document.is_modified())
+        umask = os.umask(0o022)
+        os.umask(umask)
+        self.assertEqual(stat.S_IMODE(os.stat('copy.html').st_mode), 0o666 & ~umask)
+
+    def test_save_format(self):
+        # 流式保存的输出格式与原先的字符串拼接一致，pretty模式按层级缩进
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.add_into('body', 'p1', 'Text', 'p')
+        editor.save('plain.html')
+        editor.save('pretty.html', pretty=True)
+        with open('plain.html') as f:
+            self.assertEqual(f.read(), '<!DOCTYPE html>\n<html id="html"><head id="head">Test<title id="title">Test</title></head>\n'
+                             '<body id="body">Test<h1 id="h1">Test</h1>\n<p id="p1">Text</p></body></html>')
+        with open('pretty.html') as f:
+            self.assertEqual(f.read(), '<!DOCTYPE html>\n<html id="html">\n  <head id="head">\n    Test\n'
+                             '    <title id="title">Test</title>\n  </head>\n  <body id="body">\n    Test\n'
+                             '    <h1 id="h1">Test</h1>\n    <p id="p1">Text</p>\n  </body>\n</html>\n')
+
+    def test_modified_after_undo(self):
+        # 撤销回读入时的状态后文件不再视为已修改
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        self.assertNotIn(self.test_file, self.session.modified_files)
+        editor.edit_element_content('h1', 'Changed')
+        self.assertIn(self.test_file, self.session.modified_files)
+        editor.undo()
+        self.assertNotIn(self.test_file, self.session.modified_files)
+
+    def test_save_all(self):
+        # save-all只写入内容有变化的文件，写入后不留下临时文件
+        other = 'other.html'
+        with open(other, 'w') as f:
+            f.write('<html><body><p id="p1">Other</p></body></html>')
+        self.session.load_editor(self.test_file)
+        self.session.load_editor(other)
+        self.session.editors[other].edit_element_content('p1', 'Changed')
+        saved = self.session.save_all()
+        self.assertEqual(saved, [other])
+        with open(other) as f:
+            self.assertIn('<p id="p1">Changed</p>', f.read())
+        with open(self.test_file) as f:
+            self.assertTrue(f.read().startswith('<html>'))
+        self.assertFalse([name for name in os.listdir('.') if name.endswith('.tmp')])
+        self.assertEqual(self.session.save_all(), [])
+
     def test_close_editor(self):
         # 关闭编辑器
         self.session.load_editor(self.test_file)
@@ -87,6 +260,55 @@ class TestSessionManager(unittest.TestCase):
             self.session.dir_display(style="tree")
             mock_print.assert_called()
 
+    def test_dir_display_rules(self):
+        # 按名字排序、一次输出；默认不显示以.开头的文件和.gitignore忽略的文件，-a全部显示，-d限制层数
+        for path in ['a/b/c/deep.txt', 'node_modules/x.js', 'build/out.txt', 'sub/a.txt', 'sub/b.html', 'x.log', 'keep.log', '.hidden']:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            open(path, 'w').close()
+        with open('.gitignore', 'w') as f:
+            f.write('# comment\n*.log\n!keep.log\nbuild/\n')
+        with open('sub/.gitignore', 'w') as f:
+            f.write('*.txt\n')
+        with patch('builtins.print') as mock_print:
+            self.session.load_editor(self.test_file)
+            mock_print.reset_mock()
+            self.assertTrue(self.session.execute('dir-tree'))
+        self.assertEqual(mock_print.call_count, 1)
+        self.assertEqual(mock_print.call_args.args[0].splitlines(), [
+            '├── a', '│   └── b', '│       └── c', '│           └── deep.txt',
+            '├── keep.log', '├── sub', '│   └── b.html', '└── test.html *'])
+        with patch('builtins.print') as mock_print:
+            self.assertTrue(self.session.execute('dir-indent -a -d 1'))
+        lines = mock_print.call_args.args[0].splitlines()
+        self.assertEqual(lines, sorted(lines))
+        for name in ['.gitignore', '.hidden', 'build', 'node_modules', 'x.log', 'test.html *']:
+            self.assertIn(name, lines)
+        self.assertFalse(any(line.startswith(' ') for line in lines))
+        with patch('builtins.print') as mock_print:
+            self.assertTrue(self.session.execute('dir-indent -d 2 sub'))
+            self.assertFalse(self.session.execute('dir-tree -d x'))
+        self.assertEqual(mock_print.call_args_list[0].args[0], 'b.html')
+
+    def test_dir_cache(self):
+        # 目录的mtime不变时直接使用缓存的内容，目录内容变化后重新读取
+        from model.dir_walker import DirectoryCache
+        os.makedirs('d/e')
+        old = os.stat('.').st_mtime - 100
+        for path in ['d/e', 'd', '.']:
+            os.utime(path, (old, old))
+        cache = DirectoryCache()
+        with patch('builtins.print') as mock_print:
+            FileManager.display_directory('tree', cache=cache)
+            first = mock_print.call_args.args[0]
+            self.assertEqual(cache.hits, 0)
+            FileManager.display_directory('tree', cache=cache)
+            self.assertEqual(cache.hits, 3)
+            self.assertEqual(mock_print.call_args.args[0], first)
+            open('d/new.html', 'w').close()
+            FileManager.display_directory('tree', cache=cache)
+        self.assertIn('new.html', mock_print.call_args.args[0])
+        self.assertEqual(cache.hits, 5)
+
     def test_insert_element(self):
         # 插入元素
         self.session.load_editor(self.test_file)
@@ -123,6 +345,77 @@ class TestSessionManager(unittest.TestCase):
         editor.delete_element('h1')
         self.assertNotIn('h1', editor.document.get_element_ids())
 
+    def test_delete_subtree_ids(self):
+        # 删除元素时其子树的id一并从索引中移除
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.add_into('body', 'list', '', 'ul')
+        editor.add_into('list', 'item1', 'Item 1', 'li')
+        editor.delete_element('list')
+        self.assertFalse(editor.document.whether_exists_id('list'))
+        self.assertFalse(editor.document.whether_exists_id('item1'))
+
+    def test_duplicate_ids(self):
+        # 未声明id的元素以标签名为id，删除其中一个后其余的仍可查找
+        with open('dup.html', 'w') as f:
+            f.write('<html><body><p>First</p><p>Second</p></body></html>')
+        self.session.load_editor('dup.html')
+        document = self.session.editors['dup.html'].document
+        self.assertEqual(document.get_element_content('p'), 'First')
+        document.delete_element('p')
+        self.assertTrue(document.whether_exists_id('p'))
+        self.assertEqual(document.get_element_content('p'), 'Second')
+        # 撤销删除后元素按文档顺序回到索引中，查找的仍是第一个
+        with open('dup2.html', 'w') as f:
+            f.write('<html><body><p>First</p><p>Second</p></body></html>')
+        self.session.load_editor('dup2.html')
+        editor = self.session.editors['dup2.html']
+        document = editor.document
+        with patch('builtins.print'):
+            editor.delete_element('p')
+            self.assertEqual(document.get_element_content('p'), 'Second')
+            editor.undo()
+        self.assertEqual([element.content for element in document.get_elements('p')], ['First', 'Second'])
+        self.assertEqual(document.get_element_content('p'), 'First')
+
+    def test_duplicate_ids_large_subtree(self):
+        # 撤销删除一个含大量同名元素的容器：整段放回索引，只比较少数几个元素的位置
+        import model.html_document as html_document
+        paragraphs = ''.join('<p>Item %d</p>' % i for i in range(2000))
+        with open('dup3.html', 'w') as f:
+            f.write('<html><body><p>Before</p><div id="box">%s</div><p>After</p></body></html>' % paragraphs)
+        self.session.load_editor('dup3.html')
+        editor = self.session.editors['dup3.html']
+        document = editor.document
+        expected = list(document.get_elements('p'))
+        self.assertEqual(len(expected), 2002)
+        with patch('builtins.print'):
+            editor.delete_element('box')
+            self.assertEqual([element.content for element in document.get_elements('p')], ['Before', 'After'])
+            with patch.object(html_document, 'tree_path', wraps=html_document.tree_path) as tree_path:
+                editor.undo()
+        self.assertLess(tree_path.call_count, 20)
+        self.assertTrue(all(a is b for a, b in zip(document.get_elements('p'), expected)))
+        self.assertEqual(len(document.get_elements('p')), 2002)
+
+    def test_compact_elements(self):
+        # 元素没有__dict__，叶子元素共用空子元素序列，同名标签共用一个字符串
+        from model.html_element import NO_CHILDREN
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.add_into('body', 'p1', 'One', 'p')
+        editor.add_into('body', 'p2', 'Two', 'p')
+        document = editor.document
+        first, second = document.get_element('p1'), document.get_element('p2')
+        self.assertFalse(hasattr(first, '__dict__'))
+        self.assertIs(first.children, NO_CHILDREN)
+        self.assertIs(first.tag, second.tag)
+        editor.add_into('p1', 'inner', 'Inner', 'span')
+        self.assertEqual([child.id for child in first.children], ['inner'])
+        editor.undo()
+        self.assertIs(first.children, NO_CHILDREN)
+        self.assertIn('<p id="p1">One</p>', document._to_html_string())
+
     def test_undo_redo(self):
         # 撤销和重做
         self.session.load_editor(self.test_file)
@@ -133,6 +426,41 @@ class TestSessionManager(unittest.TestCase):
         editor.redo()
         self.assertIn('Modified Content', editor.document.get_element_content('h1'))
 
+    def test_undo_redo_delete_restores_position(self):
+        # 撤销删除后元素回到原位置，重做后再次被删除
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.add_into('body', 'p1', 'Second', 'p')
+        original = editor.document._to_html_string()
+        editor.delete_element('h1')
+        editor.undo()
+        self.assertEqual(editor.document._to_html_string(), original)
+        self.assertTrue(editor.document.whether_exists_id('h1'))
+        editor.redo()
+        self.assertNotIn('h1', editor.document.get_element_ids())
+
+    def test_undo_insert_and_edit_id(self):
+        # 撤销插入和修改id，索引同步恢复
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.insert_before('h1', 'intro', 'Intro', 'p')
+        editor.edit_element_id('intro', 'lead')
+        editor.undo()
+        self.assertIn('intro', editor.document.get_element_ids())
+        self.assertNotIn('lead', editor.document.get_element_ids())
+        editor.undo()
+        self.assertNotIn('intro', editor.document.get_element_ids())
+        editor.redo()
+        editor.redo()
+        self.assertEqual(editor.document.get_element_content('lead'), 'Intro')
+
+    def test_failed_edit_not_recorded(self):
+        # 失败的编辑不进入撤销历史
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.edit_element_content('missing', 'text')
+        self.assertEqual(len(editor.history), 0)
+
     def test_spell_check(self):
         self.session.load_editor(self.test_file)
         editor = self.session.editors[self.test_file]
@@ -141,6 +469,792 @@ class TestSessionManager(unittest.TestCase):
             editor.check_spelling()
             mock_check.assert_called()
 
+    def test_spell_check_load_failure(self):
+        # 只有词典加载失败报告为无法加载拼写检查器，其他错误不被掩盖
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        service = editor.spell_service
+        with patch('builtins.print') as mock_print, patch.object(service, 'get_checker', side_effect=ImportError('no module')):
+            self.assertEqual(editor.document.check_spelling(service), {})
+        self.assertIn('Failed to load spell checker: no module', mock_print.call_args_list[-1].args[0])
+        with patch('builtins.print'), patch.object(service, 'find_unknown', side_effect=KeyError('bug')):
+            with self.assertRaises(KeyError):
+                editor.document.check_spelling(service)
+
+    def test_spell_checker_shared(self):
+        # 同一会话的编辑器共享拼写检查服务，文档本身不持有词典
+        from model.spell_service import SpellService
+        self.session.load_editor(self.test_file)
+        self.session.load_editor('other.html')
+        first = self.session.editors[self.test_file]
+        second = self.session.editors['other.html']
+        self.assertIs(first.spell_service, second.spell_service)
+        self.assertFalse(hasattr(first.document, 'spell_checker'))
+        with patch('builtins.print'):
+            first.check_spelling()
+            second.check_spelling()
+        key = self.session.spell_service.key()
+        self.assertIs(SpellService._checkers[key], second.spell_service.get_checker())
+
+    def test_spell_check_report_and_cache(self):
+        # 拼写检查按单词去重并给出出现位置，候选词只计算一次并在多次检查间复用
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.add_into('body', 'p1', 'Helo, world.', 'p')
+        editor.add_into('body', 'p2', 'helo again', 'p')
+        checker_class = type(editor.spell_service.get_checker())
+        original = checker_class.candidates
+        with patch('builtins.print'), patch.object(checker_class, 'candidates', autospec=True, side_effect=original) as candidates:
+            errors = editor.document.check_spelling(editor.spell_service)
+            editor.document.check_spelling(editor.spell_service)
+        self.assertEqual(list(errors), ['helo'])
+        self.assertEqual(errors['helo'][1], ['p1', 'p2'])
+        self.assertEqual(candidates.call_count, 1)
+
+    def test_incremental_spell_check(self):
+        # 再次检查只处理修改过的元素，其余元素沿用缓存结果
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.add_into('body', 'p1', 'Helo world', 'p')
+        editor.add_into('body', 'p2', 'Goodbye wrld', 'p')
+        service = editor.spell_service
+        with patch('builtins.print'):
+            editor.document.check_spelling(service)
+            editor.edit_element_content('p2', 'Goodbye world')
+            with patch.object(service, 'find_unknown', wraps=service.find_unknown) as find_unknown:
+                errors = editor.document.check_spelling(service)
+        checked = list(find_unknown.call_args[0][0])
+        self.assertEqual([element.id for element in checked], ['p2'])
+        self.assertEqual(list(errors), ['helo'])
+        with patch('builtins.print'):
+            editor.undo()
+            errors = editor.document.check_spelling(service)
+        self.assertEqual(sorted(errors), ['helo', 'wrld'])
+        # 部分重新检查后，单词的位置仍按文档顺序列出
+        with patch('builtins.print'):
+            editor.edit_element_content('p1', 'Helo wrld')
+            errors = editor.document.check_spelling(service)
+        self.assertEqual(errors['wrld'][1], ['p1', 'p2'])
+
+    def test_dispatch_edit_commands(self):
+        # edit-id/edit-text不再被当作切换编辑器的edit命令
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        with patch('builtins.print'):
+            self.assertTrue(self.session.execute('edit-id h1 title1'))
+            self.assertTrue(self.session.execute('edit-text title1 New heading'))
+            self.assertFalse(self.session.execute('edit-text'))
+            self.assertFalse(self.session.execute('bogus'))
+        self.assertEqual(editor.document.get_element_content('title1'), 'New heading')
+
+    def test_batch_errors(self):
+        # 批处理不输出命令的提示信息，失败的命令带行号报告，之后的命令继续执行；close不询问
+        import io
+        from contextlib import redirect_stdout
+        errors_to = io.StringIO()
+        script = ['load test.html', '', '# comment', 'append p p1 body First', 'delete missing',
+                  'edit-text p1 Second', 'close', 'load test.html']
+        output = io.StringIO()
+        with redirect_stdout(output), patch('builtins.input') as mock_input:
+            errors = self.session.run_batch(script, errors_to=errors_to)
+            mock_input.assert_not_called()
+        self.assertEqual(output.getvalue(), '')
+        self.assertEqual([(lineno, command) for lineno, command, _ in errors], [(5, 'delete missing')])
+        self.assertIn("<batch>:5: delete missing: element with this id: missing doesn't exist!", errors_to.getvalue())
+        self.assertNotIn('p1', self.session.editors[self.test_file].document.get_element_ids())
+
+    def test_batch_transactional(self):
+        # 事务模式下任一命令失败则全部回滚：编辑撤销、新打开的编辑器关闭、保存的文件不写入
+        import io
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        with open(self.test_file) as f:
+            original = f.read()
+        script = ['append p p1 body First', 'edit-id h1 heading', 'save test.html', 'load new.html',
+                  'save new.html', 'edit test.html', 'undo', 'delete missing', 'append p p2 body Never']
+        with patch('builtins.print'):
+            errors = self.session.run_batch(script, transactional=True, errors_to=io.StringIO())
+        self.assertEqual([lineno for lineno, _, _ in errors], [8])
+        self.assertEqual(self.session.active_editor, self.test_file)
+        self.assertNotIn('new.html', self.session.editors)
+        self.assertFalse(os.path.exists('new.html'))
+        with open(self.test_file) as f:
+            self.assertEqual(f.read(), original)
+        self.assertEqual(sorted(editor.document.get_element_ids()), ['body', 'h1', 'head', 'html', 'title'])
+        self.assertEqual(len(editor.history), 0)
+        self.assertNotIn(self.test_file, self.session.modified_files)
+        self.assertFalse([name for name in os.listdir('.') if name.endswith('.tmp')])
+        with patch('builtins.print'):
+            self.assertEqual(self.session.run_batch(script[:3], transactional=True), [])
+        with open(self.test_file) as f:
+            self.assertIn('<p id="p1">First</p>', f.read())
+
+    def test_transaction_commit_write_failure(self):
+        # 提交时某个文件替换失败：之前的文件已写入，其余临时文件被丢弃，没有写入的文档仍为未保存，报告写入了哪些文件
+        import io
+        from contextlib import redirect_stdout
+        with open('second.html', 'w') as f:
+            f.write('<html><body><p id="a">A</p></body></html>')
+        commit_write = FileManager.commit_write
+
+        def failing(temp_path, file_path):
+            if file_path == 'second.html':
+                raise PermissionError(13, 'Permission denied')
+            commit_write(temp_path, file_path)
+
+        script = ['load test.html', 'append p p1 body First', 'save test.html', 'load second.html',
+                  'append p p2 body Second', 'save second.html']
+        with patch('builtins.print'), patch.object(FileManager, 'commit_write', side_effect=failing):
+            errors = self.session.run_batch(script, transactional=True, errors_to=io.StringIO())
+        self.assertEqual(len(errors), 1)
+        self.assertIn('Written: test.html; not written: second.html', errors[0][2])
+        self.assertIn('Permission denied', errors[0][2])
+        with open(self.test_file) as f:
+            self.assertIn('p1', f.read())
+        with open('second.html') as f:
+            self.assertNotIn('p2', f.read())
+        self.assertFalse([name for name in os.listdir('.') if name.endswith('.tmp')])
+        self.assertEqual(self.session.modified_files, {'second.html'})
+        # 显示输出的命令失败时报告命令自己的信息
+        shown = io.StringIO()
+        with redirect_stdout(shown):
+            errors = self.session.run_batch(['print-tree missing'], errors_to=io.StringIO())
+        self.assertIn(errors[0][2], shown.getvalue())
+        self.assertNotEqual(errors[0][2], 'command failed')
+        self.assertIn('missing', errors[0][2])
+
+    def test_apply_batch(self):
+        # 批量编辑先整体校验，任一操作无效则文档不变；成功的批量编辑只占一条历史，一次撤销/重做
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        before = str(editor.document.html)
+        with patch('builtins.print'):
+            self.assertFalse(editor.apply_batch([('append', 'div', 'd1', 'body'), ('delete', 'd1'),
+                                                 ('edit-text', 'd1', 'gone')]))
+        self.assertEqual(str(editor.document.html), before)
+        self.assertEqual(len(editor.history), 0)
+        ops = [('append', 'div', 'd1', 'body'), ('append', 'p', 'p1', 'd1', 'First'),
+               ('insert', 'p', 'p0', 'p1', 'Zero'), ('edit-id', 'p1', 'one'), ('edit-text', 'one', 'Second'),
+               ('delete', 'h1')]
+        with patch('builtins.print'):
+            self.assertTrue(editor.apply_batch(ops))
+            after = str(editor.document.html)
+            self.assertEqual(len(editor.history), 1)
+            self.assertIn('<p id="p0">Zero</p>\n<p id="one">Second</p>', after)
+            self.assertFalse(editor.document.whether_exists_id('h1'))
+            editor.undo()
+            self.assertEqual(str(editor.document.html), before)
+            editor.redo()
+            self.assertEqual(str(editor.document.html), after)
+
+    def test_apply_command(self):
+        # apply 命令（命令行和批处理脚本）把分号隔开的编辑操作交给 apply_batch：先整体校验，无效时报告第几条且文档不变
+        from contextlib import redirect_stdout
+        import io
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        before = str(editor.document.html)
+        with redirect_stdout(io.StringIO()):
+            errors = self.session.run_batch(['apply append div d1 body; delete d1; edit-text d1 gone'],
+                                            errors_to=io.StringIO())
+        self.assertEqual(len(errors), 1)
+        self.assertIn('op 3', errors[0][2])
+        self.assertEqual(str(editor.document.html), before)
+        self.assertEqual(len(editor.history), 0)
+        with patch('builtins.print'):
+            self.assertFalse(self.session.execute('apply'))
+            self.assertTrue(self.session.execute('apply append div d1 body;append p p1 d1 Hello  world; '
+                                                 'insert p p0 p1 Zero; edit-text p0 New text; edit-id p1 one'))
+            self.assertEqual(len(editor.history), 1)
+            self.assertEqual(editor.document.get_element_content('one'), 'Hello  world')
+            self.assertEqual(editor.document.get_element_content('p0'), 'New text')
+            self.session.execute('undo')
+        self.assertEqual(str(editor.document.html), before)
+
+    def test_transaction_commands(self):
+        # begin之后的修改在commit时合并为一条历史，rollback则全部撤销
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        before = str(editor.document.html)
+        with patch('builtins.print'):
+            for command in ['begin', 'append p p1 body First', 'append p p2 body Second', 'rollback']:
+                self.assertTrue(self.session.execute(command))
+            self.assertEqual(str(editor.document.html), before)
+            self.assertFalse(self.session.execute('commit'))
+            for command in ['begin', 'append p p1 body First', 'edit-text p1 Changed', 'delete h1']:
+                self.assertTrue(self.session.execute(command))
+            self.assertFalse(self.session.execute('begin'))
+            self.assertTrue(self.session.execute('commit'))
+            self.assertEqual(len(editor.history), 1)
+            self.session.execute('undo')
+            self.assertEqual(str(editor.document.html), before)
+            self.session.execute('redo')
+        self.assertEqual(editor.document.get_element_content('p1'), 'Changed')
+
+    def test_transaction_keeps_redo_without_changes(self):
+        # 事务没有留下修改（执行后又撤销）时提交不丢弃事务前的重做栈
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        with patch('builtins.print'):
+            for command in ['append p p1 body First', 'undo', 'begin', 'append p p2 body Second', 'undo', 'commit']:
+                self.assertTrue(self.session.execute(command))
+            self.assertEqual(editor.history.stats()[2], 1)
+            self.assertTrue(self.session.execute('redo'))
+        self.assertEqual(editor.document.get_element_content('p1'), 'First')
+        self.assertIsNone(editor.document.get_element('p2'))
+
+    def test_transaction_rollback_with_history_limit(self):
+        # 事务中历史超出上限时不丢弃项，回滚仍能撤销全部修改；事务中撤销后又执行新命令也能回滚
+        import io
+        from model.history import UndoHistory
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.history = UndoHistory(max_entries=3, compress=True, plain_entries=1)
+        before = str(editor.document.html)
+        script = [f'append p p{i} body Text' for i in range(6)] + ['delete missing']
+        with patch('builtins.print'):
+            errors = self.session.run_batch(script, transactional=True, errors_to=io.StringIO())
+        self.assertEqual([lineno for lineno, _, _ in errors], [7])
+        self.assertEqual(str(editor.document.html), before)
+        self.assertEqual(len(editor.history), 0)
+        with patch('builtins.print'):
+            self.session.execute('append p p0 body Kept')
+            kept = str(editor.document.html)
+            for command in ['begin', 'append p p1 body First', 'undo', 'undo', 'append p p2 body Second', 'rollback']:
+                self.assertTrue(self.session.execute(command))
+            self.assertEqual(str(editor.document.html), kept)
+            self.assertEqual(len(editor.history), 1)
+            for i in range(5):
+                self.session.execute(f'append p q{i} body Text')
+        self.assertEqual(len(editor.history), 3)
+
+    def test_undo_history_limits(self):
+        # 超出项数上限时丢弃最早的历史；连续对同一元素的edit-text合并为一步
+        from model.history import UndoHistory
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.history = UndoHistory(max_entries=3)
+        with patch('builtins.print'):
+            for i in range(5):
+                editor.add_into('body', f'p{i}', 'text', 'p')
+            self.assertEqual(len(editor.history), 3)
+            self.assertEqual(editor.history.evicted, 2)
+            for text in ['one', 'two', 'three']:
+                editor.edit_element_content('p4', text)
+            self.assertEqual(len(editor.history), 3)
+            self.assertEqual(editor.history.coalesced, 2)
+            editor.undo()
+            self.assertEqual(editor.document.get_element_content('p4'), 'text')
+            editor.redo()
+            self.assertEqual(editor.document.get_element_content('p4'), 'three')
+            while editor.undo():
+                pass
+        self.assertEqual(sorted(editor.document.get_element_ids()), ['body', 'h1', 'head', 'html', 'p0', 'p1', 'p2', 'title'])
+
+    def test_undo_history_compression(self):
+        # 压缩保存的历史撤销时解压，被删除的子树和仍在文档中的元素都能正确恢复
+        from model.history import UndoHistory
+        self.session.load_editor(self.test_file)
+        editor = self.session.editors[self.test_file]
+        editor.history = UndoHistory(compress=True, plain_entries=1)
+        original = str(editor.document.html)
+        with patch('builtins.print') as mock_print:
+            editor.add_into('body', 'd1', '', 'div')
+            editor.add_into('d1', 'p1', 'first', 'p')
+            editor.insert_before('p1', 'p0', 'zero', 'p')
+            editor.delete_element('d1')
+            editor.add_into('body', 'p2', 'second', 'p')
+            editor.edit_element_id('h1', 'heading')
+            self.assertEqual(editor.history.stats()[1], 5)
+            final = str(editor.document.html)
+            while editor.undo():
+                pass
+            self.assertEqual(str(editor.document.html), original)
+            while editor.redo():
+                pass
+            self.assertEqual(str(editor.document.html), final)
+            self.assertTrue(self.session.execute('undo-stats'))
+            self.assertIn('Undo steps: 6 (5 compressed), redo steps: 0', mock_print.call_args_list[-3].args[0])
+
+    def test_journal_crash_recovery(self):
+        # 进程没有正常退出（不保存会话）时，新会话按日志恢复未保存的修改和撤销历史
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            for command in ['append p p1 body First', 'edit-text p1 Changed', 'delete h1', 'undo']:
+                self.assertTrue(self.session.execute(command))
+            expected = str(self.session.editors[self.test_file].document.html)
+            session = SessionManager()
+        editor = session.editors[self.test_file]
+        self.assertEqual(session.active_editor, self.test_file)
+        self.assertEqual(str(editor.document.html), expected)
+        self.assertTrue(editor.document.is_modified())
+        with patch('builtins.print'):
+            session.execute('redo')
+            self.assertIsNone(editor.document.get_element('h1'))
+            while editor.undo():
+                pass
+        self.assertIsNone(editor.document.get_element('p1'))
+
+    def test_journal_checkpoint(self):
+        # 写检查点之后的命令接在检查点后面重放；写了一半的最后一行被忽略
+        from model.journal import Journal
+        self.session.journal = Journal(checkpoint_every=2)
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            for command in ['append p p1 body First', 'append p p2 body Second', 'edit-text p2 Changed']:
+                self.session.execute(command)
+        path = self.session.journal._path(self.test_file)
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertIn('checkpoint', json.loads(lines[0]))
+        self.assertEqual(len(lines), 2)
+        with open(path, 'a') as f:
+            f.write('{"command": "delete p')
+        with patch('builtins.print'):
+            session = SessionManager()
+        editor = session.editors[self.test_file]
+        self.assertEqual(editor.document.get_element_content('p2'), 'Changed')
+        self.assertEqual(len(editor.history), 3)
+        with open(path) as f:
+            self.assertEqual(len(f.read().splitlines()), 2)
+
+    def test_journal_replay_limits_and_failure(self):
+        # 重放时不受撤销历史上限影响；有命令重放失败时不使用日志，按磁盘上的内容载入
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            for i in range(10):
+                self.session.execute(f'append p p{i} body Text')
+            for _ in range(8):
+                self.session.execute('undo')
+            expected = str(self.session.editors[self.test_file].document.html)
+            session = SessionManager(undo_options={"max_entries": 5})
+        editor = session.editors[self.test_file]
+        self.assertEqual(str(editor.document.html), expected)
+        self.assertEqual(editor.history.stats()[2], 8)
+        path = session.journal._path(self.test_file)
+        with open(path, 'a') as f:
+            f.write('{"command": "delete missing"}\n')
+        self._write_session([self.test_file], self.test_file)
+        with patch('builtins.print') as mock_print:
+            session = SessionManager()
+        self.assertIn(f'Journal for {self.test_file} could not be replayed, the file is loaded from disk',
+                      [call.args[0] for call in mock_print.call_args_list])
+        self.assertIsNone(session.editors[self.test_file].document.get_element('p0'))
+
+    def test_journal_directory_trust(self):
+        # 日志目录只有当前用户可以访问；其他用户可以写入的目录中的日志和检查点不被载入
+        import stat
+        from model.journal import Journal
+        self.session.journal = Journal(checkpoint_every=1)
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            self.session.execute('append p p1 body First')
+        self.assertEqual(stat.S_IMODE(os.stat('.journal').st_mode), 0o700)
+        self._write_session([self.test_file], self.test_file)
+        with patch('builtins.print'):
+            session = SessionManager()
+        self.assertIsNotNone(session.editors[self.test_file].document.get_element('p1'))
+        os.chmod('.journal', 0o777)
+        with patch('builtins.print'), patch('pickle.loads') as loads:
+            session = SessionManager()
+            loads.assert_not_called()
+        self.assertIsNone(session.editors[self.test_file].document.get_element('p1'))
+        self.assertEqual(session.journal.journaled_files(), [])
+
+    def test_journal_base_mismatch(self):
+        # 文件在崩溃后被外部修改时不重放日志，按磁盘上的内容载入；保存和关闭后删除日志
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            self.session.execute('append p p1 body First')
+        with open(self.test_file, 'w') as f:
+            f.write('<html><head><title>Other</title></head><body><h2 id="h2">Other</h2></body></html>')
+        with open('session_state.json', 'w') as f:
+            json.dump({"files": [self.test_file], "active_editor": self.test_file}, f)
+        with patch('builtins.print'):
+            session = SessionManager()
+            editor = session.editors[self.test_file]
+            self.assertIsNone(editor.document.get_element('p1'))
+            self.assertIsNotNone(editor.document.get_element('h2'))
+            session.execute('append p p3 body Third')
+            self.assertEqual(len(session.journal.journaled_files()), 1)
+            session.save_editor(self.test_file)
+            session.close_editor()
+        self.assertEqual(session.journal.journaled_files(), [])
+        self.assertEqual(os.listdir('.journal'), [])
+
+    def test_journal_checkpoint_stale(self):
+        # 检查点之后文件被外部修改时不使用检查点；保存后和正常退出时与磁盘一致的文件不保留检查点
+        from model.journal import Journal
+        self.session.journal = Journal(checkpoint_every=1)
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            self.session.execute('append p p1 body First')
+        path = self.session.journal._path(self.test_file)
+        with open(path) as f:
+            self.assertIn('digest', json.loads(f.readline()))
+        with open(self.test_file, 'w') as f:
+            f.write('<html><head><title>Other</title></head><body><h2 id="h2">Other</h2></body></html>')
+        with open('session_state.json', 'w') as f:
+            json.dump({"files": [self.test_file], "active_editor": self.test_file}, f)
+        with patch('builtins.print'):
+            session = SessionManager()
+        editor = session.editors[self.test_file]
+        self.assertIsNone(editor.document.get_element('p1'))
+        self.assertIsNotNone(editor.document.get_element('h2'))
+        with patch('builtins.print'):
+            session.execute('append p p2 body Second')
+            session.save_editor(self.test_file)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(os.listdir('.journal'), [])
+        with patch('builtins.print'):
+            session.execute('append p p3 body Third')
+        with open(path) as f:
+            self.assertIn('base', json.loads(f.readline()))
+        with patch('builtins.print'):
+            session.execute('undo')
+        session.close_journal()
+        self.assertEqual(os.listdir('.journal'), [])
+
+    def test_autosave_coalesces_edits(self):
+        # 连续的修改在文件空闲后只保存一次，保存的是最后的内容
+        import time
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            self.session.start_autosave(0.2)
+            for i in range(5):
+                self.assertTrue(self.session.execute(f'append p p{i} body Text {i}'))
+        editor = self.session.editors[self.test_file]
+        worker = self.session.autosave
+        deadline = time.monotonic() + 5
+        while worker.saves == 0 and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(worker.saves, 1)
+        self.assertFalse(editor.document.is_modified())
+        with open(self.test_file) as f:
+            self.assertIn('Text 4', f.read())
+        with patch('builtins.print'):
+            self.session.stop_autosave(wait=True)
+
+    def test_autosave_transaction_and_off(self):
+        # 事务中的修改在提交后才自动保存；autosave off 立即保存还在等待的文件；关闭文件时不再询问
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            self.assertTrue(self.session.execute('autosave on 60'))
+            worker = self.session.autosave
+            self.session.execute('begin')
+            self.session.execute('append p p1 body First')
+            worker.notify(self.test_file)
+            with worker._condition:
+                worker._due[self.test_file][0] = 0
+                worker._condition.notify()
+            self.session.execute('rollback')
+            worker.flush()
+            self.assertEqual(worker.saves, 0)
+            self.session.execute('append p p2 body Second')
+            self.assertEqual(worker.pending(), [self.test_file])
+            self.assertTrue(self.session.execute('autosave off'))
+            self.assertIsNone(self.session.autosave)
+            with open(self.test_file) as f:
+                self.assertIn('Second', f.read())
+            self.session.execute('autosave on 60')
+            self.session.execute('append p p3 body Third')
+            with patch('builtins.input') as mock_input:
+                self.session.close_editor()
+            mock_input.assert_not_called()
+            self.assertEqual(self.session.autosave.pending(), [])
+            self.session.stop_autosave(wait=True)
+        with open(self.test_file) as f:
+            self.assertIn('Third', f.read())
+
+    def test_find_and_replace(self):
+        # 在所有打开的文件中查找（正则、-i），替换在每个文件中各占一个撤销项，日志重放后结果相同
+        with open('other.html', 'w') as f:
+            f.write('<html><head><title>Other</title></head><body><p id="a">Hello world</p><p id="b">hello again</p></body></html>')
+        with patch('builtins.print') as mock_print:
+            self.session.load_editor(self.test_file)
+            self.session.load_editor('other.html')
+            self.session.execute('append p p1 body Say hello to the world')
+            mock_print.reset_mock()
+            self.assertTrue(self.session.execute('find hello'))
+            self.assertEqual(mock_print.call_args.args[0].splitlines(), [
+                'other.html #b: hello again', 'other.html #p1: Say hello to the world', '2 match(es) in 1 file(s)'])
+            self.session.execute('find -i "^hello"')
+            self.assertIn('other.html #a: Hello world', mock_print.call_args.args[0])
+            self.assertIn('2 match(es)', mock_print.call_args.args[0])
+            self.session.execute('find Test')
+            self.assertIn('test.html #h1: Test', mock_print.call_args.args[0])
+            self.assertFalse(self.session.execute('find "("'))
+            self.assertTrue(self.session.execute(r'replace -i "(h)ello (\w+)" "\1i \2!"'))
+            other = self.session.editors['other.html']
+            self.assertEqual(other.document.get_element_content('a'), 'Hi world!')
+            self.assertEqual(other.document.get_element_content('p1'), 'Say hi to! the world')
+            self.assertEqual(len(other.history), 2)
+            expected = str(other.document.html)
+            session = SessionManager()
+            self.assertEqual(str(session.editors['other.html'].document.html), expected)
+            self.session.execute('undo')
+        self.assertEqual(other.document.get_element_content('b'), 'hello again')
+        self.assertEqual(self.session.editors[self.test_file].document.get_element_content('h1'), 'Test')
+
+    def test_find_in_directory(self):
+        # --dir 查找目录下所有html文件，未打开的文件在进程池中解析；替换时打开这些文件，保存前磁盘上的文件不变
+        from model.search import scan_files, literal_words
+        os.makedirs('site/sub')
+        for i, path in enumerate(['site/a.html', 'site/sub/b.html', 'site/sub/c.html']):
+            with open(path, 'w') as f:
+                f.write(f'<html><head><title>T</title></head><body><p id="p{i}">copyright 2023 page {i}</p><p id="n{i}">{i}</p></body></html>')
+        results = scan_files(['site/a.html', 'site/sub/b.html', 'missing.html'], r'\d{4}', max_workers=2)
+        self.assertEqual(results['site/a.html'], [('p0', 'copyright 2023 page 0')])
+        self.assertIsInstance(results['missing.html'], Exception)
+        self.assertEqual(literal_words('new york'), [('new', False, True), ('york', True, False)])
+        self.assertIsNone(literal_words('a.b'))
+        with patch('builtins.print') as mock_print:
+            self.session.load_editor('site/a.html')
+            self.session.execute('find --dir site 2023')
+            self.assertIn('3 match(es) in 3 file(s)', mock_print.call_args.args[0])
+            self.assertTrue(self.session.execute('replace --dir site 2023 2024'))
+        self.assertEqual(self.session.active_editor, 'site/a.html')
+        self.assertEqual(self.session.editors[os.path.join('site', 'sub', 'c.html')].document.get_element_content('p2'), 'copyright 2024 page 2')
+        with open('site/sub/c.html') as f:
+            self.assertIn('2023', f.read())
+
+    def test_text_index_incremental(self):
+        # 插入、追加、修改文本、删除子树以及撤销之后，增量维护的倒排索引与重新建立的索引相同
+        from model.text_index import TextIndex
+        with patch('builtins.print'):
+            self.session.load_editor(self.test_file)
+            editor = self.session.editors[self.test_file]
+            document = editor.document
+            self.assertIsNotNone(document.text_index)
+            self.session.execute('append div d1 body')
+            self.session.execute('append p p1 d1 Hello brave new world')
+            self.session.execute('insert p p0 d1 Hello again')
+            self.session.execute('edit-text p1 Goodbye brave world')
+            self.session.execute('edit-text h1 Heading')
+            self.session.execute('delete d1')
+            self.session.execute('undo')
+            self.session.execute('undo')
+        rebuilt = TextIndex(document.html)
+        index = document.text_index
+        self.assertEqual({word: set(bucket) for word, bucket in index.postings.items()},
+                         {word: set(bucket) for word, bucket in rebuilt.postings.items()})
+        self.assertEqual(index.vocabulary, sorted(rebuilt.postings))
+        self.assertEqual(index.words('b'), ['brave'])
+        self.assertEqual({element.id for element in index.prefix('hel')}, {'p0'})
+        self.assertEqual([element.id for element in index.ordered(index.exact('BRAVE'), document.html)], ['p1'])
+        self.assertNotIn('heading', index.postings)
+        self.assertEqual(index.count('goodbye'), 1)
+
+    def test_lookup_commands(self):
+        # lookup 按单词或前缀列出元素（按文档顺序），words 列出单词及出现的元素个数；关闭索引时结果相同
+        for text_index in (True, False):
+            session = SessionManager(restore=False, journal=False, text_index=text_index)
+            with patch('builtins.print') as mock_print:
+                session.load_editor(self.test_file)
+                session.execute('append p p2 body Second paragraph')
+                session.execute('insert p p1 p2 First paragraph')
+                self.assertTrue(session.execute('lookup PARAGRAPH'))
+                self.assertEqual(mock_print.call_args.args[0].splitlines(),
+                                 ['p#p1: First paragraph', 'p#p2: Second paragraph', '2 element(s)'])
+                session.execute('edit-text p1 Fresh text')
+                session.execute('lookup par*')
+                self.assertEqual(mock_print.call_args.args[0].splitlines(), ['p#p2: Second paragraph', '1 element(s)'])
+                session.execute('words f')
+                self.assertEqual(mock_print.call_args.args[0].splitlines(), ['fresh 1', '1 word(s)'])
+                session.execute('lookup missing')
+                self.assertEqual(mock_print.call_args.args[0], 'No matches found.')
+                self.assertFalse(session.execute('lookup two words'))
+                self.assertFalse(session.execute('lookup *'))
+            self.assertEqual(session.editors[self.test_file].document.text_index is not None, text_index)
+
+    def test_lazy_imports(self):
+        # 启动（导入 main.py 用到的模块、建立空会话）时不导入 bs4、pyspellchecker、asyncio 和 concurrent.futures
+        import subprocess
+        import sys
+        code = ('import sys; sys.path.insert(0, sys.argv[1]); from model.session_manager import SessionManager; '
+                'SessionManager(); print(sorted(m for m in ("bs4", "spellchecker", "asyncio", "concurrent.futures") '
+                'if m in sys.modules))')
+        result = subprocess.run([sys.executable, '-c', code, os.path.dirname(os.path.abspath(__file__))],
+                                capture_output=True, text=True, check=True)
+        self.assertEqual(result.stdout.strip().splitlines()[-1], '[]')
+
+    def test_metrics_and_profile(self):
+        # stats on 之后记录每条命令的耗时和各阶段耗时，可以写成 JSON；profile 在 cProfile 下执行命令
+        from io import StringIO
+        from contextlib import redirect_stdout
+        with redirect_stdout(StringIO()) as output:
+            self.session.execute('stats')
+            self.assertIn('Metrics are off', output.getvalue())
+            self.assertTrue(self.session.execute('stats on memory'))
+            self.session.execute(f'load {self.test_file}')
+            self.session.execute(f'save {self.test_file}')
+            self.session.execute('edit-text missing text')
+            self.assertTrue(self.session.execute('profile -n 3 -s cumulative print-tree'))
+            self.assertTrue(self.session.execute('stats dump metrics.json'))
+            self.session.execute('stats')
+            self.assertFalse(self.session.execute('profile profile help'))
+            self.session.execute('stats off')
+        text = output.getvalue()
+        self.assertIn('Profile of \'print-tree\'', text)
+        self.assertIn('cumulative', text)
+        self.assertIn('read_html.parse', text)
+        with open('metrics.json') as f:
+            data = json.load(f)
+        self.assertEqual(data['commands']['load']['count'], 1)
+        self.assertEqual(data['commands']['edit-text']['errors'], 1)
+        self.assertEqual(data['commands']['print-tree']['count'], 1)
+        self.assertTrue(data['trace_memory'])
+        self.assertIn('peak_kb', data['recent'][0])
+        self.assertEqual(set(data['recent'][1]['phases']), {'save.serialize', 'save.write'})
+        self.assertTrue({'read_html.read', 'read_html.parse', 'read_html.build'} <= set(data['phases']))
+        self.assertIsNone(self.session.metrics)
+
+    def test_benchmark_generator_and_compare(self):
+        # 合成文档的大小和深度符合参数，同样的参数生成同样的文档；与基线比较时只报告超过阈值的变慢
+        from benchmarks.generator import generate_document, generate_directory, write_document
+        from benchmarks.suite import compare
+        document = generate_document(100, depth=3, fanout=4, seed=1)
+
+        def depth(element):
+            return 1 + max((depth(child) for child in element.children), default=0)
+        self.assertEqual(sum(1 for element_id in document.ids if element_id.startswith('e')), 100)
+        self.assertEqual(depth(document.body), 4)
+        write_document('a.html', 100, depth=3, fanout=4, seed=1)
+        write_document('b.html', 100, depth=3, fanout=4, seed=1)
+        with open('a.html') as a, open('b.html') as b:
+            self.assertEqual(a.read(), b.read())
+        editor = HTMLEditor()
+        self.assertTrue(editor.read_html('a.html'))
+        self.assertIsNotNone(editor.document.find_element_by_id(editor.document.html, 'e99'))
+        self.assertEqual(generate_directory('tree', 10, depth=2, fanout=2), 7)
+        self.assertEqual(sum(len(files) for _, _, files in os.walk('tree')), 10)
+        baseline = {'save': {'1000': {'ms': 10.0}, '5000': {'ms': 50.0}}, 'read_html': {'1000': {'ms': 1.0}}}
+        results = {'save': {'1000': {'ms': 20.0}, '5000': {'ms': 55.0}}, 'read_html': {'1000': {'ms': 2.0}},
+                   'print_tree': {'1000': {'ms': 5.0}}}
+        rows = compare(results, baseline, threshold=0.25, min_ms=2.0)
+        self.assertEqual([(name, size) for name, size, *_, regressed in rows if regressed], [('save', '1000')])
+        self.assertEqual(len(rows), 3)
+
+    def _start_server(self, text_index=True):
+        import threading
+        from model.server import EditorServer
+        server = EditorServer(SessionManager(restore=False, journal=False, text_index=text_index), 'unix:server.sock')
+        thread = threading.Thread(target=server.run)
+        thread.start()
+        self.assertTrue(server.ready.wait(10))
+        return server, thread
+
+    def test_server_clients(self):
+        # 多个客户端共用一个会话：各自的活动文件互不影响，输出按请求返回；shutdown 后保存会话状态
+        import socket
+        from model.client import EditorClient, CommandFailed
+        with open('other.html', 'w') as f:
+            f.write('<html><body><p id="a">Hello world</p><p id="b">bye</p></body></html>')
+        server, thread = self._start_server()
+        try:
+            with EditorClient('unix:server.sock', timeout=10) as first, EditorClient('unix:server.sock', timeout=10) as second:
+                self.assertIn('Loaded editor', first.run(f'load {self.test_file}'))
+                second.run('load other.html')
+                self.assertEqual(first.file, self.test_file)
+                self.assertEqual(second.file, 'other.html')
+                results = first.execute_many(['append p p1 body Hello there', 'lookup hello'])
+                self.assertEqual(results[1], (True, 'p#p1: Hello there\n1 element(s)\n'))
+                self.assertEqual(second.run('lookup hello'), 'p#a: Hello world\n1 element(s)\n')
+                self.assertEqual(second.run('lookup hello', file=self.test_file), 'p#p1: Hello there\n1 element(s)\n')
+                self.assertEqual(second.file, 'other.html')
+                with self.assertRaises(CommandFailed):
+                    first.run('delete missing')
+                # 也可以直接发送一行命令
+                with socket.socket(socket.AF_UNIX) as raw:
+                    raw.connect('server.sock')
+                    raw.sendall(b'editor-list\n')
+                    self.assertIn(b'"ok": true', raw.makefile('rb').readline())
+                second.shutdown()
+            thread.join(10)
+        finally:
+            server.stop()
+            thread.join(10)
+        self.assertFalse(thread.is_alive())
+        with open('session_state.json') as f:
+            self.assertEqual(json.load(f)['files'], [self.test_file, 'other.html'])
+
+    def test_server_lookup_without_text_index(self):
+        # 文档没有维护单词索引时 lookup、words 要临时建立索引，放到线程池中执行，不占用事件循环
+        import threading
+        from model.client import EditorClient
+        for text_index in (True, False):
+            server, thread = self._start_server(text_index=text_index)
+            threads = []
+            run = server._run
+            def record(connection, command, *args):
+                threads.append((command.partition(' ')[0], threading.current_thread() is thread))
+                return run(connection, command, *args)
+            server._run = record
+            try:
+                with EditorClient('unix:server.sock', timeout=10) as client:
+                    client.run(f'load {self.test_file}')
+                    client.run('append p p1 body Hello there')
+                    self.assertEqual(client.run('lookup hello'), 'p#p1: Hello there\n1 element(s)\n')
+                    client.run('words he')
+            finally:
+                server.stop()
+                thread.join(10)
+            self.assertEqual([inline for name, inline in threads if name in ('lookup', 'words')], [text_index, text_index])
+
+    def test_server_transaction(self):
+        # 事务期间其他客户端的修改等到提交后才执行；开启事务的连接断开时回滚
+        import threading
+        from model.client import EditorClient
+        server, thread = self._start_server()
+        try:
+            first = EditorClient('unix:server.sock', timeout=10)
+            second = EditorClient('unix:server.sock', timeout=10)
+            first.run(f'load {self.test_file}')
+            first.run('begin')
+            first.run('append p p1 body In transaction')
+            results = []
+            waiting = threading.Thread(target=lambda: results.append(second.execute('edit-text p1 Later', file=self.test_file)))
+            waiting.start()
+            waiting.join(0.3)
+            self.assertEqual(results, [])
+            first.run('commit')
+            waiting.join(10)
+            self.assertEqual(results, [(True, '')])
+            first.run('begin')
+            first.run('append p p2 body Dropped')
+            first.close()
+            self.assertIn('No matches', second.run('lookup dropped', file=self.test_file))
+            self.assertIn('Later', second.run('print-tree', file=self.test_file))
+            second.close()
+        finally:
+            server.stop()
+            thread.join(10)
+
+    def test_server_edit_waits_off_loop(self):
+        # 编辑命令等待编辑器的锁（例如自动保存正在写入）时不阻塞事件循环，其他文档上的请求照常返回
+        import threading
+        from model.client import EditorClient
+        with open('other.html', 'w') as f:
+            f.write('<html><body><p id="a">Hello world</p></body></html>')
+        server, thread = self._start_server()
+        try:
+            with EditorClient('unix:server.sock', timeout=10) as first, EditorClient('unix:server.sock', timeout=5) as second:
+                first.run(f'load {self.test_file}')
+                second.run('load other.html')
+                lock = server.session.editors[self.test_file].lock
+                results = []
+                with lock:
+                    editing = threading.Thread(target=lambda: results.append(first.execute('append p p1 body Later')))
+                    editing.start()
+                    editing.join(0.3)
+                    self.assertIn('p#a: Hello world', second.run('lookup hello'))
+                    self.assertEqual(results, [])
+                editing.join(10)
+                self.assertTrue(results[0][0])
+        finally:
+            server.stop()
+            thread.join(10)
+
     def test_print_tree(self):
         # 打印树结构
         with patch('builtins.print') as mock_print:
@@ -148,6 +1262,43 @@ class TestSessionManager(unittest.TestCase):
             self.session.editors[self.test_file].print_tree()
             mock_print.assert_called()
 
+    def test_print_subtree_depth_and_limit(self):
+        # 从某个元素开始显示、限制层数（省略的子树显示子元素个数）和行数；达到行数后不再遍历剩下的元素
+        from io import StringIO
+        from contextlib import redirect_stdout
+        from model import html_document
+        with open('nested.html', 'w') as f:
+            f.write('<html><body><div id="outer"><ul id="list"><li id="a">A</li><li id="b">B</li></ul>'
+                    '<p id="after">After</p></div><p id="tail">Tail</p></body></html>')
+        with redirect_stdout(StringIO()):
+            self.session.load_editor('nested.html')
+
+        def run(command):
+            with redirect_stdout(StringIO()) as output:
+                done = self.session.execute(command)
+            return done, output.getvalue().splitlines()
+
+        self.assertEqual(run('print-tree -d 1 outer'),
+                         (True, ['div#outer', '    ├── ul#list (+2 children)', '    └── p#after', '        └── After']))
+        self.assertEqual(run('print-indent -d 1 4 outer'),
+                         (True, ['<div id="outer"> ', '    <ul id="list">  (+2 children)', '    </ul>',
+                                 '    <p id="after"> After</p>', '</div>']))
+        self.assertEqual(run('print-indent 3')[1][1], '   <body id="body"> ')
+        lines = run('print-tree -n 3')[1]
+        self.assertEqual(lines, ['html#html', '    └── body#body', '        ├── div#outer', '... output stopped after 3 lines'])
+        self.assertFalse(run('print-tree missing')[0])
+        self.assertFalse(run('print-tree -d x')[0])
+        events = []
+        original = html_document.walk
+
+        def counting_walk(*args, **kwargs):
+            for event in original(*args, **kwargs):
+                events.append(event)
+                yield event
+        with patch('model.html_document.walk', counting_walk):
+            self.assertEqual(len(run('print-tree -n 2 -p')[1]), 3)
+        self.assertEqual(len(events), 3)
+
     def test_print_indent(self):
         # 打印缩进格式
         with patch('builtins.print') as mock_print:
@@ -0,0 +1,56 @@
+#自动保存基准：编辑大文档时每条命令的响应时间
+#比较不保存、每条命令后同步保存、后台自动保存三种方式，自动保存下统计实际写入的次数
+#python -m benchmarks.bench_autosave [--sizes 10000 50000] [--edits 200] [--pause-ms 20] [--delay 0.01]
+import argparse
+import os
+import tempfile
+import time
+from model.session_manager import SessionManager
+from benchmarks.common import build_document, quiet
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+#每条编辑命令之后停顿pause秒（模拟用户输入），返回每条命令的耗时（毫秒）和自动保存的次数
+def run(size, edits, pause, mode, delay):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "doc.html")
+        quiet(build_document(size).save, path)
+        session = SessionManager(tree_cache=False, restore=False, journal=False,
+                                 autosave=delay if mode == "autosave" else None)
+        quiet(session.load_editor, path)
+        latencies = []
+        for i in range(edits):
+            start = time.perf_counter()
+            quiet(session.execute, f"edit-text p{(i * 7) % 100 * 11 + 1} edited text {i}")
+            if mode == "sync":
+                quiet(session.execute, f"save {path}")
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(pause)
+        saves = session.autosave.saves if session.autosave is not None else 0
+        quiet(session.stop_autosave, wait=True)
+    return latencies, saves
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--pause-ms", type=float, default=20)
+    parser.add_argument("--delay", type=float, default=0.01, help="autosave idle delay in seconds")
+    args = parser.parse_args()
+
+    print(f"{'elements':>10} {'mode':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'writes':>7}")
+    for size in args.sizes:
+        for mode in ("none", "sync", "autosave"):
+            latencies, saves = run(size, args.edits, args.pause_ms / 1000, mode, args.delay)
+            writes = {"none": 0, "sync": args.edits, "autosave": saves}[mode]
+            print(f"{size:>10} {mode:>9} {percentile(latencies, 0.5):>8.2f} {percentile(latencies, 0.99):>8.2f} "
+                  f"{max(latencies):>8.2f} {writes:>7}")
+
+
+if __name__ == "__main__":
+    main()
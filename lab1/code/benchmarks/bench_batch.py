@@ -0,0 +1,73 @@
+#批量编辑基准：比较逐条调用编辑接口与apply_batch一次提交同样的n条编辑的耗时和历史条数
+#python -m benchmarks.bench_batch [--size 20000] [--edits 10000]
+import argparse
+import time
+from model.html_editor import HTMLEditor
+from benchmarks.common import build_document, quiet
+
+
+#生成n条编辑：追加、插入、改id、改文本、删除轮流进行，每条都合法
+def generate_ops(n):
+    ops = []
+    for i in range(n):
+        kind = i % 5
+        if kind == 0:
+            ops.append(("append", "p", f"n{i}", "s0", f"new paragraph {i}"))
+        elif kind == 1:
+            ops.append(("insert", "p", f"n{i}", f"n{i - 1}", f"inserted {i}"))
+        elif kind == 2:
+            ops.append(("edit-id", f"n{i - 2}", f"m{i}"))
+        elif kind == 3:
+            ops.append(("edit-text", f"m{i - 1}", f"edited {i}"))
+        else:
+            ops.append(("delete", f"n{i - 3}"))
+    return ops
+
+
+def one_by_one(editor, ops) -> None:
+    for op in ops:
+        kind = op[0]
+        if kind == "append":
+            editor.add_into(op[3], op[2], op[4], op[1])
+        elif kind == "insert":
+            editor.insert_before(op[3], op[2], op[4], op[1])
+        elif kind == "edit-id":
+            editor.edit_element_id(op[1], op[2])
+        elif kind == "edit-text":
+            editor.edit_element_content(op[1], op[2])
+        else:
+            editor.delete_element(op[1])
+
+
+def new_editor(size) -> HTMLEditor:
+    editor = HTMLEditor()
+    editor.document = build_document(size)
+    return editor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--edits", type=int, default=10000)
+    args = parser.parse_args()
+    ops = generate_ops(args.edits)
+
+    results = {}
+    for name, run in (("one-by-one", one_by_one), ("apply_batch", lambda editor, ops: editor.apply_batch(ops))):
+        editor = new_editor(args.size)
+        start = time.perf_counter()
+        quiet(run, editor, ops)
+        elapsed = time.perf_counter() - start
+        results[name] = str(editor.document.html)
+        undo_start = time.perf_counter()
+        undone = 0
+        while quiet(editor.undo):
+            undone += 1
+        undo_elapsed = time.perf_counter() - undo_start
+        print(f"{name:>12}: {args.edits} edits in {elapsed:.3f} s ({args.edits / elapsed:,.0f} edits/s), "
+              f"{undone} history entries, undo all in {undo_elapsed:.3f} s")
+    assert results["one-by-one"] == results["apply_batch"]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#目录显示基准：在含node_modules的工作区上比较原实现（os.listdir + 每项os.path.isdir + 每行一次print）
+#与os.scandir遍历（按.gitignore忽略、显示全部、限制深度、目录内容缓存）的耗时
+#python -m benchmarks.bench_dir_walker [--packages 300] [--files 20] [--repeat 3]
+import argparse
+import os
+import tempfile
+import time
+from model.dir_walker import DirectoryCache
+from model.file_manager import FileManager
+from benchmarks.common import quiet
+
+
+#原实现
+def listdir_tree(current_directory, items, open_files, prefix=""):
+    for i, item in enumerate(items):
+        path = os.path.join(current_directory, item)
+        connector = "└── " if i == len(items) - 1 else "├── "
+        is_open = " *" if item in open_files else ""
+        print(f"{prefix}{connector}{item}{is_open}")
+        if os.path.isdir(path):
+            new_prefix = prefix + ("    " if i == len(items) - 1 else "│   ")
+            listdir_tree(path, os.listdir(path), open_files, new_prefix)
+
+
+#工作区：src下少量源文件，node_modules下packages个包，每个包两层目录、files个文件；.gitignore忽略node_modules
+def build_workspace(root, packages, files) -> int:
+    count = 0
+    for i in range(10):
+        os.makedirs(os.path.join(root, "src", f"module{i}"))
+        for j in range(5):
+            open(os.path.join(root, "src", f"module{i}", f"page{j}.html"), "w").close()
+            count += 1
+    for i in range(packages):
+        package = os.path.join(root, "node_modules", f"package{i}", "lib")
+        os.makedirs(package)
+        for j in range(files):
+            open(os.path.join(package, f"file{j}.js"), "w").close()
+            count += 1
+    with open(os.path.join(root, ".gitignore"), "w") as file:
+        file.write("node_modules/\n")
+    #mtime较早的目录才会被缓存
+    old = time.time() - 60
+    for path, _, _ in os.walk(root):
+        os.utime(path, (old, old))
+    return count
+
+
+def timed(repeat, func, *args, **kwargs) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        quiet(func, *args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--packages", type=int, default=300)
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        count = build_workspace(root, args.packages, args.files)
+        print(f"{count} files")
+        cache = DirectoryCache()
+        quiet(FileManager.display_directory, "tree", root=root, show_all=True, cache=cache)
+        cases = (
+            ("listdir + isdir + print", lambda: listdir_tree(root, os.listdir(root), set())),
+            ("scandir, all files", lambda: FileManager.display_directory("tree", root=root, show_all=True)),
+            ("scandir, all, cached", lambda: FileManager.display_directory("tree", root=root, show_all=True, cache=cache)),
+            ("scandir, .gitignore", lambda: FileManager.display_directory("tree", root=root)),
+            ("scandir, depth 2", lambda: FileManager.display_directory("tree", root=root, max_depth=2, show_all=True)),
+        )
+        print(f"{'mode':>26} {'ms':>9}")
+        for name, func in cases:
+            print(f"{name:>26} {timed(args.repeat, func):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#撤销历史基准：长时间编辑（大量edit-text和删除整段）后历史占用的内存、每次编辑的耗时，以及全部撤销的耗时
+#比较不限大小、按字节数限制、压缩较早的项三种设置
+#python -m benchmarks.bench_history [--size 20000] [--edits 20000] [--budget-mb 2]
+import argparse
+import time
+import tracemalloc
+from model.html_editor import HTMLEditor
+from model.history import UndoHistory, format_bytes
+from benchmarks.common import build_document, quiet
+
+
+#每10次编辑从文档末尾删除一整段（section及其中的p），其余为改写前100段中的文本，同一段落连续改写两次
+def run_edits(editor, edits, sections) -> None:
+    for i in range(edits):
+        if i % 10 == 9 and sections:
+            editor.delete_element(sections.pop())
+        else:
+            target = f"p{(i // 2 * 7) % 100 * 11 + 1}"
+            editor.edit_element_content(target, f"edited text {i} " * 4)
+
+
+def bench(size, edits, history):
+    editor = HTMLEditor()
+    editor.document = build_document(size)
+    editor.history = history
+    sections = [element_id for element_id in editor.document.get_element_ids() if element_id.startswith("s")][1:]
+    start = time.perf_counter()
+    quiet(run_edits, editor, edits, sections)
+    elapsed = time.perf_counter() - start
+    stats = history.stats()
+    evicted, coalesced = history.evicted, history.coalesced
+    start = time.perf_counter()
+    undone = 0
+    while quiet(editor.undo):
+        undone += 1
+    undo_time = time.perf_counter() - start
+    return elapsed / edits * 1e6, stats, evicted, coalesced, undone, undo_time
+
+
+#历史实际占用的内存：重新执行一遍，比较清空历史前后tracemalloc统计的内存
+def retained_bytes(size, edits, make_history) -> int:
+    editor = HTMLEditor()
+    editor.document = build_document(size)
+    editor.history = make_history()
+    sections = [element_id for element_id in editor.document.get_element_ids() if element_id.startswith("s")][1:]
+    tracemalloc.start()
+    quiet(run_edits, editor, edits, sections)
+    before = tracemalloc.get_traced_memory()[0]
+    editor.history.clear()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return before - after
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=20000)
+    parser.add_argument("--edits", type=int, default=20000)
+    parser.add_argument("--budget-mb", type=float, default=2)
+    args = parser.parse_args()
+    budget = int(args.budget_mb * 1024 * 1024)
+
+    settings = [("unbounded", lambda: UndoHistory(max_entries=10 ** 9, max_bytes=10 ** 15)),
+                ("budget", lambda: UndoHistory(max_bytes=budget)),
+                ("compress", lambda: UndoHistory(max_bytes=budget, compress=True))]
+    print(f"{'history':>10} {'us/edit':>8} {'retained':>10} {'estimated':>10} {'steps':>6} {'packed':>6} "
+          f"{'evicted':>7} {'merged':>6} {'undo all':>9}")
+    for name, make_history in settings:
+        per_edit, stats, evicted, coalesced, undone, undo_time = bench(args.size, args.edits, make_history())
+        _, packed, _, estimated, _ = stats
+        retained = retained_bytes(args.size, args.edits, make_history)
+        print(f"{name:>10} {per_edit:>8.1f} {format_bytes(retained):>10} {format_bytes(estimated):>10} {undone:>6} "
+              f"{packed:>6} {evicted:>7} {coalesced:>6} {undo_time:>8.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#会话日志基准：记日志给每次编辑增加的耗时（不同fsync间隔），以及崩溃后恢复会话的耗时：
+#从检查点载入并重放之后的命令，与重新解析文件并重放全部命令比较
+#python -m benchmarks.bench_journal [--sizes 1000 10000 50000] [--edits 1000]
+import argparse
+import os
+import tempfile
+import time
+from model.session_manager import SessionManager
+from benchmarks.common import build_document, quiet
+
+
+def commands(edits):
+    for i in range(edits):
+        if i % 5 == 4:
+            yield f"append p bench{i} body added {i}"
+        else:
+            yield f"edit-text p{(i * 7) % 100 * 11 + 1} edited text {i}"
+
+
+#在directory中打开size个元素的文档执行edits条命令，返回每条命令的平均耗时（微秒）
+def run_edits(directory, size, edits, journal_options):
+    os.chdir(directory)
+    path = "doc.html"
+    quiet(build_document(size).save, path)
+    session = SessionManager(tree_cache=False, restore=False, journal=journal_options is not None,
+                             journal_options=journal_options)
+    quiet(session.load_editor, path)
+    start = time.perf_counter()
+    for command in commands(edits):
+        quiet(session.execute, command)
+    elapsed = time.perf_counter() - start
+    return session, elapsed / edits * 1e6
+
+
+#模拟崩溃：不正常退出，直接由新的会话按日志恢复
+def resume(directory):
+    os.chdir(directory)
+    start = time.perf_counter()
+    session = quiet(SessionManager, tree_cache=False)
+    elapsed = time.perf_counter() - start
+    assert "doc.html" in session.editors
+    return elapsed * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--edits", type=int, default=1000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    print(f"{'elements':>10} {'journal':>14} {'us/edit':>9} {'resume ms':>10}")
+    try:
+        for size in args.sizes:
+            settings = (("off", None),
+                        ("fsync 1s", {}),
+                        ("fsync always", {"fsync_interval": 0}),
+                        ("no checkpoint", {"checkpoint_every": args.edits + 1}))
+            for name, options in settings:
+                with tempfile.TemporaryDirectory() as directory:
+                    session, per_edit = run_edits(directory, size, args.edits, options)
+                    resume_ms = f"{resume(directory):.1f}" if options is not None else "-"
+                    if session.journal is not None:
+                        session.journal.close()
+                    os.chdir(cwd)
+                print(f"{size:>10} {name:>14} {per_edit:>9.1f} {resume_ms:>10}")
+    finally:
+        os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#加载器基准：比较BeautifulSoup加载器与HTMLParser直接建树的吞吐量和峰值内存，并校验两者结果一致
+#python -m benchmarks.bench_loader [--sizes-kb 1 100 1000 10000 50000] [--no-memory]
+import argparse
+import os
+import tempfile
+import time
+from model.html_editor import parse_html_file, LOADERS
+from benchmarks.common import build_document, quiet, measure
+
+
+#build_document中每个元素约占的字节数，用来由目标文件大小估算元素个数
+BYTES_PER_ELEMENT = 60
+
+
+def signature(parsed):
+    title, root, index = parsed
+    nodes = []
+    stack = [root]
+    while stack:
+        element = stack.pop()
+        nodes.append((element.tag, element.id, element.content, len(element.children)))
+        stack.extend(reversed(element.children))
+    return title, nodes, {key: len(bucket) for key, bucket in index.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-kb", type=int, nargs="+", default=[1, 100, 1000, 10000, 50000])
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run (slow on large files)")
+    args = parser.parse_args()
+
+    print(f"{'file MB':>9} {'loader':>7} {'seconds':>9} {'MB/s':>8} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size_kb in args.sizes_kb:
+            path = os.path.join(directory, f"doc{size_kb}.html")
+            quiet(build_document(max(1, size_kb * 1024 // BYTES_PER_ELEMENT)).save, path)
+            megabytes = os.path.getsize(path) / 1e6
+            signatures = []
+            for loader in LOADERS:
+                start = time.perf_counter()
+                parsed = parse_html_file(path, loader=loader)
+                elapsed = time.perf_counter() - start
+                signatures.append(signature(parsed))
+                del parsed
+                peak = "-"
+                if not args.no_memory:
+                    peak = f"{measure(parse_html_file, path, loader=loader)[1] / 1e6:.1f}"
+                print(f"{megabytes:>9.3f} {loader:>7} {elapsed:>9.3f} {megabytes / elapsed:>8.2f} {peak:>9}")
+            if any(item != signatures[0] for item in signatures):
+                raise SystemExit(f"loaders disagree on {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#元素内存基准：比较原先带__dict__、每个元素自带子元素列表的HTMLElement与__slots__版本每个节点占用的字节数
+#python -m benchmarks.bench_memory [--sizes 100000 1000000] [--fanout 10]
+import argparse
+import gc
+import tracemalloc
+from model.html_element import HTMLElement
+
+
+#旧实现：普通类，标签不驻留，没有子元素时也有一个空列表
+class LegacyElement:
+
+    def __init__(self, tag, content="", parent=None, element_id=None) -> None:
+        self.tag = tag
+        self.content = content
+        self.children = []
+        self.parent = parent
+        self.id = element_id if element_id is not None else self.tag
+
+    def add_child(self, child_element) -> None:
+        self.children.append(child_element)
+        child_element.parent = self
+
+
+#解析器为每个标签产生新的字符串，这里同样复制一份
+def fresh(text) -> str:
+    return text.encode().decode()
+
+
+#与benchmarks.common.build_document相同的形状：每个div下fanout个p，可选带文本
+def build(element_class, n, fanout, with_text):
+    root = element_class(fresh("html"))
+    section = None
+    for count in range(n - 1):
+        if count % (fanout + 1) == 0:
+            section = element_class(fresh("div"), element_id=f"s{count}")
+            root.add_child(section)
+        else:
+            content = f"paragraph number {count} with some text" if with_text else ""
+            section.add_child(element_class(fresh("p"), content=content, element_id=f"p{count}"))
+    return root
+
+
+def bytes_per_node(element_class, n, fanout, with_text) -> float:
+    gc.collect()
+    tracemalloc.start()
+    root = build(element_class, n, fanout, with_text)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del root
+    return current / n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--fanout", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'elements':>10} {'text':>5} {'legacy B/node':>14} {'slots B/node':>13} {'saved':>7}")
+    for size in args.sizes:
+        for with_text in (False, True):
+            legacy = bytes_per_node(LegacyElement, size, args.fanout, with_text)
+            compact = bytes_per_node(HTMLElement, size, args.fanout, with_text)
+            print(f"{size:>10} {'yes' if with_text else 'no':>5} {legacy:>14.1f} {compact:>13.1f} {1 - compact / legacy:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#print-tree/print-indent基准：原来每行一次print，与现在拼成一个缓冲区一次输出比较；
+#以及限制行数（-n）、层数（-d）和只显示子树时的耗时，它们只遍历要输出的部分
+#输出写到行缓冲的/dev/null，与输出到终端时一样每行一次系统调用
+#python -m benchmarks.bench_print_tree [--size 100000] [--repeat 3]
+import argparse
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from model.traversal import walk, ENTER
+from benchmarks.generator import generate_document
+
+
+#原来的实现：树的格式，每行一次print
+def per_line_tree(document, showid=True) -> None:
+    prefixes = [""]
+    for event, node, level, is_last in walk(document.html):
+        if event != ENTER:
+            prefixes.pop()
+            continue
+        prefix = prefixes[-1]
+        connector = "" if level == 0 else ("└── " if is_last else "├── ")
+        if showid:
+            print(f"{prefix}{connector}{node.tag}{'#' + node.id if node.id else ''}")
+        else:
+            print(f"{prefix}{connector}{node.tag}")
+        if node.content:
+            content_prefix = prefix + ("    " if is_last else "|   ")
+            print(f"{content_prefix}└── {node.content}")
+        prefixes.append(prefix + ("    " if is_last else "│   "))
+
+
+def best_of(repeat, func, *args, **kwargs) -> float:
+    best = float("inf")
+    with open(os.devnull, "w", buffering=1, encoding="utf-8") as sink, redirect_stdout(sink):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*args, **kwargs)
+            best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    document = generate_document(args.size)
+    subtree = document.body.children[len(document.body.children) // 2].id
+    cases = (
+        ("tree, one print per line", per_line_tree, (document,), {}),
+        ("tree, buffered", document.display_tree_structure, (True,), {}),
+        ("indent, buffered", document.display_indent_structure, (2,), {}),
+        ("tree -n 50", document.display_tree_structure, (True,), {"limit": 50}),
+        ("tree -d 2", document.display_tree_structure, (True,), {"max_depth": 2}),
+        (f"tree {subtree}", document.display_tree_structure, (True,), {"root": subtree}),
+        (f"tree -d 1 {subtree}", document.display_tree_structure, (True,), {"root": subtree, "max_depth": 1}),
+    )
+    print(f"{args.size} elements, python {sys.version.split()[0]}")
+    for name, func, positional, options in cases:
+        print(f"{name:>28} {best_of(args.repeat, func, *positional, **options):>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+#会话恢复基准：比较 eager / lazy / parallel 三种方式恢复多个文件的启动时间
+#python -m benchmarks.bench_restore [--files 20] [--elements 5000]
+import argparse
+import json
+import os
+import tempfile
+import time
+from model.session_manager import SessionManager
+from benchmarks.common import build_document, quiet
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--elements", type=int, default=5000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            filenames = [f"page{i}.html" for i in range(args.files)]
+            document = build_document(args.elements)
+            for filename in filenames:
+                quiet(document.save, filename)
+            with open("session_state.json", "w") as f:
+                json.dump({"files": filenames, "active_editor": filenames[0], "showid": {}}, f)
+
+            print(f"{args.files} files x {args.elements} elements")
+            print(f"{'mode':>10} {'startup s':>10} {'first use s':>12}")
+            for mode in SessionManager.RESTORE_MODES:
+                start = time.perf_counter()
+                session = quiet(SessionManager, restore_mode=mode)
+                startup = time.perf_counter() - start
+                start = time.perf_counter()
+                quiet(session.edit_switch, filenames[-1])
+                first_use = time.perf_counter() - start
+                print(f"{mode:>10} {startup:>10.3f} {first_use:>12.3f}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
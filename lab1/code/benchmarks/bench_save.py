@@ -0,0 +1,54 @@
+#保存基准：比较原先递归拼接字符串的保存方式与流式写入的耗时和峰值内存，并校验输出逐字节一致
+#python -m benchmarks.bench_save [--sizes 10000 100000] [--text 200]
+import argparse
+import os
+import tempfile
+from model.html_element import HTMLElement
+from benchmarks.common import build_document, measure
+
+
+#旧实现：HTMLElement.__str__ 逐层 '\n'.join 后整体写入
+def legacy_str(element) -> str:
+    id_part = ' id="' + element.id + '"' if element.id else ''
+    tag_open = f"<{element.tag}{id_part}>"
+    tag_close = f"</{element.tag}>"
+    child_content = '\n'.join(legacy_str(child) for child in element.children)
+    return f"{tag_open}{element.content}{child_content}{tag_close}"
+
+
+def legacy_save(document, path) -> None:
+    html_content = "<!DOCTYPE html>\n" + legacy_str(document.html)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(html_content)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--text", type=int, default=200, help="extra characters of text per element")
+    args = parser.parse_args()
+
+    filler = "lorem ipsum " * (args.text // 12)
+    print(f"{'elements':>10} {'MB':>8} {'mode':>8} {'seconds':>9} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            document = build_document(size)
+            for element in document.iter_elements():
+                if element.tag == "p":
+                    element.set_content(element.content + filler)
+            legacy_path = os.path.join(directory, "legacy.html")
+            stream_path = os.path.join(directory, "stream.html")
+            results = [
+                ("legacy", measure(legacy_save, document, legacy_path)),
+                ("stream", measure(document.save, stream_path)),
+            ]
+            with open(legacy_path, "rb") as a, open(stream_path, "rb") as b:
+                if a.read() != b.read():
+                    raise SystemExit("streamed output differs from legacy output")
+            megabytes = os.path.getsize(stream_path) / 1e6
+            for name, (elapsed, peak, _, _) in results:
+                print(f"{size:>10} {megabytes:>8.1f} {name:>8} {elapsed:>9.3f} {peak / 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
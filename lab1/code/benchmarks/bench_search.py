@@ -0,0 +1,61 @@
+#查找基准：已载入文档中按倒排索引查找与逐个元素匹配的耗时（含第一次查找时建立索引），
+#以及未载入的文件逐个解析查找与在进程池中并行解析查找的耗时
+#python -m benchmarks.bench_search [--size 50000] [--queries 50] [--files 8]
+import argparse
+import os
+import re
+import tempfile
+import time
+from model.search import find_in_document, scan_files
+from model.text_index import TextIndex
+from benchmarks.common import build_document, quiet
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def full_scan(document, regex) -> list:
+    return [element for element in document.iter_elements() if element.content and regex.search(element.content)]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--files", type=int, default=8)
+    args = parser.parse_args()
+
+    document = build_document(args.size)
+    build_ms, _ = timed(TextIndex, document.html)
+    print(f"{args.size} elements, index built in {build_ms:.1f} ms")
+    print(f"{'query':>24} {'matches':>8} {'scan ms':>9} {'index ms':>9}")
+    patterns = (f"number {args.size // 2} with", "paragraph", "some text", r"number \d+5 ", "umber 12")
+    for pattern in patterns:
+        regex = re.compile(pattern)
+        find_in_document(document, regex)
+        scan_ms = index_ms = 0
+        for _ in range(args.queries):
+            elapsed, scanned = timed(full_scan, document, regex)
+            scan_ms += elapsed
+            elapsed, found = timed(find_in_document, document, regex)
+            index_ms += elapsed
+        assert found == scanned
+        print(f"{pattern:>24} {len(found):>8} {scan_ms / args.queries:>9.2f} {index_ms / args.queries:>9.2f}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(directory, f"doc{i}.html")
+            quiet(build_document(args.size // args.files * 2).save, path)
+            paths.append(path)
+        sequential_ms, _ = timed(scan_files, paths, "number 1234 ", max_workers=1)
+        pool_ms, _ = timed(scan_files, paths, "number 1234 ")
+        print(f"{args.files} files on disk: sequential {sequential_ms:.0f} ms, "
+              f"process pool ({min(args.files, os.cpu_count() or 1)} workers) {pool_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#编辑服务器基准：对同一个文件执行一条命令的延迟
+#比较每次启动main.py --batch（载入文件、执行命令、保存）、每条命令新建一个到服务器的连接、复用同一个连接、
+#流水线发送，以及多个客户端同时编辑各自的文件时服务器的吞吐量
+#python -m benchmarks.bench_server [--size 5000] [--spawns 10] [--commands 500] [--clients 4]
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from model.client import EditorClient
+from benchmarks.common import build_document, quiet
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def report(name, latencies) -> None:
+    print(f"{name:>28} {percentile(latencies, 0.5):>9.2f} {percentile(latencies, 0.99):>9.2f}")
+
+
+#每条命令启动一个进程：原来脚本的做法
+def spawn(directory, path, count) -> list:
+    latencies = []
+    for i in range(count):
+        script = f"load {path}\nedit-text p1 spawned {i}\nsave {path}\n"
+        start = time.perf_counter()
+        subprocess.run([sys.executable, MAIN, "--batch", "-"], input=script, text=True, cwd=directory,
+                       check=True, stdout=subprocess.DEVNULL)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def timed_commands(run, commands) -> list:
+    latencies = []
+    for command in commands:
+        start = time.perf_counter()
+        run(command)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+#clients个客户端同时各自编辑一个文件，返回每秒完成的命令数
+def throughput(address, paths, commands) -> float:
+    def worker(path):
+        with EditorClient(address) as client:
+            client.run(f"load {path}")
+            for i in range(commands):
+                client.run(f"edit-text p1 edit {i}")
+    threads = [threading.Thread(target=worker, args=(path,)) for path in paths]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(paths) * commands / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--spawns", type=int, default=10)
+    parser.add_argument("--commands", type=int, default=500)
+    parser.add_argument("--clients", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(max(args.clients, 1)):
+            path = os.path.join(directory, f"doc{i}.html")
+            quiet(build_document(args.size).save, path)
+            paths.append(path)
+        path = paths[0]
+        address = "unix:" + os.path.join(directory, "server.sock")
+        server = subprocess.Popen([sys.executable, MAIN, "--serve", address, "--no-journal"], cwd=directory,
+                                  stdout=subprocess.PIPE, text=True)
+        try:
+            server.stdout.readline()
+            print(f"{args.size} elements per file")
+            print(f"{'mode':>28} {'p50 ms':>9} {'p99 ms':>9}")
+            report("spawn main.py --batch", spawn(directory, path, args.spawns))
+
+            edits = [f"edit-text p1 edit {i}" for i in range(args.commands)]
+
+            def connect_per_command(command):
+                with EditorClient(address) as client:
+                    client.run(command, file=path)
+
+            with EditorClient(address) as client:
+                client.run(f"load {path}")
+                report("server, new connection", timed_commands(connect_per_command, edits))
+                report("server, one connection", timed_commands(client.run, edits))
+                report("server, read (undo-stats)", timed_commands(client.run, ["undo-stats"] * args.commands))
+                start = time.perf_counter()
+                client.execute_many(edits)
+                print(f"{'server, pipelined (mean)':>28} {(time.perf_counter() - start) * 1000 / args.commands:>9.2f}")
+                client.run("save-all")
+            print(f"{args.clients} clients editing their own files: "
+                  f"{throughput(address, paths[:args.clients], args.commands):.0f} commands/s")
+            with EditorClient(address) as client:
+                client.shutdown()
+            server.wait(timeout=60)
+        finally:
+            if server.poll() is None:
+                server.kill()
+
+
+if __name__ == "__main__":
+    main()
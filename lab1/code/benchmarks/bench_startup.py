@@ -0,0 +1,106 @@
+#启动基准：python -X importtime 统计的导入耗时，以及从启动进程到出现命令提示符的时间
+#场景：空会话、恢复上次打开的files个文件（eager/lazy）；对照组在运行main.py前先导入bs4、spellchecker、asyncio和
+#concurrent.futures（它们原来在启动时就被导入），差值即为延迟导入省下的时间
+#python -m benchmarks.bench_startup [--files 5] [--size 5000] [--repeat 5]
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from benchmarks.common import build_document, quiet
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+PROMPT = b"html-editor> "
+#原来在启动时就导入的模块
+EAGER_IMPORTS = "import bs4, spellchecker, asyncio, concurrent.futures.process"
+
+
+def command(preload, *args) -> list:
+    if not preload:
+        return [sys.executable, MAIN, *args]
+    code = (f"import sys, runpy; {EAGER_IMPORTS}; sys.argv = {[MAIN, *args]!r}; "
+            f"sys.path.insert(0, {os.path.dirname(MAIN)!r}); runpy.run_path({MAIN!r}, run_name='__main__')")
+    return [sys.executable, "-c", code]
+
+
+#启动到出现提示符的毫秒数，之后输入exit退出
+def time_to_prompt(directory, preload, args) -> float:
+    start = time.perf_counter()
+    process = subprocess.Popen(command(preload, *args), cwd=directory, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, bufsize=0)
+    output = b""
+    while PROMPT not in output:
+        chunk = process.stdout.read(65536)
+        if not chunk:
+            raise RuntimeError("editor exited before showing the prompt")
+        output += chunk
+    elapsed = (time.perf_counter() - start) * 1000
+    process.communicate(b"exit\n")
+    return elapsed
+
+
+#-X importtime的输出：返回(顶层导入的总耗时毫秒, 已导入的模块名集合, 耗时最多的几个顶层导入)
+def import_times(directory, args):
+    result = subprocess.run([sys.executable, "-X", "importtime", MAIN, *args], cwd=directory, input=b"exit\n",
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    total = 0
+    modules = set()
+    top = []
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        modules.add(name.strip())
+        if not name.startswith("  "):
+            total += int(cumulative)
+            top.append((int(cumulative), name.strip()))
+    top.sort(reverse=True)
+    return total / 1000, modules, top[:5]
+
+
+def median(values):
+    ordered = sorted(values)
+    return ordered[len(ordered) // 2]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=5)
+    parser.add_argument("--size", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as empty, tempfile.TemporaryDirectory() as restored:
+        files = []
+        for i in range(args.files):
+            path = f"doc{i}.html"
+            quiet(build_document(args.size).save, os.path.join(restored, path))
+            files.append(path)
+        with open(os.path.join(restored, "session_state.json"), "w") as state:
+            json.dump({"files": files, "active_editor": files[0], "showid": {}}, state)
+
+        total, modules, top = import_times(empty, [])
+        heavy = sorted(name for name in ("bs4", "spellchecker", "asyncio", "concurrent.futures") if name in modules)
+        print(f"imports at startup: {total:.1f} ms, heavy modules loaded: {', '.join(heavy) or 'none'}")
+        for cumulative, name in top:
+            print(f"  {name:<28} {cumulative / 1000:>7.1f} ms")
+
+        print(f"{'session':>24} {'lazy imports':>13} {'eager imports':>14}")
+        cases = (("empty", empty, []),
+                 (f"{args.files} files, eager", restored, ["--restore", "eager"]),
+                 (f"{args.files} files, lazy", restored, ["--restore", "lazy"]))
+        for name, directory, extra in cases:
+            results = []
+            for preload in (False, True):
+                #第一次运行建立解析缓存和日志，不计入
+                time_to_prompt(directory, preload, extra)
+                results.append(median([time_to_prompt(directory, preload, extra) for _ in range(args.repeat)]))
+            print(f"{name:>24} {results[0]:>10.0f} ms {results[1]:>11.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
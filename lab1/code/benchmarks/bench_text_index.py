@@ -0,0 +1,88 @@
+#单词倒排索引基准：在大文档中按单词、按前缀查找元素，比较逐个元素切分文本的全量扫描与文档维护的倒排索引；
+#并比较维护索引前后每次修改（edit-text、插入、删除）的耗时
+#python -m benchmarks.bench_text_index [--size 100000] [--queries 20] [--edits 2000]
+import argparse
+import time
+from model.html_element import HTMLElement
+from model.text_index import tokenize
+from benchmarks.common import build_document
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+#没有索引时的做法：遍历整棵树，切分每个元素的文本
+def scan_exact(document, word) -> list:
+    return [element for element in document.iter_elements() if element.content and word in tokenize(element.content)]
+
+
+def scan_prefix(document, prefix) -> list:
+    return [element for element in document.iter_elements()
+            if element.content and any(token.startswith(prefix) for token in tokenize(element.content))]
+
+
+def index_exact(document, word) -> list:
+    index = document.text_index
+    return index.ordered(index.exact(word), document.html)
+
+
+def index_prefix(document, prefix) -> list:
+    index = document.text_index
+    return index.ordered(index.prefix(prefix), document.html)
+
+
+#edits次修改：改写文本、插入新元素、删除刚插入的元素轮流进行，返回每次修改的平均耗时（微秒）
+def edit_cost(document, edits) -> float:
+    start = time.perf_counter()
+    for i in range(edits):
+        target = document.get_element(f"p{(i * 37) % 1000 * 11 + 1}")
+        if i % 3 == 0:
+            document.edit_element_content(target.id, f"edited paragraph {i} with new words w{i}")
+        elif i % 3 == 1:
+            document.insert_before(target.id, HTMLElement("p", content=f"inserted text {i}", element_id=f"x{i}"))
+        else:
+            document.delete_element(f"x{i - 1}")
+    return (time.perf_counter() - start) / edits * 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--edits", type=int, default=2000)
+    args = parser.parse_args()
+
+    document = build_document(args.size)
+    build_ms, _ = timed(document.enable_text_index)
+    print(f"{args.size} elements, {len(document.text_index.vocabulary)} words, index built in {build_ms:.0f} ms")
+    print(f"{'query':>22} {'matches':>8} {'scan ms':>9} {'index ms':>9}")
+    middle = args.size // 2 + 1
+    cases = (
+        ("exact", str(middle), scan_exact, index_exact),
+        ("exact", "paragraph", scan_exact, index_exact),
+        ("prefix", str(middle)[:-1], scan_prefix, index_prefix),
+        ("prefix", str(middle)[:-2], scan_prefix, index_prefix),
+        ("exact", "missing", scan_exact, index_exact),
+    )
+    for kind, word, scan, lookup in cases:
+        scan_ms = index_ms = 0
+        for _ in range(args.queries):
+            elapsed, scanned = timed(scan, document, word)
+            scan_ms += elapsed
+            elapsed, found = timed(lookup, document, word)
+            index_ms += elapsed
+        assert found == scanned
+        print(f"{kind + ' ' + word:>22} {len(found):>8} {scan_ms / args.queries:>9.2f} {index_ms / args.queries:>9.3f}")
+
+    plain = build_document(args.size)
+    indexed = build_document(args.size)
+    indexed.enable_text_index()
+    print(f"edit cost: {edit_cost(plain, args.edits):.1f} us without index, "
+          f"{edit_cost(indexed, args.edits):.1f} us with index")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#遍历基准：比较递归遍历与model.traversal显式栈遍历的吞吐量（节点/秒），并在极深的文档上做压力测试
+#python -m benchmarks.bench_traversal [--size 300000] [--depth 100000]
+import argparse
+import sys
+import time
+from model.html_element import HTMLElement
+from model.html_document import HTMLDocument
+from model.traversal import preorder, postorder, walk
+from benchmarks.common import build_document, quiet
+
+
+#旧实现：每个节点一次函数调用
+def recursive_preorder(element, visit) -> None:
+    visit(element)
+    for child in element.children:
+        recursive_preorder(child, visit)
+
+
+def deep_chain(depth) -> HTMLDocument:
+    document = HTMLDocument(title="Deep")
+    parent = document.body
+    for i in range(depth):
+        element = HTMLElement("div", element_id=f"d{i}")
+        parent.add_child(element)
+        parent = element
+    parent.set_content("leaf")
+    document.set_html(document.html)
+    return document
+
+
+def rate(func, root):
+    start = time.perf_counter()
+    count = func(root)
+    elapsed = time.perf_counter() - start
+    return count, count / elapsed if elapsed else float("inf")
+
+
+def count_recursive(root) -> int:
+    nodes = []
+    recursive_preorder(root, nodes.append)
+    return len(nodes)
+
+
+def count_iter(iterator):
+    return lambda root: sum(1 for _ in iterator(root))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=300000)
+    parser.add_argument("--depth", type=int, default=100000)
+    args = parser.parse_args()
+
+    walkers = [("recursive", count_recursive), ("preorder", count_iter(preorder)),
+               ("postorder", count_iter(postorder)), ("walk", count_iter(walk))]
+    shapes = [("wide", build_document(args.size).html), ("deep", deep_chain(args.depth).html)]
+    print(f"recursion limit {sys.getrecursionlimit()}")
+    print(f"{'shape':>6} {'walker':>10} {'nodes':>9} {'Mnodes/s':>9}")
+    for shape, root in shapes:
+        for name, func in walkers:
+            try:
+                count, speed = rate(func, root)
+                print(f"{shape:>6} {name:>10} {count:>9} {speed / 1e6:>9.2f}")
+            except RecursionError:
+                print(f"{shape:>6} {name:>10} {'RecursionError':>19}")
+
+    #压力测试：极深文档上的整树操作都应完成且结果正确
+    document = deep_chain(args.depth)
+    start = time.perf_counter()
+    html = str(document.html)
+    assert html.count("<div") == args.depth
+    ids = []
+    document.html.collect_ids(ids)
+    assert len(ids) == args.depth + 4
+    element = document.get_element("d10")
+    parent, index = document.detach_element(element)
+    assert not document.whether_exists_id(f"d{args.depth - 1}")
+    document.attach_element(parent, index, element)
+    assert document.get_element_content(f"d{args.depth - 1}") == "leaf"
+    assert quiet(document.content_digest) == quiet(document.content_digest)
+    print(f"stress: {args.depth}-deep serialize/collect/detach/attach/digest in {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#解析缓存基准：比较BeautifulSoup解析与读取缓存元素树的耗时
+#python -m benchmarks.bench_tree_cache [--sizes 1000 10000 50000]
+import argparse
+import os
+import tempfile
+import time
+from model.html_editor import parse_html_file
+from model.tree_cache import TreeCache
+from benchmarks.common import build_document, quiet
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'elements':>10} {'file MB':>8} {'parse s':>9} {'cached s':>9} {'entry MB':>9}")
+    with tempfile.TemporaryDirectory() as directory:
+        cache = TreeCache(os.path.join(directory, "cache"))
+        for size in args.sizes:
+            path = os.path.join(directory, f"doc{size}.html")
+            quiet(build_document(size).save, path)
+            parse_time, parsed = timed(parse_html_file, path)
+            cache.store(path, parsed)
+            cached_time, cached = timed(cache.load, path)
+            if cached is None or len(cached[2]) != len(parsed[2]):
+                raise SystemExit("cache entry does not match the parsed document")
+            entry_size = os.path.getsize(cache._entry_path(path)) / 1e6
+            print(f"{size:>10} {os.path.getsize(path) / 1e6:>8.2f} {parse_time:>9.3f} {cached_time:>9.3f} {entry_size:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#撤销历史基准：比较命令对象与整文档deepcopy快照两种方式下，每次编辑的耗时与历史占用内存
+#python -m benchmarks.bench_undo [--sizes 1000 10000 100000] [--edits 200] [--snapshot-limit 20000]
+import argparse
+import time
+import tracemalloc
+from copy import deepcopy
+from model.html_editor import HTMLEditor
+from benchmarks.common import build_document, quiet
+
+
+#旧实现：每次编辑前对整个文档做deepcopy
+class SnapshotEditor(HTMLEditor):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.snapshots = []
+
+    def _execute(self, command) -> bool:
+        snapshot = deepcopy(self.document)
+        if not command.execute():
+            return False
+        self.snapshots.append(snapshot)
+        return True
+
+
+def run_edits(editor, edits) -> None:
+    for i in range(edits):
+        editor.edit_element_content(f"p{(i * 7) % 100 + 1}", f"edited text {i}")
+
+
+def bench(editor_class, size, edits):
+    editor = editor_class()
+    editor.document = build_document(size)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    quiet(run_edits, editor, edits)
+    elapsed = time.perf_counter() - start
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return elapsed / edits * 1000, retained / edits
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--snapshot-limit", type=int, default=20000, help="deepcopy only runs up to this size")
+    args = parser.parse_args()
+
+    print(f"{'elements':>10} {'mode':>10} {'ms/edit':>10} {'bytes/edit':>12}")
+    for size in args.sizes:
+        for name, editor_class in (("command", HTMLEditor), ("snapshot", SnapshotEditor)):
+            if editor_class is SnapshotEditor and size > args.snapshot_limit:
+                continue
+            ms, retained = bench(editor_class, size, args.edits)
+            print(f"{size:>10} {name:>10} {ms:>10.3f} {retained:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
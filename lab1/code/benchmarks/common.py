@@ -0,0 +1,41 @@
+#基准测试公用的工具函数
+#在 lab1/code 目录下以 python -m benchmarks.<脚本名> 运行
+import io
+import time
+import tracemalloc
+from contextlib import redirect_stdout
+from model.html_document import HTMLDocument
+from model.html_element import HTMLElement
+
+
+#构造一个含约n个元素的文档：body下每个section含fanout个带文本的p
+def build_document(n, fanout=10) -> HTMLDocument:
+    document = HTMLDocument(title="Benchmark")
+    count = 0
+    section = None
+    while count < n:
+        if count % (fanout + 1) == 0:
+            section = HTMLElement("div", element_id=f"s{count}")
+            document.attach_element(document.body, len(document.body.children), section)
+        else:
+            element = HTMLElement("p", content=f"paragraph number {count} with some text", element_id=f"p{count}")
+            document.attach_element(section, len(section.children), element)
+        count += 1
+    return document
+
+
+#静默执行，屏蔽被测代码中的print
+def quiet(func, *args, **kwargs):
+    with redirect_stdout(io.StringIO()):
+        return func(*args, **kwargs)
+
+
+#返回(耗时秒数, tracemalloc统计的峰值字节数, 结束时仍保留的字节数, 返回值)
+def measure(func, *args, **kwargs):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = quiet(func, *args, **kwargs)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, current, result
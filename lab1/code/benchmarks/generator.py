@@ -0,0 +1,78 @@
+#基准测试用的合成数据：大小、深度、分支数和文本量可调的html文档，以及大小可调的目录树
+#同样的参数和seed总是生成同样的内容，不同时间的结果可以相互比较
+import os
+import random
+from collections import deque
+from model.html_document import HTMLDocument
+from model.html_element import HTMLElement
+
+#文本用词：大部分是常见英文单词，夹杂少量拼写错误，拼写检查有结果可报
+WORDS = ("the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog", "editor", "document", "element",
+         "paragraph", "section", "header", "content", "window", "simple", "number", "value", "river",
+         "mountain", "garden", "history", "letter", "market", "summer", "winter", "teacher", "student")
+MISSPELLED = ("documnet", "elemnt", "paragrpah", "recieve", "seperate", "teh", "wrold", "quikc")
+#内部元素和叶子元素的标签
+INNER_TAGS = ("div", "section", "ul")
+LEAF_TAGS = ("p", "li", "h1", "span")
+
+
+#一段含words个单词的文本，约每20个单词有一个拼写错误
+def make_text(rng, words) -> str:
+    return " ".join(rng.choice(MISSPELLED) if rng.random() < 0.05 else rng.choice(WORDS) for _ in range(words))
+
+
+#生成含size个元素（body之下）的文档：按层次从上到下填充，每个元素最多fanout个子元素，最多depth层；
+#depth层、fanout个子元素放不下size个元素时，多出的元素轮流加到最深一层内部元素的下面
+#每个元素带words个单词的文本（0为没有文本），id为e0、e1……按创建顺序编号
+def generate_document(size, depth=4, fanout=10, words=6, seed=0) -> HTMLDocument:
+    rng = random.Random(seed)
+    document = HTMLDocument(title="Synthetic")
+    #(可以接收子元素的元素, 层数, 已有子元素数)
+    root = [document.body, 0, 0]
+    parents = deque([root])
+    #最深一层的内部元素（depth为1时就是body）
+    deepest = [root] if depth <= 1 else []
+    for count in range(size):
+        if parents:
+            slot = parents[0]
+            slot[2] += 1
+            if slot[2] >= fanout:
+                parents.popleft()
+        else:
+            slot = deepest[count % len(deepest)]
+        parent, level = slot[0], slot[1] + 1
+        inner = level < depth
+        tag = rng.choice(INNER_TAGS if inner else LEAF_TAGS)
+        element = HTMLElement(tag, content=make_text(rng, words) if words else "", element_id=f"e{count}")
+        document.attach_element(parent, len(parent.children), element)
+        if inner:
+            entry = [element, level, 0]
+            parents.append(entry)
+            if level == depth - 1:
+                deepest.append(entry)
+    return document
+
+
+#生成文档并保存为html文件
+def write_document(path, size, depth=4, fanout=10, words=6, seed=0) -> None:
+    document = generate_document(size, depth, fanout, words, seed)
+    document.write(path, document.snapshot()[1])
+
+
+#在root下生成含files个文件的目录树：每层fanout个子目录，最多depth层，文件轮流放进各个目录；返回目录数
+def generate_directory(root, files, depth=3, fanout=5) -> int:
+    directories = [root]
+    queue = deque([(root, 0)])
+    while queue:
+        path, level = queue.popleft()
+        if level >= depth:
+            continue
+        for i in range(fanout):
+            child = os.path.join(path, f"dir{level}_{i}")
+            os.makedirs(child, exist_ok=True)
+            directories.append(child)
+            queue.append((child, level + 1))
+    for i in range(files):
+        directory = directories[i % len(directories)]
+        open(os.path.join(directory, f"page{i}.html" if i % 3 else f"note{i}.txt"), "w").close()
+    return len(directories)
@@ -0,0 +1,248 @@
+#基准测试套件：在不同大小的合成文档（benchmarks.generator）上测量各个常用操作的耗时和峰值内存，
+#结果保存为JSON，并与保存的基线比较，变慢超过阈值的操作列为回归（此时退出码为1）
+#耗时为多次运行的最小值（不开tracemalloc）；峰值内存为tracemalloc单独运行一次的统计
+#python -m benchmarks.suite [--sizes 1000 10000 50000] [--dir-sizes 500 5000] [--repeat 3]
+#                           [--output results.json] [--baseline benchmarks/baseline.json] [--update-baseline]
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from model.file_manager import FileManager
+from model.html_editor import HTMLEditor
+from benchmarks.common import quiet
+from benchmarks.generator import generate_document, generate_directory, write_document
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+#每次测量中查找、插入、删除的次数
+LOOKUPS = 1000
+EDITS = 200
+MIN_TOTAL = 0.2
+MAX_RUNS = 50
+
+
+#一个测量项：setup(环境)准备被测对象（不计时），run(对象)为被测操作
+class Case:
+
+    def __init__(self, name, setup, run) -> None:
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+
+#测量环境：一个大小的文档文件、随机选出的元素id、临时目录
+class Environment:
+
+    def __init__(self, directory, size, depth, fanout, words, seed) -> None:
+        self.directory = directory
+        self.size = size
+        self.path = os.path.join(directory, f"doc{size}.html")
+        write_document(self.path, size, depth, fanout, words, seed)
+        self.document = generate_document(size, depth, fanout, words, seed)
+        rng = random.Random(seed)
+        self.ids = [f"e{rng.randrange(size)}" for _ in range(LOOKUPS)]
+        #插入和删除的目标：后半部分编号的元素（大多是叶子），不重复
+        self.targets = rng.sample(range(size // 2, size), min(EDITS, size - size // 2))
+
+    def editor(self) -> HTMLEditor:
+        editor = HTMLEditor()
+        quiet(editor.read_html, self.path)
+        return editor
+
+
+def _read(env):
+    return env
+
+
+def _run_read(env):
+    editor = HTMLEditor()
+    editor.read_html(env.path)
+
+
+def _run_find(env):
+    document = env.document
+    for element_id in env.ids:
+        document.find_element_by_id(document.html, element_id)
+
+
+def _run_insert(editor_env):
+    editor, env = editor_env
+    for i, target in enumerate(env.targets):
+        editor.insert_before(f"e{target}", f"new{i}", "inserted text", "p")
+
+
+def _run_delete(editor_env):
+    editor, env = editor_env
+    for target in env.targets:
+        editor.delete_element(f"e{target}")
+
+
+#先做EDITS次插入和删除（不计时），测量全部撤销再全部重做
+def _setup_history(env):
+    editor = env.editor()
+    _run_insert((editor, env))
+    _run_delete((editor, env))
+    return editor
+
+
+def _run_undo_redo(editor):
+    steps = 0
+    while editor.undo():
+        steps += 1
+    for _ in range(steps):
+        editor.redo()
+
+
+def _run_save(editor_env):
+    editor, env = editor_env
+    editor.save(os.path.join(env.directory, "saved.html"))
+
+
+def _run_spelling(editor):
+    editor.check_spelling()
+
+
+def _run_print_tree(editor):
+    editor.print_tree()
+
+
+def _editor_env(env):
+    return env.editor(), env
+
+
+DOCUMENT_CASES = (
+    Case("read_html", _read, _run_read),
+    Case(f"find_element_by_id x{LOOKUPS}", _read, _run_find),
+    Case(f"insert_before x{EDITS}", _editor_env, _run_insert),
+    Case(f"delete_element x{EDITS}", _editor_env, _run_delete),
+    Case("undo/redo all", _setup_history, _run_undo_redo),
+    Case("save", _editor_env, _run_save),
+    Case("check_spelling", lambda env: env.editor(), _run_spelling),
+    Case("print_tree", lambda env: env.editor(), _run_print_tree),
+)
+
+
+#运行一个测量项：返回(最小耗时毫秒, 峰值内存KB)；被测代码的输出被屏蔽
+#计时时与timeit一样关闭垃圾回收；至少运行repeat次，很快的操作继续运行到累计MIN_TOTAL秒（最多MAX_RUNS次），减少计时误差
+def measure_case(case, env, repeat):
+    best = float("inf")
+    total = 0.0
+    runs = 0
+    while runs < repeat or (total < MIN_TOTAL and runs < MAX_RUNS):
+        target = case.setup(env)
+        gc.collect()
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            quiet(case.run, target)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        best = min(best, elapsed)
+        total += elapsed
+        runs += 1
+    target = case.setup(env)
+    tracemalloc.start()
+    quiet(case.run, target)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / 1024
+
+
+#运行全部测量项，返回 {操作: {大小: {"ms": 耗时, "peak_kb": 峰值内存}}}
+def run_suite(sizes, dir_sizes, repeat, depth, fanout, words, seed, progress=None) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        #拼写检查词典的加载只发生一次，不计入
+        quiet(generate_document(10).check_spelling)
+        for size in sizes:
+            env = Environment(directory, size, depth, fanout, words, seed)
+            for case in DOCUMENT_CASES:
+                ms, peak = measure_case(case, env, repeat)
+                results.setdefault(case.name, {})[str(size)] = {"ms": round(ms, 3), "peak_kb": round(peak, 1)}
+                if progress is not None:
+                    progress(case.name, size, ms, peak)
+        for files in dir_sizes:
+            root = os.path.join(directory, f"tree{files}")
+            generate_directory(root, files)
+            case = Case("display_directory", lambda _: root, lambda path: FileManager.display_directory("tree", root=path))
+            ms, peak = measure_case(case, None, repeat)
+            results.setdefault(case.name, {})[str(files)] = {"ms": round(ms, 3), "peak_kb": round(peak, 1)}
+            if progress is not None:
+                progress(case.name, files, ms, peak)
+    return results
+
+
+#与基线比较：返回 [(操作, 大小, 基线耗时, 当前耗时, 变化比例, 是否回归)]；
+#比基线慢threshold以上（比例）且多出min_ms以上（绝对值，排除计时误差）的记为回归
+def compare(results, baseline, threshold=0.25, min_ms=2.0) -> list:
+    rows = []
+    for name, by_size in results.items():
+        for size, current in by_size.items():
+            base = baseline.get(name, {}).get(size)
+            if base is None:
+                continue
+            change = current["ms"] / base["ms"] - 1 if base["ms"] else 0.0
+            regressed = change > threshold and current["ms"] - base["ms"] > min_ms
+            rows.append((name, size, base["ms"], current["ms"], change, regressed))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dir-sizes", type=int, nargs="+", default=[500, 5000])
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--words", type=int, default=6, help="words of text per element")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="compare against this results file")
+    parser.add_argument("--update-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative slowdown reported as a regression")
+    parser.add_argument("--min-ms", type=float, default=2.0, help="ignore slowdowns smaller than this (ms)")
+    args = parser.parse_args()
+
+    print(f"{'operation':>26} {'size':>7} {'ms':>10} {'peak KB':>10}")
+    results = run_suite(args.sizes, args.dir_sizes, args.repeat, args.depth, args.fanout, args.words, args.seed,
+                        progress=lambda name, size, ms, peak: print(f"{name:>26} {size:>7} {ms:>10.2f} {peak:>10.0f}"))
+    report = {
+        "meta": {"python": sys.version.split()[0], "platform": platform.platform(),
+                 "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                 "parameters": {"depth": args.depth, "fanout": args.fanout, "words": args.words, "seed": args.seed}},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --update-baseline to create one.")
+        return
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    if baseline["meta"]["parameters"] != report["meta"]["parameters"]:
+        print("Warning: the baseline was generated with different document parameters.")
+    rows = compare(results, baseline["results"], args.threshold, args.min_ms)
+    print(f"\ncompared with {args.baseline} ({baseline['meta']['date']}, {baseline['meta']['platform']})")
+    print(f"{'operation':>26} {'size':>7} {'base ms':>10} {'ms':>10} {'change':>8}")
+    for name, size, base, current, change, regressed in rows:
+        print(f"{name:>26} {size:>7} {base:>10.2f} {current:>10.2f} {change:>+7.0%}{'  REGRESSION' if regressed else ''}")
+    regressions = sum(row[5] for row in rows)
+    print(f"{regressions} regression(s)" if regressions else "No regressions.")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
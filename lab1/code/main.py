@@ -1,6 +1,69 @@
-from model.html_editor import HTMLEditor
+import argparse
+import sys
+from model.html_editor import HTMLEditor, LOADERS
 from model.session_manager import SessionManager
+from model.metrics import Metrics
+from model.history import DEFAULT_MAX_ENTRIES, DEFAULT_MAX_BYTES
+from model.journal import DEFAULT_FSYNC_INTERVAL, DEFAULT_CHECKPOINT_EVERY
 
 if __name__ == "__main__":
-    session = SessionManager()
-    session.run()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="HTML command line editor")
+    parser.add_argument("--restore", choices=SessionManager.RESTORE_MODES, default="eager",
+                        help="how to reopen the files of the last session")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always parse files instead of using the parsed-document cache")
+    parser.add_argument("--loader", choices=LOADERS, default="native",
+                        help="parser used to read html files (bs4 is the original BeautifulSoup loader)")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="run the commands in FILE ('-' for stdin) without prompting, then exit")
+    parser.add_argument("--serve", metavar="ADDRESS",
+                        help="run as a server for model/client.py on a unix socket (unix:PATH) or localhost port ([HOST:]PORT)")
+    parser.add_argument("--transactional", action="store_true",
+                        help="with --batch: apply every command or none of them")
+    parser.add_argument("--verbose", action="store_true",
+                        help="with --batch: show the messages of every command")
+    parser.add_argument("--undo-steps", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="keep at most this many undo steps per file")
+    parser.add_argument("--undo-memory", type=float, default=DEFAULT_MAX_BYTES / (1024 * 1024), metavar="MB",
+                        help="keep at most about this much undo history per file")
+    parser.add_argument("--undo-compress", action="store_true",
+                        help="keep older undo steps compressed in memory")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="do not keep the crash-recovery journal of unsaved edits")
+    parser.add_argument("--journal-fsync", type=float, default=DEFAULT_FSYNC_INTERVAL, metavar="SECONDS",
+                        help="flush the journal to disk at most this often (0 = after every edit)")
+    parser.add_argument("--journal-checkpoint", type=int, default=DEFAULT_CHECKPOINT_EVERY, metavar="N",
+                        help="write a checkpoint of the document and undo history every N journaled edits")
+    parser.add_argument("--no-text-index", action="store_true",
+                        help="do not keep a word index of each document (find/lookup/words rebuild it after edits)")
+    parser.add_argument("--autosave", type=float, metavar="SECONDS",
+                        help="save modified files automatically after SECONDS without edits")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="record the time and memory of every command and write them to FILE as JSON on exit")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="with --metrics: measure allocations with tracemalloc (slower)")
+    args = parser.parse_args()
+    undo_options = {"max_entries": args.undo_steps, "max_bytes": int(args.undo_memory * 1024 * 1024),
+                    "compress": args.undo_compress}
+    metrics = Metrics(trace_memory=args.trace_memory) if args.metrics else None
+    if args.batch is None:
+        session = SessionManager(restore_mode=args.restore, tree_cache=not args.no_cache, loader=args.loader,
+                                 undo_options=undo_options, journal=not args.no_journal,
+                                 journal_options={"fsync_interval": args.journal_fsync,
+                                                  "checkpoint_every": args.journal_checkpoint},
+                                 autosave=args.autosave, text_index=not args.no_text_index,
+                                 metrics=metrics, metrics_file=args.metrics)
+        if args.serve is None:
+            session.run()
+        else:
+            # asyncio 只在服务器模式下需要，不在启动时导入
+            from model.server import EditorServer
+            EditorServer(session, args.serve).run()
+    else:
+        # 批处理从空会话开始，也不改写 session_state.json，不记日志
+        session = SessionManager(tree_cache=not args.no_cache, loader=args.loader, restore=False,
+                                 undo_options=undo_options, journal=False, text_index=not args.no_text_index,
+                                 metrics=metrics, metrics_file=args.metrics)
+        errors = session.run_script(args.batch, transactional=args.transactional, verbose=args.verbose)
+        session.write_metrics()
+        sys.exit(1 if errors else 0)
@@ -0,0 +1,146 @@
+import threading
+import time
+from .file_manager import FileManager
+
+#默认在最后一次修改后空闲2秒保存；持续修改时距第一次未保存的修改最多10秒也会保存
+DEFAULT_DELAY = 2.0
+DEFAULT_MAX_DELAY = 10.0
+
+
+#自动保存：后台线程在文件空闲delay秒后保存，期间的多次修改合并为一次写入
+#命令执行时持有它作用的编辑器的锁（会话级命令持有全部编辑器的锁），保存分三步：
+#  1. 持有该编辑器的锁，取文档的快照（序列化结果），其他文件上的命令照常执行
+#  2. 不持有锁，把快照写入临时文件并fsync，命令行可以继续编辑这个文件
+#  3. 再次持有编辑器锁，文件仍打开、不在事务中且没有被命令行保存过更新的内容时，才替换目标文件并记录已保存，否则丢弃临时文件
+#后台线程不输出信息，避免打乱命令行提示；保存失败的文件记在errors中，由autosave命令显示
+#Service层
+class AutosaveWorker:
+
+    def __init__(self, session, delay=DEFAULT_DELAY, max_delay=DEFAULT_MAX_DELAY) -> None:
+        self.session = session
+        self.delay = delay
+        self.max_delay = max(max_delay, delay)
+        self._condition = threading.Condition()
+        #文件名 -> [保存时间, 第一次未保存修改的时间]
+        self._due = {}
+        self._saving = None
+        self._stopped = False
+        self.saves = 0
+        #文件名 -> 最近一次保存失败的原因
+        self.errors = {}
+        self._thread = threading.Thread(target=self._run, name="autosave", daemon=True)
+        self._thread.start()
+
+    #文件被修改，推迟它的保存时间（去抖）
+    def notify(self, filename) -> None:
+        with self._condition:
+            now = time.monotonic()
+            due = self._due.get(filename)
+            first = due[1] if due is not None else now
+            self._due[filename] = [min(now + self.delay, first + self.max_delay), first]
+            self._condition.notify()
+
+    #不再自动保存该文件；已经开始的保存在替换文件前会发现文件已关闭
+    def cancel(self, filename) -> None:
+        with self._condition:
+            self._due.pop(filename, None)
+
+    #立即保存所有等待中的文件，返回时已保存完毕；调用方不能持有编辑器锁，也不能在事务中
+    def flush(self) -> None:
+        with self._condition:
+            for due in self._due.values():
+                due[0] = 0
+            self._condition.notify()
+            while self._due or self._saving is not None:
+                self._condition.wait()
+
+    def pending(self) -> list:
+        with self._condition:
+            return sorted(self._due)
+
+    #停止后台线程，返回还没有保存的文件（包括正在保存、将被放弃的文件），由调用方决定是否保存；
+    #wait为True时等后台线程结束，此时调用方不能持有编辑器锁
+    def stop(self, wait=False) -> list:
+        with self._condition:
+            self._stopped = True
+            pending = set(self._due)
+            if self._saving is not None:
+                pending.add(self._saving)
+            self._due.clear()
+            self._condition.notify_all()
+        if wait:
+            self._thread.join()
+        return sorted(pending)
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                filename = None
+                while not self._stopped:
+                    now = time.monotonic()
+                    due = [(when, name) for name, (when, _) in self._due.items()]
+                    if due:
+                        when, filename = min(due)
+                        if when <= now:
+                            break
+                        self._condition.wait(when - now)
+                    else:
+                        self._condition.wait()
+                    filename = None
+                if self._stopped:
+                    return
+                del self._due[filename]
+                self._saving = filename
+            try:
+                self._save(filename)
+            finally:
+                with self._condition:
+                    self._saving = None
+                    self._condition.notify_all()
+
+    def _save(self, filename) -> None:
+        session = self.session
+        editor = session.editors.get(filename)
+        if editor is None or not editor.is_loaded():
+            return
+        with editor.lock:
+            if self._stopped or session.editors.get(filename) is not editor:
+                return
+            if session.transaction is not None:
+                #事务中的修改在提交后才写入文件
+                self.notify(filename)
+                return
+            document = editor.document
+            if document is None or not document.is_modified():
+                return
+            generation, chunks = document.snapshot()
+        staged = []
+        try:
+            digest = document.write(filename, chunks, staged=staged)
+        except Exception as e:
+            self.errors[filename] = str(e)
+            return
+        temp_path = staged[0][0]
+        with editor.lock:
+            if self._stopped or session.editors.get(filename) is not editor or editor.document is not document:
+                FileManager.discard_write(temp_path)
+                return
+            if session.transaction is not None:
+                FileManager.discard_write(temp_path)
+                self.notify(filename)
+                return
+            #写临时文件期间命令行已经保存了同样新或更新的内容
+            saved = document.saved_state()[0]
+            if saved is not None and saved >= generation:
+                FileManager.discard_write(temp_path)
+                return
+            try:
+                FileManager.commit_write(temp_path, filename)
+            except OSError as e:
+                FileManager.discard_write(temp_path)
+                self.errors[filename] = str(e)
+                return
+            document.mark_saved(generation, digest)
+            self.errors.pop(filename, None)
+            self.saves += 1
+            session.on_autosaved(filename)
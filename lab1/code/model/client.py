@@ -0,0 +1,104 @@
+import itertools
+import json
+import socket
+
+#TCP地址只写端口时的主机
+DEFAULT_HOST = "127.0.0.1"
+#execute_many每发送这么多条命令就读取一次结果，避免双方的套接字缓冲区都写满而互相等待
+_PIPELINE = 64
+
+
+#服务器地址：unix:<路径> 或含有/的路径为Unix域套接字，[host:]port为TCP
+#返回("unix", 路径)或("tcp", (host, port))，端口不是数字时抛出ValueError
+def parse_address(address):
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    if "/" in address:
+        return "unix", address
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or DEFAULT_HOST, int(port))
+
+
+#命令在服务器上执行失败，message为命令输出的最后一行
+class CommandFailed(Exception):
+    pass
+
+
+#编辑服务器（model/server.py）的客户端：每行一个JSON请求 {"id", "command"[, "file"]}，
+#服务器按顺序返回 {"id", "ok", "output", "file"}；file为这个连接的活动文件，各连接互不影响
+#Service层
+class EditorClient:
+
+    def __init__(self, address, timeout=None) -> None:
+        kind, target = parse_address(address)
+        if kind == "unix":
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.settimeout(timeout)
+            try:
+                self._socket.connect(target)
+            except OSError:
+                self._socket.close()
+                raise
+        else:
+            self._socket = socket.create_connection(target, timeout)
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self._socket.makefile("rwb")
+        self._ids = itertools.count(1)
+        #服务器上这个连接的活动文件
+        self.file = None
+
+    #执行一条命令，返回(是否成功, 输出)；file不为空时这条命令作用于该文件（须已打开），不改变活动文件
+    def execute(self, command, file=None):
+        return self.execute_many([command], file)[0]
+
+    #依次执行多条命令，先连续发送再读取结果（流水线），返回[(是否成功, 输出)]
+    def execute_many(self, commands, file=None) -> list:
+        results = []
+        commands = list(commands)
+        for start in range(0, len(commands), _PIPELINE):
+            chunk = commands[start:start + _PIPELINE]
+            for command in chunk:
+                request = {"id": next(self._ids), "command": command}
+                if file is not None:
+                    request["file"] = file
+                self._stream.write(json.dumps(request, ensure_ascii=False).encode("utf-8") + b"\n")
+            self._stream.flush()
+            for _ in chunk:
+                response = self._read()
+                results.append((response["ok"], response["output"]))
+        return results
+
+    #执行命令并返回输出，失败时抛出CommandFailed
+    def run(self, command, file=None) -> str:
+        ok, output = self.execute(command, file)
+        if not ok:
+            lines = output.strip().splitlines()
+            raise CommandFailed(lines[-1] if lines else "command failed")
+        return output
+
+    #让服务器保存会话状态后退出
+    def shutdown(self) -> None:
+        self._stream.write(b'{"command": "shutdown"}\n')
+        self._stream.flush()
+        self._read()
+        self.close()
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._socket.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _read(self) -> dict:
+        line = self._stream.readline()
+        if not line:
+            raise ConnectionError("server closed the connection")
+        response = json.loads(line)
+        self.file = response.get("file")
+        return response
@@ -0,0 +1,311 @@
+from .html_element import HTMLElement
+from .traversal import preorder
+
+#编辑命令，命令模式：每个命令只记录本次修改的增量（涉及的元素及其原位置/原值），
+#execute首次执行，undo撤销，redo重做。命令直接持有元素对象而不是id，
+#撤销/重做时文档状态与执行时一致，所以这些引用始终有效
+#Controller层
+class Command:
+
+    def __init__(self, document) -> None:
+        self.document = document
+
+    #首次执行，返回是否成功，失败的命令不进入历史
+    def execute(self) -> bool:
+        raise NotImplementedError
+
+    def undo(self) -> None:
+        raise NotImplementedError
+
+    def redo(self) -> None:
+        raise NotImplementedError
+
+    #命令持有的元素对象，撤销历史据此判断哪些元素被多个历史项共用
+    def elements(self):
+        return ()
+
+
+#插入元素：position为"before"时插入到目标元素之前，为"into"时追加为目标元素的子元素
+class InsertCommand(Command):
+
+    def __init__(self, document, target_id, element, position="before") -> None:
+        super().__init__(document)
+        self.target_id = target_id
+        self.element = element
+        self.position = position
+        self.parent = None
+        self.index = None
+
+    def execute(self) -> bool:
+        if self.position == "into":
+            return self.document.add_into(target_id=self.target_id, new_element=self.element)
+        return self.document.insert_before(target_id=self.target_id, new_element=self.element)
+
+    def undo(self) -> None:
+        self.parent, self.index = self.document.detach_element(self.element)
+
+    def redo(self) -> None:
+        #目标为根元素时插入不会生效，此时没有可恢复的位置
+        if self.parent is not None:
+            self.document.attach_element(self.parent, self.index, self.element)
+
+    def elements(self):
+        return (self.element, self.parent)
+
+
+#修改元素id
+class EditIdCommand(Command):
+
+    def __init__(self, document, target_id, new_id) -> None:
+        super().__init__(document)
+        self.old_id = target_id
+        self.new_id = new_id
+        self.element = None
+
+    def execute(self) -> bool:
+        if not self.document.edit_element_id(target_id=self.old_id, new_id=self.new_id):
+            return False
+        self.element = self.document.get_element(self.new_id)
+        return True
+
+    def undo(self) -> None:
+        self.document.rename_element(self.element, self.old_id)
+
+    def redo(self) -> None:
+        self.document.rename_element(self.element, self.new_id)
+
+    def elements(self):
+        return (self.element,)
+
+
+#修改元素文本
+class EditContentCommand(Command):
+
+    def __init__(self, document, target_id, new_content) -> None:
+        super().__init__(document)
+        self.target_id = target_id
+        self.new_content = new_content
+        self.old_content = None
+        self.element = None
+
+    def execute(self) -> bool:
+        element = self.document.get_element(self.target_id)
+        if element is not None:
+            self.old_content = element.content
+        if not self.document.edit_element_content(target_id=self.target_id, new_content=self.new_content):
+            return False
+        self.element = element
+        return True
+
+    def undo(self) -> None:
+        self.document.set_element_content(self.element, self.old_content)
+
+    def redo(self) -> None:
+        self.document.set_element_content(self.element, self.new_content)
+
+    def elements(self):
+        return (self.element,)
+
+
+#替换多个元素的文本（查找替换）：直接记录元素本身而不是id，重复的id也不会改错元素
+class ReplaceContentCommand(Command):
+
+    def __init__(self, document, targets, new_contents) -> None:
+        super().__init__(document)
+        self.targets = list(targets)
+        self.new_contents = list(new_contents)
+        self.old_contents = [element.content for element in self.targets]
+
+    def execute(self) -> bool:
+        if not self.targets or not all(self.document.is_attached(element) for element in self.targets):
+            return False
+        self.redo()
+        return True
+
+    def undo(self) -> None:
+        for element, content in zip(self.targets, self.old_contents):
+            self.document.set_element_content(element, content)
+
+    def redo(self) -> None:
+        for element, content in zip(self.targets, self.new_contents):
+            self.document.set_element_content(element, content)
+
+    def elements(self):
+        return tuple(self.targets)
+
+
+#删除元素：被删除的子树本身就是撤销所需的全部数据，只额外记录原父元素和位置
+class DeleteCommand(Command):
+
+    def __init__(self, document, target_id) -> None:
+        super().__init__(document)
+        self.target_id = target_id
+        self.element = None
+        self.parent = None
+        self.index = None
+
+    def execute(self) -> bool:
+        element = self.document.get_element(self.target_id)
+        if element is not None:
+            self.parent = element.parent
+            self.index = self.parent.children.index(element) if self.parent is not None else None
+        if not self.document.delete_element(element_id=self.target_id):
+            return False
+        self.element = element
+        return True
+
+    def undo(self) -> None:
+        self.document.attach_element(self.parent, self.index, self.element)
+
+    def redo(self) -> None:
+        self.document.detach_element(self.element)
+
+    def elements(self):
+        return (self.element, self.parent)
+
+
+#组合命令：一组已经构造好的命令作为一个整体执行、撤销和重做，在历史中只占一项
+class CompositeCommand(Command):
+
+    def __init__(self, document, commands) -> None:
+        super().__init__(document)
+        self.commands = list(commands)
+
+    #依次执行，任一命令失败时撤销已执行的部分，文档保持原样
+    def execute(self) -> bool:
+        for i, command in enumerate(self.commands):
+            if not command.execute():
+                for done in reversed(self.commands[:i]):
+                    done.undo()
+                return False
+        return True
+
+    def undo(self) -> None:
+        for command in reversed(self.commands):
+            command.undo()
+
+    def redo(self) -> None:
+        for command in self.commands:
+            command.redo()
+
+    def elements(self):
+        for command in self.commands:
+            yield from command.elements()
+
+
+#批量编辑：ops为操作元组的列表，格式与命令行一致：
+#  ("insert", tag, id, target_id[, content])  ("append", tag, id, parent_id[, content])
+#  ("edit-id", old_id, new_id)  ("edit-text", id[, content])  ("delete", id)
+#执行前先对照id索引模拟全部操作，任何一步不合法则整批拒绝、文档不做任何修改；校验通过后一次性执行，作为一个历史项
+class BatchCommand(CompositeCommand):
+
+    ARITY = {"insert": (4, 5), "append": (4, 5), "edit-id": (3, 3), "edit-text": (2, 3), "delete": (2, 2)}
+
+    def __init__(self, document, ops) -> None:
+        super().__init__(document, [])
+        self.ops = [tuple(op) for op in ops]
+        self.error = None
+
+    def execute(self) -> bool:
+        self.error = self.validate()
+        if self.error is not None:
+            print(f"Batch rejected: {self.error}")
+            return False
+        self.commands = [self._command(op) for op in self.ops]
+        return super().execute()
+
+    #按顺序模拟每个操作对id的影响，返回第一个错误的说明，全部合法时返回None
+    def validate(self):
+        simulation = _IdSimulation(self.document)
+        for number, op in enumerate(self.ops, 1):
+            arity = self.ARITY.get(op[0] if op else None)
+            if arity is None:
+                return f"op {number}: unknown operation {op[0] if op else ''!r}"
+            if not arity[0] <= len(op) <= arity[1]:
+                return f"op {number}: wrong number of arguments for {op[0]}"
+            error = simulation.apply(op)
+            if error is not None:
+                return f"op {number} ({op[0]}): {error}"
+        return None
+
+    def _command(self, op):
+        name = op[0]
+        if name in ("insert", "append"):
+            content = op[4] if len(op) == 5 else ""
+            element = HTMLElement(tag=op[1], content=content, element_id=op[2])
+            return InsertCommand(self.document, op[3], element, position="before" if name == "insert" else "into")
+        if name == "edit-id":
+            return EditIdCommand(self.document, op[1], op[2])
+        if name == "edit-text":
+            return EditContentCommand(self.document, op[1], op[2] if len(op) == 3 else "")
+        return DeleteCommand(self.document, op[1])
+
+
+#批量编辑校验用的id索引模拟：只在被操作过的id上保存索引副本，新插入的元素用占位对象表示，
+#元素树本身不做任何修改；删除时按“原有子元素（去掉已删除的）+ 本批新加的子元素”收集整棵子树
+class _IdSimulation:
+
+    def __init__(self, document) -> None:
+        self.document = document
+        self.buckets = {}
+        self.ids = {}
+        self.parents = {}
+        self.added = {}
+        self.removed = set()
+
+    def _bucket(self, element_id):
+        bucket = self.buckets.get(element_id)
+        if bucket is None:
+            bucket = self.buckets[element_id] = self.document.get_elements(element_id)
+        return bucket
+
+    def _resolve(self, element_id):
+        bucket = self._bucket(element_id)
+        return bucket[0] if bucket else None
+
+    def _parent(self, node):
+        if node in self.parents:
+            return self.parents[node]
+        return node.parent
+
+    def _children(self, node):
+        children = [child for child in getattr(node, "children", ()) if child not in self.removed]
+        return children + self.added.get(node, [])
+
+    def _add(self, element_id, parent):
+        node = object()
+        self.ids[node] = element_id
+        self.parents[node] = parent
+        self.added.setdefault(parent, []).append(node)
+        self._bucket(element_id).append(node)
+
+    def apply(self, op):
+        name = op[0]
+        if name in ("insert", "append"):
+            new_id, target_id = op[2], op[3]
+            if self._bucket(new_id):
+                return f"element with this id: {new_id} already exists!"
+            target = self._resolve(target_id)
+            if target is None:
+                return f"target element with this id: {target_id} doesn't exist!"
+            if name == "append":
+                self._add(new_id, target)
+            elif self._parent(target) is not None:
+                self._add(new_id, self._parent(target))
+            return None
+        target_id = op[1]
+        target = self._resolve(target_id)
+        if target is None:
+            return f"element with this id: {target_id} doesn't exist!"
+        if name == "edit-id":
+            new_id = op[2]
+            if self._bucket(new_id):
+                return f"element with this id: {new_id} already exists!"
+            self._bucket(target_id).remove(target)
+            self._bucket(new_id).append(target)
+            self.ids[target] = new_id
+        elif name == "delete":
+            for node in preorder(target, children=self._children):
+                self._bucket(self.ids.get(node, getattr(node, "id", None))).remove(node)
+                self.removed.add(node)
+        return None
@@ -0,0 +1,208 @@
+import os
+import re
+import time
+from collections import namedtuple
+from .traversal import walk
+
+#默认忽略的目录，与.gitignore的写法相同；dir-tree -a 时不忽略
+DEFAULT_IGNORE = ("node_modules", "__pycache__")
+#目录的mtime距今不足2秒时不缓存它的内容：同一个时间刻度内的后续修改可能不改变mtime
+_RACY_NS = 2 * 10 ** 9
+
+#遍历到的一项：name为文件名，path为完整路径，rel为相对遍历起点、以/分隔的路径（起点为""），
+#depth从起点的0开始，rules为对该目录生效的忽略规则（从起点到当前目录）
+DirNode = namedtuple("DirNode", "name path rel is_dir depth rules")
+
+
+#把.gitignore的通配符转换为正则表达式：*和?不匹配/，**匹配任意层目录
+def _translate(glob) -> str:
+    parts = []
+    i = 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith("**/", i):
+            parts.append("(?:.*/)?")
+            i += 3
+            continue
+        if glob.startswith("**", i):
+            parts.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            parts.append("[^/]*")
+        elif c == "?":
+            parts.append("[^/]")
+        elif c == "[":
+            #[!...]为取反，紧跟在[或[!后面的]是普通字符
+            start = i + 2 if glob.startswith("[!", i) else i + 1
+            if glob.startswith("]", start):
+                start += 1
+            end = glob.find("]", start)
+            if end < 0:
+                parts.append(re.escape(c))
+            else:
+                body = glob[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                parts.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif c == "\\" and i + 1 < len(glob):
+            i += 1
+            parts.append(re.escape(glob[i]))
+        else:
+            parts.append(re.escape(c))
+        i += 1
+    return "".join(parts)
+
+
+#一个.gitignore文件（或一组默认规则）中的规则；base为它所在目录相对遍历起点的路径（以/结尾，起点为""）
+#规则的含义与git相同：#开头为注释，!取反，以/结尾只匹配目录，含/（末尾除外）时相对base匹配，否则匹配任意层的文件名
+class IgnoreRules:
+
+    def __init__(self, lines, base="") -> None:
+        self.base = base
+        #(正则表达式, 是否取反, 是否只匹配目录)
+        self.rules = []
+        for line in lines:
+            line = line.rstrip("\n")
+            if not line.endswith("\\ "):
+                line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+            if "/" in line:
+                pattern = _translate(line.lstrip("/"))
+            else:
+                pattern = "(?:.*/)?" + _translate(line)
+            self.rules.append((re.compile(pattern + "$"), negate, dir_only))
+
+    #rel为相对遍历起点的路径；返回True（忽略）、False（被!规则重新包含）或None（没有规则匹配）
+    def match(self, rel, is_dir):
+        if self.base:
+            if not rel.startswith(self.base):
+                return None
+            rel = rel[len(self.base):]
+        result = None
+        for regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(rel):
+                result = not negate
+        return result
+
+
+#目录内容的缓存：按目录的mtime判断是否变化，目录下增删、重命名文件都会改变它的mtime；
+#子目录内部的变化不影响父目录的mtime，因此每个目录分别缓存、分别检查
+#Service层
+class DirectoryCache:
+
+    def __init__(self) -> None:
+        #目录路径 -> (mtime_ns, [(文件名, 是否为目录)])
+        self._listings = {}
+        #.gitignore路径 -> (mtime_ns, 内容的各行)
+        self._files = {}
+        self.hits = 0
+        self.misses = 0
+
+    def listdir(self, path) -> list:
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._listings.get(path)
+        if cached is not None and cached[0] == mtime:
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        entries = scan(path)
+        if time.time_ns() - mtime > _RACY_NS:
+            self._listings[path] = (mtime, entries)
+        return entries
+
+    def read_lines(self, path) -> list:
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._files.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        lines = read_lines(path)
+        if time.time_ns() - mtime > _RACY_NS:
+            self._files[path] = (mtime, lines)
+        return lines
+
+    def clear(self) -> None:
+        self._listings.clear()
+        self._files.clear()
+
+
+#列出目录内容，按文件名排序：os.scandir的DirEntry在读取目录时已带有类型信息，判断是否为目录不需要再stat；
+#指向目录的符号链接按文件处理，不进入，避免循环
+def scan(path) -> list:
+    with os.scandir(path) as it:
+        entries = [(entry.name, entry.is_dir(follow_symlinks=False)) for entry in it]
+    entries.sort()
+    return entries
+
+
+def read_lines(path) -> list:
+    with open(path, "r", encoding="utf-8", errors="replace") as file:
+        return file.read().splitlines()
+
+
+#目录遍历：用显式栈遍历（traversal.walk），可限制深度，按.gitignore和默认规则忽略文件，默认不显示以.开头的文件；
+#cache为DirectoryCache时目录内容按mtime缓存
+#Service层
+class DirectoryWalker:
+
+    def __init__(self, max_depth=None, show_hidden=False, gitignore=True, ignore=DEFAULT_IGNORE, cache=None) -> None:
+        self.max_depth = max_depth
+        self.show_hidden = show_hidden
+        self.gitignore = gitignore
+        self.ignore = IgnoreRules(ignore) if ignore else None
+        self.cache = cache
+
+    #产出traversal.walk的(事件, DirNode, 深度, 是否为最后一项)，起点本身深度为0
+    def walk(self, root):
+        rules = (self.ignore,) if self.ignore is not None else ()
+        return walk(DirNode(os.path.basename(root) or root, root, "", True, 0, rules), children=self._children)
+
+    def _children(self, node):
+        if not node.is_dir or (self.max_depth is not None and node.depth >= self.max_depth):
+            return ()
+        try:
+            entries = self.cache.listdir(node.path) if self.cache is not None else scan(node.path)
+        except OSError:
+            return ()
+        rules = node.rules
+        base = node.rel + "/" if node.rel else ""
+        if self.gitignore and (".gitignore", False) in entries:
+            path = os.path.join(node.path, ".gitignore")
+            try:
+                lines = self.cache.read_lines(path) if self.cache is not None else read_lines(path)
+            except OSError:
+                lines = ()
+            if lines:
+                rules = rules + (IgnoreRules(lines, base),)
+        children = []
+        parent = node.path if node.path.endswith(os.sep) else node.path + os.sep
+        for name, is_dir in entries:
+            if not self.show_hidden and name.startswith("."):
+                continue
+            rel = base + name
+            if rules and self._ignored(rules, rel, is_dir):
+                continue
+            children.append(DirNode(name, parent + name, rel, is_dir, node.depth + 1, rules))
+        return children
+
+    #越深的.gitignore优先，同一文件中后面的规则优先
+    @staticmethod
+    def _ignored(rules, rel, is_dir) -> bool:
+        for item in reversed(rules):
+            result = item.match(rel, is_dir)
+            if result is not None:
+                return result
+        return False
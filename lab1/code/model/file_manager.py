@@ -1,39 +1,83 @@
 import os
+import stat
+import tempfile
+from .dir_walker import DirectoryWalker
+from .traversal import ENTER
+
+#新建文件时使用的umask，第一次写入新文件时读取一次（_umask），之后不再读取，避免多线程保存时反复修改umask
+_UMASK = None
+
+
+#读取当前的umask：Linux上从/proc/self/status读取，不修改进程状态；
+#其他平台只能先设置再恢复，期间设为0o022，其他线程此时新建的文件也不会对所有用户可写
+def _read_umask() -> int:
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+def _umask() -> int:
+    global _UMASK
+    if _UMASK is None:
+        _UMASK = _read_umask()
+    return _UMASK
+
 
 class FileManager:
+    #显示目录结构：root默认为当前目录，max_depth限制显示的层数，show_all为True时显示以.开头的文件和被忽略的文件；
+    #open_files中的文件（已打开的编辑器）标记为*；整个结果拼成一个字符串，一次输出
     @staticmethod
-    def display_directory(style="tree", open_files=set()):
-        # 获取当前目录的所有文件和子文件夹
-        current_directory = os.getcwd()
-        items = os.listdir(current_directory)
-
-        if style == "tree":
-            FileManager._display_tree(current_directory, items, open_files)
-        elif style == "indent":
-            FileManager._display_indent(current_directory, items, open_files)
-        else:
+    def display_directory(style="tree", open_files=set(), root=None, max_depth=None, show_all=False, cache=None):
+        if style not in ("tree", "indent"):
             print("Unknown directory display style.")
+            return False
+        root = os.path.abspath(root if root is not None else os.getcwd())
+        if not os.path.isdir(root):
+            print(f"Not a directory: {root}")
+            return False
+        if show_all:
+            walker = DirectoryWalker(max_depth=max_depth, show_hidden=True, gitignore=False, ignore=(), cache=cache)
+        else:
+            walker = DirectoryWalker(max_depth=max_depth, cache=cache)
+        open_paths = {os.path.abspath(path) for path in open_files}
+        render = FileManager._tree_lines if style == "tree" else FileManager._indent_lines
+        lines = render(walker.walk(root), open_paths)
+        if lines:
+            print("\n".join(lines))
+        return True
 
     @staticmethod
-    def _display_tree(current_directory, items, open_files, prefix=""):
-        for i, item in enumerate(items):
-            path = os.path.join(current_directory, item)
-            connector = "└── " if i == len(items) - 1 else "├── "
-            is_open = " *" if item in open_files else ""
-            print(f"{prefix}{connector}{item}{is_open}")
-            if os.path.isdir(path):
-                new_prefix = prefix + ("    " if i == len(items) - 1 else "│   ")
-                FileManager._display_tree(path, os.listdir(path), open_files, new_prefix)
+    def _tree_lines(events, open_paths) -> list:
+        lines = []
+        prefixes = [""]
+        for event, node, depth, is_last in events:
+            if depth == 0:
+                continue
+            if event != ENTER:
+                prefixes.pop()
+                continue
+            connector = "└── " if is_last else "├── "
+            is_open = " *" if node.path in open_paths else ""
+            lines.append(f"{prefixes[-1]}{connector}{node.name}{is_open}")
+            prefixes.append(prefixes[-1] + ("    " if is_last else "│   "))
+        return lines
 
     @staticmethod
-    def _display_indent(current_directory, items, open_files, level=0):
-        indent = "    " * level
-        for item in items:
-            path = os.path.join(current_directory, item)
-            is_open = " *" if item in open_files else ""
-            print(f"{indent}{item}{is_open}")
-            if os.path.isdir(path):
-                FileManager._display_indent(path, os.listdir(path), open_files, level + 1)
+    def _indent_lines(events, open_paths) -> list:
+        lines = []
+        for event, node, depth, _ in events:
+            if depth == 0 or event != ENTER:
+                continue
+            is_open = " *" if node.path in open_paths else ""
+            lines.append(f"{'    ' * (depth - 1)}{node.name}{is_open}")
+        return lines
 
     @staticmethod
     def save_file(filepath, content):
@@ -44,6 +88,64 @@ class FileManager:
         except Exception as e:
             print(f"Error saving file {filepath}: {e}")
 
+    #原子写入：先写同目录下的临时文件并fsync，再rename覆盖目标文件，
+    #中途崩溃时目标文件要么是旧内容要么是新内容，不会只写了一半
+    @staticmethod
+    def atomic_write(filepath, chunks, buffering=1 << 16) -> None:
+        temp_path = FileManager.stage_write(filepath, chunks, buffering)
+        FileManager.commit_write(temp_path, filepath)
+
+    #原子写入的第一步：写入目标文件同目录下的临时文件并fsync，返回临时文件路径，
+    #之后由commit_write替换目标文件，或由discard_write丢弃
+    @staticmethod
+    def stage_write(filepath, chunks, buffering=1 << 16) -> str:
+        directory = os.path.dirname(os.path.abspath(filepath))
+        fd, temp_path = tempfile.mkstemp(prefix="." + os.path.basename(filepath) + ".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8", buffering=buffering) as file:
+                file.writelines(chunks)
+                file.flush()
+                os.fsync(file.fileno())
+        except BaseException:
+            FileManager.discard_write(temp_path)
+            raise
+        return temp_path
+
+    #原子写入的第二步：沿用目标文件的权限（新文件按umask），rename覆盖目标文件
+    @staticmethod
+    def commit_write(temp_path, filepath) -> None:
+        try:
+            if os.path.exists(filepath):
+                os.chmod(temp_path, stat.S_IMODE(os.stat(filepath).st_mode))
+            else:
+                os.chmod(temp_path, 0o666 & ~_umask())
+            os.replace(temp_path, filepath)
+        except BaseException:
+            FileManager.discard_write(temp_path)
+            raise
+        FileManager._fsync_directory(os.path.dirname(os.path.abspath(filepath)))
+
+    @staticmethod
+    def discard_write(temp_path) -> None:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+
+    #rename之后同步目录项，保证重命名本身落盘；不支持的平台（如Windows）直接跳过
+    @staticmethod
+    def _fsync_directory(directory) -> None:
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
     @staticmethod
     def load_file(filepath):
         if not os.path.exists(filepath):
@@ -0,0 +1,353 @@
+import io
+import pickle
+import sys
+import zlib
+from .commands import EditContentCommand
+from .html_element import HTMLElement
+from .traversal import preorder
+
+#默认上限：历史项数和估算的字节数，超出时从最早的项开始丢弃
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+#开启压缩时最近的这些项保持原样（至少最新的一项，以便继续合并），更早的项序列化并压缩保存
+DEFAULT_PLAIN_ENTRIES = 32
+#_pinned中每个键值对大约占用的字节数
+_PIN_BYTES = 100
+#脱离文档的元素每个大约占用的字节数（元素本身、子元素列表和文本字符串的固定部分），文本另按长度计
+_ELEMENT_BYTES = sys.getsizeof(HTMLElement("p")) + sys.getsizeof([]) + sys.getsizeof("")
+
+
+#以B/KB/MB显示字节数
+def format_bytes(size) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024 or unit == "MB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+#历史中的一项：command为原样保存的命令，压缩后为None，packed为(压缩数据, 共用对象表)
+class _Entry:
+
+    __slots__ = ("command", "packed", "size", "seq")
+
+    def __init__(self, command, size, seq) -> None:
+        self.command = command
+        self.packed = None
+        self.size = size
+        self.seq = seq
+
+
+#压缩历史项用的Pickler：private中的元素（只被这一项持有的已删除子树等）连同命令本身一起序列化，
+#文档和其他元素只记录在共用对象表中的位置，解压后仍是原来的对象
+class _EntryPickler(pickle.Pickler):
+
+    def __init__(self, file, document, private) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.document = document
+        self.private = private
+        self.table = []
+        self._positions = {}
+
+    def persistent_id(self, obj):
+        if obj is self.document or (type(obj) is HTMLElement and id(obj) not in self.private):
+            position = self._positions.get(id(obj))
+            if position is None:
+                position = self._positions[id(obj)] = len(self.table)
+                self.table.append(obj)
+            return position
+        return None
+
+
+class _EntryUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, table) -> None:
+        super().__init__(file)
+        self.table = table
+
+    def persistent_load(self, pid):
+        return self.table[pid]
+
+
+#已脱离文档的元素所在子树的根：沿父元素向上，直到父元素的子元素中不再包含它（parent可能是删除前的旧值）
+def _detached_root(element):
+    while element.parent is not None and any(child is element for child in element.parent.children):
+        element = element.parent
+    return element
+
+
+#估算一个命令占用的字节数：命令对象及其字符串属性，加上它持有的、已脱离文档的子树
+def estimate_size(command) -> int:
+    size = sys.getsizeof(command) + sys.getsizeof(command.__dict__)
+    for value in command.__dict__.values():
+        if isinstance(value, str):
+            size += sys.getsizeof(value)
+        elif isinstance(value, list):
+            size += sys.getsizeof(value)
+            for item in value:
+                size += estimate_size(item) if hasattr(item, "__dict__") else sys.getsizeof(item)
+    document = command.document
+    for element in command.elements():
+        if element is not None and not document.is_attached(element):
+            for node in preorder(element):
+                size += _ELEMENT_BYTES + len(node.content)
+    return size
+
+
+#撤销/重做历史：按项数和估算字节数限制大小，超出时丢弃最早的项；
+#连续对同一元素的edit-text合并为一项；开启压缩时较早的项以zlib压缩保存，撤销到它时才解压
+#Service层
+class UndoHistory:
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, compress=False,
+                 plain_entries=DEFAULT_PLAIN_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.plain_entries = plain_entries
+        self._undo = []
+        self._redo = []
+        self._seq = 0
+        #被压缩项按引用保存的元素 -> 引用它的压缩项个数，压缩其他项时这些元素同样只能按引用保存
+        self._pinned = {}
+        #无法序列化（子树过深）而保持原样的较早项
+        self._unpackable = []
+        #最后一次操作是否为可继续合并的edit-text
+        self._open = False
+        #事务进行中（hold到release之间）不压缩也不丢弃任何项，回滚需要的项都保留
+        self.held = False
+        self.bytes = 0
+        self.evicted = 0
+        self.coalesced = 0
+
+    #_pinned以对象的id为键，序列化时不保存，反序列化后按压缩项的共用对象表重建
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_pinned"]
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.held = False
+        self.__dict__.update(state)
+        self._pinned = {}
+        for entry in self._undo:
+            if entry.packed is not None:
+                for obj in entry.packed[1]:
+                    self._pinned[id(obj)] = self._pinned.get(id(obj), 0) + 1
+
+    def __len__(self) -> int:
+        return len(self._undo)
+
+    def __bool__(self) -> bool:
+        return bool(self._undo)
+
+    #记录一个已执行的命令，清空重做栈
+    def push(self, command) -> None:
+        self._drop(self._redo)
+        self._redo = []
+        top = self._undo[-1] if self._undo else None
+        if (self._open and top is not None and top.command is not None
+                and isinstance(command, EditContentCommand) and top.command.element is command.element):
+            top.command.new_content = command.new_content
+            self._resize(top, estimate_size(top.command))
+            self.coalesced += 1
+            return
+        self._seq += 1
+        entry = _Entry(command, estimate_size(command), self._seq)
+        self._undo.append(entry)
+        self.bytes += entry.size
+        self._open = isinstance(command, EditContentCommand)
+        self._enforce()
+
+    #撤销最后一项并移入重做栈，没有可撤销的项时返回False
+    def undo(self) -> bool:
+        self._open = False
+        if not self._undo:
+            return False
+        entry = self._undo.pop()
+        self._inflate(entry)
+        entry.command.undo()
+        self._redo.append(entry)
+        return True
+
+    #重做并移回历史，没有可重做的项时返回False；重做之后才检查上限，压缩的是重做后的状态
+    def redo(self) -> bool:
+        self._open = False
+        if not self._redo:
+            return False
+        entry = self._redo.pop()
+        entry.command.redo()
+        self._undo.append(entry)
+        self._enforce()
+        return True
+
+    def clear(self) -> None:
+        self._undo = []
+        self._redo = []
+        self._pinned = {}
+        self._unpackable = []
+        self._open = False
+        self.bytes = 0
+
+    #之后的命令不再与当前最后一项合并
+    def seal(self) -> None:
+        self._open = False
+
+    #最后一项的命令（redo为True时为重做栈的最后一项），没有时返回None
+    def last(self, redo=False):
+        entries = self._redo if redo else self._undo
+        if not entries:
+            return None
+        self._inflate(entries[-1])
+        return entries[-1].command
+
+    #开始保留全部项，直到release；release之后再按上限压缩和丢弃
+    def hold(self) -> None:
+        self.held = True
+
+    def release(self) -> None:
+        self.held = False
+        self._enforce()
+
+    #当前位置，之后新增的项可以用fold合并
+    def mark(self) -> int:
+        return self._seq
+
+    #把mark之后新增、仍在历史中的项交给combine合并为一个命令
+    def fold(self, mark, combine) -> None:
+        start = len(self._undo)
+        while start > 0 and self._undo[start - 1].seq > mark:
+            start -= 1
+        added = self._undo[start:]
+        if len(added) < 2:
+            return
+        for entry in added:
+            self._inflate(entry)
+        command = combine([entry.command for entry in added])
+        del self._undo[start:]
+        for entry in added:
+            self.bytes -= entry.size
+        self._seq += 1
+        entry = _Entry(command, estimate_size(command), self._seq)
+        self._undo.append(entry)
+        self.bytes += entry.size
+        self._open = False
+
+    #保存当前状态，用于事务回滚
+    def snapshot(self):
+        return list(self._undo), list(self._redo)
+
+    #恢复snapshot的结果；其间可能有项被压缩或丢弃，全部解压后重新计数
+    def restore(self, state) -> None:
+        undo, redo = state
+        for entry in self._undo + self._redo + undo + redo:
+            if entry.packed is not None:
+                self._unpack(entry)
+        self._pinned = {}
+        self._unpackable = []
+        self._undo = list(undo)
+        self._redo = list(redo)
+        self.bytes = sum(entry.size for entry in self._undo + self._redo)
+        self._open = False
+
+    #统计信息：(历史项数, 其中压缩的项数, 重做项数, 估算字节数, 压缩项的字节数)
+    def stats(self):
+        packed = [entry for entry in self._undo if entry.packed is not None]
+        return len(self._undo), len(packed), len(self._redo), self.bytes, sum(entry.size for entry in packed)
+
+    def _resize(self, entry, size) -> None:
+        self.bytes += size - entry.size
+        entry.size = size
+
+    #先压缩较早的项，仍超出上限时丢弃最早的项，最近的一项总是保留；hold期间什么也不做
+    def _enforce(self) -> None:
+        if self.held:
+            return
+        if self.compress:
+            #已压缩的项总在最前面，从最新的项往前数到第一个已压缩的项即可；按从旧到新的顺序压缩
+            excess = []
+            plain = 0
+            for entry in reversed(self._undo):
+                if entry.packed is not None:
+                    break
+                plain += 1
+                if plain > max(self.plain_entries, 1) and entry not in self._unpackable:
+                    excess.append(entry)
+            for entry in reversed(excess):
+                self._pack(entry)
+        drop = 0
+        while len(self._undo) - drop > 1 and (len(self._undo) - drop > self.max_entries or self.bytes > self.max_bytes):
+            self._drop((self._undo[drop],))
+            drop += 1
+        if drop:
+            del self._undo[:drop]
+            self.evicted += drop
+
+    #丢弃的项不再计入字节数，释放它们对共用元素的引用
+    def _drop(self, entries) -> None:
+        for entry in entries:
+            self.bytes -= entry.size
+            if entry.packed is not None:
+                self._unpin(entry.packed[1])
+            elif entry in self._unpackable:
+                self._unpackable.remove(entry)
+
+    def _pack(self, entry) -> None:
+        command = entry.command
+        document = command.document
+        #仍原样保存的项（较新的项、重做栈和无法压缩的项）直接持有的元素
+        shared = set()
+        others = []
+        for other in reversed(self._undo):
+            if other.packed is not None:
+                break
+            others.append(other)
+        for other in others + self._redo + self._unpackable:
+            if other is not entry and other.command is not None:
+                shared.update(id(element) for element in other.command.elements() if element is not None)
+        #已脱离文档的元素按所在的整棵脱离子树判断：子树中没有任何元素被其他地方引用时才能连同命令一起序列化，
+        #否则序列化后的副本与仍被引用的原对象互相指向对方的父/子元素，撤销时树会错乱
+        private = set()
+        for element in command.elements():
+            if element is None or id(element) in private or document.is_attached(element):
+                continue
+            nodes = [id(node) for node in preorder(_detached_root(element))]
+            if not any(node in shared or node in self._pinned for node in nodes):
+                private.update(nodes)
+        buffer = io.BytesIO()
+        pickler = _EntryPickler(buffer, document, private)
+        try:
+            pickler.dump(command)
+        except RecursionError:
+            #极深的子树无法序列化，保持原样
+            self._unpackable.append(entry)
+            return
+        blob = zlib.compress(buffer.getvalue())
+        entry.command = None
+        entry.packed = (blob, pickler.table)
+        for obj in pickler.table:
+            self._pinned[id(obj)] = self._pinned.get(id(obj), 0) + 1
+        #共用对象表中的每一项另外占用_pinned中的一个键值对
+        self._resize(entry, sys.getsizeof(blob) + sys.getsizeof(pickler.table) + sys.getsizeof(entry.packed)
+                     + _PIN_BYTES * len(pickler.table))
+
+    def _inflate(self, entry) -> None:
+        if entry.packed is None:
+            return
+        self._unpin(entry.packed[1])
+        size = entry.size
+        self._unpack(entry)
+        self.bytes += entry.size - size
+
+    def _unpack(self, entry) -> None:
+        blob, table = entry.packed
+        entry.command = _EntryUnpickler(io.BytesIO(zlib.decompress(blob)), table).load()
+        entry.packed = None
+        entry.size = estimate_size(entry.command)
+
+    def _unpin(self, table) -> None:
+        for obj in table:
+            count = self._pinned[id(obj)] - 1
+            if count:
+                self._pinned[id(obj)] = count
+            else:
+                del self._pinned[id(obj)]
@@ -1,14 +1,31 @@
 from .html_element import HTMLElement
+from .spell_service import default_spell_service
+from .html_writer import iter_document
+from .file_manager import FileManager
+from .traversal import preorder, walk, tree_path, ENTER
+from .text_index import TextIndex
+from . import metrics
+import hashlib
+import io
 import os
-from spellchecker import SpellChecker
+import sys
+
+#保存文件时的写缓冲区大小
+WRITE_BUFFER_SIZE = 1 << 16
+
+
+#边产出片段边计算摘要
+def _hashing(chunks, hasher):
+    for chunk in chunks:
+        hasher.update(chunk.encode("utf-8"))
+        yield chunk
+
 
 #整个html文档，最外层为html元素，包含head和body
 #Service层
 class HTMLDocument:
 
     def __init__(self, title="My Webapp") -> None:
-        #ids为了方便判断是否存在
-        self.ids = ["html", "body", "title", "head"]
         self.html = HTMLElement("html")
         self.body = HTMLElement("body")
         self.head = HTMLElement("head")
@@ -18,40 +35,82 @@ class HTMLDocument:
         self.html.add_child(self.head)
         self.html.add_child(self.body)
 
-        self.spell_checker = SpellChecker()
+        #id索引：id -> 拥有该id的元素列表（按文档顺序），解析得到的html里可能有重复id
+        self._index = {}
+        #单词倒排索引（TextIndex），为None时不维护，见enable_text_index
+        self.text_index = None
+        self._reset_spell_state()
+        #generation每次修改加一；_saved_generation/_saved_digest记录与磁盘一致时的版本和内容摘要，
+        #_saved_generation为None表示从未与磁盘同步过（新建的文档）
+        self.generation = 0
+        self._saved_generation = None
+        self._saved_digest = None
+        self._register_subtree(self.html)
+
+    #ids为索引的视图，方便判断是否存在
+    @property
+    def ids(self):
+        return self._index.keys()
+
+    #替换整棵元素树，index为构建树时顺便生成的索引，未提供则重新遍历生成
+    def set_html(self, html_element, index=None) -> None:
+        self.html = html_element
+        self.generation += 1
+        self._saved_generation = None
+        self._saved_digest = None
+        self._reset_spell_state()
+        if index is None:
+            self._index = {}
+            self._register_subtree(html_element)
+        else:
+            self._index = index
+        if self.text_index is not None:
+            self.text_index = TextIndex(html_element)
+
+    #开始维护单词倒排索引（已在维护时直接返回），之后对树的修改都会同步更新它
+    def enable_text_index(self) -> TextIndex:
+        if self.text_index is None:
+            self.text_index = TextIndex(self.html)
+        return self.text_index
 
-    def set_ids(self, new_ids) -> None:
-        self.ids = new_ids
+    def disable_text_index(self) -> None:
+        self.text_index = None
 
     def set_showid(self, showid) -> None:
         self.showid = showid
 
     #修改title内容
     def set_title(self, new_title) -> None:
-        self.title.set_content(new_title)
+        self.set_element_content(self.title, new_title)
 
     #按照元素id判断元素是否存在
     def whether_exists_id(self, id) -> bool:
-        if id in self.ids:
-            return True
-        return False
+        return id in self._index
     
     #判断元素是否存在
     def whether_exists_element(self, element) -> bool:
         return self.whether_exists_id(element.id)
     
-    #通过id获取元素
+    #通过id获取元素，element参数仅为兼容保留，查找直接走索引
     def find_element_by_id(self, element, target_id):
-            if self.whether_exists_id(target_id) is False:
-                print(f"target element with this id: {target_id} doesn`t exsist!")
-                return None
-            for child in element.children:
-                if child.id == target_id:
-                    return child
-                res = self.find_element_by_id(child, target_id)
-                if res is not None:
-                    return res
+        bucket = self._index.get(target_id)
+        if not bucket:
+            print(f"target element with this id: {target_id} doesn`t exsist!")
             return None
+        return bucket[0]
+
+    #通过id获取元素，不存在时返回None且不打印提示
+    def get_element(self, target_id):
+        bucket = self._index.get(target_id)
+        return bucket[0] if bucket else None
+
+    #拥有该id的全部元素（按文档顺序），返回副本
+    def get_elements(self, target_id) -> list:
+        return list(self._index.get(target_id, ()))
+
+    #元素是否在当前的元素树中（删除、撤销插入后脱离树的元素不在索引里）
+    def is_attached(self, element) -> bool:
+        return any(item is element for item in self._index.get(element.id, ()))
     
     #在某元素前插入元素
     def insert_before(self, target_id, new_element) -> bool:
@@ -66,9 +125,7 @@ class HTMLDocument:
             parent = target_element.parent
             if parent:
                 index = parent.children.index(target_element)
-                parent.children.insert(index, new_element)
-                new_element.set_parent(parent)
-                self.ids.append(new_element.id)
+                self.attach_element(parent, index, new_element)
             return True
         else:
             print(f"Element with id '{target_id}' not found.")
@@ -87,13 +144,7 @@ class HTMLDocument:
             parent = target_element.parent
             if parent:
                 index = parent.children.index(target_element)
-                if index < len(parent.children) - 1:
-                    parent.children.insert(index + 1, new_element)
-                    new_element.set_parent = parent
-                    self.ids.append(new_element.id)
-                else:
-                    parent.add_child(new_element)
-                    self.ids.append(new_element.id)
+                self.attach_element(parent, index + 1, new_element)
             return True
         else:
             print(f"Element with id '{target_id}' not found.")
@@ -109,8 +160,7 @@ class HTMLDocument:
             return False
         target_element = self.find_element_by_id(self.html, target_id)
         if target_element:
-            target_element.add_child(new_element)
-            self.ids.append(new_element.id)
+            self.attach_element(target_element, len(target_element.children), new_element)
             return True
         else:
             print(f"Element with id '{target_id}' not found.")
@@ -125,8 +175,7 @@ class HTMLDocument:
             print(f"element with this id: {target_id} doesn't exist!")
             return False
         target_element = self.find_element_by_id(self.html, target_id)
-        self.ids[self.ids.index(target_id)] = new_id
-        target_element.set_id(new_id)
+        self.rename_element(target_element, new_id)
         return True
 
     #修改元素文本
@@ -135,7 +184,7 @@ class HTMLDocument:
             print(f"element with this id: {target_id} doesn't exist!")
             return False
         target_element = self.find_element_by_id(self.html, target_id)
-        target_element.set_content(new_content)
+        self.set_element_content(target_element, new_content)
         return True
 
     #删除某元素
@@ -144,111 +193,355 @@ class HTMLDocument:
             print(f"element with this id: {element_id} doesn't exist!")
             return False
         target_element = self.find_element_by_id(self.html, element_id)
-        parent = target_element.parent
-        if parent is not None:
-            parent.children.remove(target_element)
-        self._remove_element_recursively(target_element)
+        self.detach_element(target_element)
         return True
+
+    #以下为不做校验的底层修改操作，所有对树的修改都经过这里以维护索引，也供撤销/重做使用
+    #把元素（连同子树）挂到parent的第index个子元素位置
+    def attach_element(self, parent, index, element) -> None:
+        self._touch()
+        if parent is not None:
+            parent.insert_child(index, element)
+        self._register_subtree(element)
+        if self.text_index is not None:
+            self.text_index.add_subtree(element)
+
+    #把元素（连同子树）从树上摘下，返回原父元素和原位置
+    def detach_element(self, element):
+        self._touch()
+        parent = element.parent
+        index = None
+        if parent is not None:
+            index = parent.remove_child(element)
+        self._remove_element_recursively(element)
+        if self.text_index is not None:
+            self.text_index.remove_subtree(element)
+        return parent, index
+
+    #修改元素id并更新索引
+    def rename_element(self, element, new_id) -> None:
+        self._touch()
+        self._unregister(element)
+        element.set_id(new_id)
+        self._register(element)
+
+    #修改元素文本
+    def set_element_content(self, element, new_content) -> None:
+        self._touch()
+        old_content = element.content
+        element.set_content(new_content)
+        self._spell_dirty.add(element)
+        if self.text_index is not None:
+            self.text_index.update(element, old_content, new_content)
     
-    #打印树形结构
-    def display_tree_structure(self, showid) -> None:
-        self._display_tree(self.html, level=0, is_first=True, is_last=True, prefix="", showid=showid)
+    #打印树形结构，root、max_depth、limit、pager的含义见_render_lines；找不到root时返回False
+    def display_tree_structure(self, showid, root=None, max_depth=None, limit=None, pager=False) -> bool:
+        element = self._display_root(root)
+        if element is None:
+            return False
+        self._render_lines(self._tree_lines(element, showid, max_depth), limit, pager)
+        return True
 
     #打印缩进结构
-    def display_indent_structure(self, indent) -> None:
-        self._display_indent(self.html, level=0, indent=indent)
+    def display_indent_structure(self, indent, root=None, max_depth=None, limit=None, pager=False) -> bool:
+        element = self._display_root(root)
+        if element is None:
+            return False
+        self._render_lines(self._indent_lines(element, indent, max_depth), limit, pager)
+        return True
 
-    #拼写检查
-    def check_spelling(self) -> None:
+    #拼写检查，spell_service为空时使用默认的共享服务，返回 {单词: (建议列表, 元素id列表)}
+    #只重新检查上次检查后新增或修改过文本的元素，其余元素沿用缓存的结果
+    def check_spelling(self, spell_service=None) -> dict:
         print("Checking spelling in the document...")
-        errors = self._check_spelling_recursively(self.html)
+        spell_service = spell_service or default_spell_service
+        full = self._spell_full or spell_service.key() != self._spell_key
+        targets = list(self.iter_elements()) if full else self._spell_dirty
+        #只有加载词典的失败（没有安装pyspellchecker、词典文件无法读取、不支持的语言）报告为无法加载，其余错误照常抛出
+        try:
+            spell_service.get_checker()
+        except (ImportError, OSError, ValueError) as e:
+            print(f"Failed to load spell checker: {e}")
+            return {}
+        unknown = spell_service.find_unknown(targets)
+        if full:
+            self._spell_results = unknown
+        else:
+            for element in targets:
+                self._spell_results.pop(element, None)
+            self._spell_results.update(unknown)
+            if unknown:
+                #新的结果排在字典末尾，按文档顺序重排，报告中每个单词的位置才按文档顺序列出
+                results = self._spell_results
+                self._spell_results = {element: results[element] for element in self.iter_elements()
+                                       if element in results}
+        self._spell_dirty = set()
+        self._spell_full = False
+        self._spell_key = spell_service.key()
+        errors = spell_service.report(self._spell_results.items())
         if not errors:
             print("No spelling errors found.")
         else:
             print("Spelling errors found:")
-            for word, suggestions in errors.items():
-                print(f" - '{word}' may be incorrect. Suggestions: {suggestions}")
+            for word, (suggestions, locations) in errors.items():
+                print(f" - '{word}' may be incorrect. Suggestions: {suggestions} (in: {', '.join(locations)})")
+        return errors
+
+    #按文档顺序（先序）遍历所有元素
+    def iter_elements(self):
+        return preorder(self.html)
     
-    #保存html
-    def save(self, file_path) -> None:
+    #保存html，先写临时文件再原子替换，边序列化边写入带缓冲的文件；pretty为True时按层级缩进输出
+    #staged为列表时只写临时文件，把(临时文件, 目标路径)追加到列表中，由调用方决定替换还是丢弃
+    #mark为False（另存为其他文件）时不记录文档已与磁盘同步
+    def save(self, file_path, pretty=False, staged=None, mark=True) -> bool:
         directory = os.path.dirname(file_path)
         if directory and not os.path.exists(directory):
             print(f"Error: Directory '{directory}' does not exist.")
-            return
+            return False
 
         try:
-            html_content = self._to_html_string()
-            with open(file_path, "w", encoding="utf-8") as file:
-                file.write(html_content)
+            generation = self.generation
+            with metrics.split("save.serialize", "save.write", iter_document(self.html, pretty=pretty)) as chunks:
+                digest = self.write(file_path, chunks, pretty=pretty, staged=staged)
+            if mark:
+                self.mark_saved(generation, digest)
             print(f"HTML document saved to {file_path}")
+            return True
         except Exception as e:
             print(f"Failed to save HTML document: {e}")
+            return False
 
-    #树的格式
-    def _display_tree(self, element, level, is_first, is_last, prefix, showid) -> None:
-        connector = "└── " if is_last else "├── "
-        if is_first:
-            connector = ""
-        if showid:
-            print(f"{prefix}{connector}{element.tag}{'#' + element.id if element.id else ''}")
+    #把序列化结果chunks写入文件（staged的含义同save），返回内容摘要，出错时抛出异常；不输出信息，也不记录已保存
+    def write(self, file_path, chunks, pretty=False, staged=None) -> str:
+        hasher = hashlib.sha256()
+        if not pretty:
+            chunks = _hashing(chunks, hasher)
+        if staged is None:
+            FileManager.atomic_write(file_path, chunks, buffering=WRITE_BUFFER_SIZE)
         else:
-            print(f"{prefix}{connector}{element.tag}")
-        if element.content:
-            content_prefix = prefix + ("    " if is_last else "|   ")
-            print(f"{content_prefix}└── {element.content}")
-        new_prefix = prefix + ("    " if is_last else "│   ")
-        child_count = len(element.children)
-        for i, child in enumerate(element.children):
-            self._display_tree(child, level + 1, False, is_last=(i == child_count - 1), prefix=new_prefix, showid=showid)
-
-    #缩进格式
-    def _display_indent(self, element, level, indent=2) -> None:
-        indent_str = " " * indent * level
-        id_part = f' id="{element.id}"' if element.id else ''
-        tag_open = f"{indent_str}<{element.tag}{id_part}> "
-        content = element.content
-        if element.tag in ['title', 'h1', 'p', 'li']:
-            print(f"{tag_open}{content}</{element.tag}>")
+            staged.append((FileManager.stage_write(file_path, chunks, buffering=WRITE_BUFFER_SIZE), file_path))
+        return hasher.hexdigest() if not pretty else self.content_digest()
+
+    #当前内容的不可变快照：(版本号, 紧凑格式的序列化结果)；之后的修改不影响快照，可以在其他线程中用write写入
+    def snapshot(self):
+        return self.generation, list(iter_document(self.html))
+
+    #记录文档已与磁盘同步；digest为空时在下一次修改前再计算（刚读入的文件多数不会被修改）
+    def mark_saved(self, generation=None, digest=None) -> None:
+        self._saved_generation = self.generation if generation is None else generation
+        self._saved_digest = digest
+
+    #与磁盘同步的状态，事务回滚时用restore_saved_state恢复；
+    #尚未计算的摘要在这里补上，否则回滚后无法判断内容是否回到了磁盘上的状态
+    def saved_state(self):
+        if self._saved_digest is None and self.generation == self._saved_generation:
+            self._saved_digest = self.content_digest()
+        return self._saved_generation, self._saved_digest
+
+    def restore_saved_state(self, state) -> None:
+        self._saved_generation, self._saved_digest = state
+
+    #文档内容是否与磁盘上的不同：版本号没变直接认为未修改，否则比较内容摘要，
+    #因此撤销回保存时的状态也算未修改
+    def is_modified(self) -> bool:
+        if self._saved_generation is None:
+            return True
+        if self.generation == self._saved_generation:
+            return False
+        if self._saved_digest is None:
+            return True
+        if self.content_digest() != self._saved_digest:
+            return True
+        self._saved_generation = self.generation
+        return False
+
+    #紧凑格式序列化结果的sha256摘要
+    def content_digest(self) -> str:
+        hasher = hashlib.sha256()
+        for chunk in iter_document(self.html):
+            hasher.update(chunk.encode("utf-8"))
+        return hasher.hexdigest()
+
+    #显示的起点：root为元素id，None为整个文档
+    def _display_root(self, root):
+        if root is None:
+            return self.html
+        element = self.get_element(root)
+        if element is None:
+            print(f"Element with id '{root}' not found.")
+        return element
+
+    #把lines逐行写入缓冲区，最后一次输出：limit为最多输出的行数，达到后不再向lines要下一行，
+    #lines是边遍历边产出的生成器，剩下的元素不会被遍历，耗时只与输出的行数有关；
+    #pager为True且输出到终端时交给分页程序（$PAGER，默认less）显示
+    @staticmethod
+    def _render_lines(lines, limit=None, pager=False) -> None:
+        buffer = io.StringIO()
+        count = 0
+        for line in lines:
+            if limit is not None and count >= limit:
+                buffer.write(f"... output stopped after {limit} lines\n")
+                break
+            buffer.write(line)
+            buffer.write("\n")
+            count += 1
+        text = buffer.getvalue()
+        if pager and sys.stdout.isatty():
+            import pydoc
+            pydoc.pager(text)
         else:
-            print(f"{tag_open}{content}")
-            for child in element.children:
-                self._display_indent(child, level + 1, indent)
-            print(f"{indent_str}</{element.tag}>")
-    
-    #递归删除子元素
+            print(text, end="")
+
+    #树的格式：每层的前缀由祖先是否为最后一个子元素决定，进入元素时压栈，离开时弹出
+    #max_depth为从element算起最多显示的层数，更深的子树不遍历，只在其父元素后注明子元素个数
+    def _tree_lines(self, element, showid, max_depth=None):
+        prefixes = [""]
+        for event, node, level, is_last in walk(element, max_depth=max_depth):
+            if event != ENTER:
+                prefixes.pop()
+                continue
+            prefix = prefixes[-1]
+            connector = "" if level == 0 else ("└── " if is_last else "├── ")
+            label = f"{node.tag}{'#' + node.id if node.id else ''}" if showid else node.tag
+            if level == max_depth and node.children:
+                label += f" (+{len(node.children)} children)"
+            yield f"{prefix}{connector}{label}"
+            if node.content:
+                content_prefix = prefix + ("    " if is_last else "|   ")
+                yield f"{content_prefix}└── {node.content}"
+            prefixes.append(prefix + ("    " if is_last else "│   "))
+
+    #缩进格式：title、h1、p、li与文本写在同一行，其余元素的子元素缩进一层，离开时输出结束标签
+    def _indent_lines(self, element, indent=2, max_depth=None):
+        inline = ('title', 'h1', 'p', 'li')
+        for event, node, level, _ in walk(element, children=lambda node: () if node.tag in inline else node.children,
+                                          max_depth=max_depth):
+            indent_str = " " * indent * level
+            if event != ENTER:
+                if node.tag not in inline:
+                    yield f"{indent_str}</{node.tag}>"
+                continue
+            id_part = f' id="{node.id}"' if node.id else ''
+            tag_open = f"{indent_str}<{node.tag}{id_part}> "
+            if node.tag in inline:
+                yield f"{tag_open}{node.content}</{node.tag}>"
+            elif level == max_depth and node.children:
+                yield f"{tag_open}{node.content} (+{len(node.children)} children)"
+            else:
+                yield f"{tag_open}{node.content}"
+
+    #把子树中所有元素从索引和拼写检查缓存中移除；子树的元素在每个id的列表中是连续的一段，整段删除
     def _remove_element_recursively(self, element) -> None:
-        if element.id in self.ids:
-            self.ids.remove(element.id)
-        for child in element.children:
-            self._remove_element_recursively(child)
-    
-    #递归检查拼写
-    def _check_spelling_recursively(self, element) -> dict:
-        errors = {}
-        if element.content:
-            words = element.content.split()
-            for word in words:
-                if word not in self.spell_checker:  
-                    suggestions = self.spell_checker.candidates(word)
-                    if suggestions is None:
-                        continue
-                    errors[word] = list(suggestions)
-        
-        for child in element.children:
-            child_errors = self._check_spelling_recursively(child)
-            errors.update(child_errors)
-        
-        return errors
+        for key, nodes in self._group_by_id(element).items():
+            bucket = self._index.get(key)
+            if bucket is None:
+                continue
+            start = next((i for i, candidate in enumerate(bucket) if candidate is nodes[0]), None)
+            block = [] if start is None else bucket[start:start + len(nodes)]
+            if len(block) == len(nodes) and all(a is b for a, b in zip(block, nodes)):
+                del bucket[start:start + len(nodes)]
+                if not bucket:
+                    del self._index[key]
+            else:
+                #索引不是按文档顺序时（不应出现）逐个移除
+                for node in nodes:
+                    self._unregister(node)
+            for node in nodes:
+                self._spell_results.pop(node, None)
+                self._spell_dirty.discard(node)
+
+    #将元素加入id索引；已有同id的元素时按文档顺序插入（撤销删除等把元素放回原处时不一定在最后）
+    def _register(self, element) -> None:
+        bucket = self._index.get(element.id)
+        if bucket is None:
+            self._index[element.id] = [element]
+            return
+        bucket.insert(self._insertion_point(bucket, tree_path(element)), element)
+
+    #列表中位于path之前的元素个数：先看是否排在最后（最常见），否则二分，只比较O(log n)个元素的路径
+    @staticmethod
+    def _insertion_point(bucket, path) -> int:
+        if tree_path(bucket[-1]) < path:
+            return len(bucket)
+        low, high = 0, len(bucket) - 1
+        while low < high:
+            middle = (low + high) // 2
+            if tree_path(bucket[middle]) < path:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    #子树中的元素按id分组，每组按先序排列
+    @staticmethod
+    def _group_by_id(element) -> dict:
+        groups = {}
+        for node in preorder(element):
+            nodes = groups.get(node.id)
+            if nodes is None:
+                groups[node.id] = [node]
+            else:
+                nodes.append(node)
+        return groups
+
+    #将元素从id索引中移除
+    def _unregister(self, element) -> None:
+        bucket = self._index.get(element.id)
+        if bucket is None:
+            return
+        for i, candidate in enumerate(bucket):
+            if candidate is element:
+                del bucket[i]
+                break
+        if not bucket:
+            del self._index[element.id]
+
+    #把子树中所有元素加入id索引：子树在文档中是连续的一段，已有的同id元素要么都在它之前、要么都在它之后，
+    #每个id只需定位一次插入位置，子树中的元素整段插入（无id的元素以标签名为id，同一列表可能很长）
+    def _register_subtree(self, element) -> None:
+        path = None
+        for key, nodes in self._group_by_id(element).items():
+            self._spell_dirty.update(nodes)
+            bucket = self._index.get(key)
+            if bucket is None:
+                self._index[key] = nodes
+                continue
+            if path is None:
+                path = tree_path(element)
+            index = self._insertion_point(bucket, path)
+            bucket[index:index] = nodes
     
-    def _to_html_string(self) -> str:
+    #拼写检查缓存：_spell_results为 元素 -> 不认识的单词，_spell_dirty为需要重新检查的元素，
+    #_spell_full表示下次需要全量检查（新文档或整棵树被替换），_spell_key为结果对应的语言配置
+    def _reset_spell_state(self) -> None:
+        self._spell_results = {}
+        self._spell_dirty = set()
+        self._spell_full = True
+        self._spell_key = None
 
-        return "<!DOCTYPE html>\n" + str(self.html)
+    #每次修改前调用：若当前仍是刚读入/保存时的状态且还没有摘要，先补算摘要作为比较基准
+    def _touch(self) -> None:
+        if self._saved_digest is None and self.generation == self._saved_generation:
+            self._saved_digest = self.content_digest()
+        self.generation += 1
+
+    def _to_html_string(self, pretty=False) -> str:
+        return "".join(iter_document(self.html, pretty=pretty))
     
+    #倒排索引不随文档保存（日志检查点、深拷贝），恢复时按元素树重新生成
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["text_index"] = self.text_index is not None
+        return state
+
+    def __setstate__(self, state) -> None:
+        self.__dict__.update(state)
+        self.text_index = TextIndex(self.html) if state["text_index"] else None
+
     #测试用 所有的记录所有的element id
     def get_element_ids(self):
-        ids = []
-        self.html.collect_ids(ids)
-        return ids
+        return list(self._index)
     
     #测试用 所有的记录所有的element content
     def get_element_content(self, target_id):
@@ -1,8 +1,81 @@
 from model.html_element import HTMLElement
 from model.html_document import HTMLDocument
+from model.commands import InsertCommand, EditIdCommand, EditContentCommand, DeleteCommand, BatchCommand, ReplaceContentCommand
+from model.spell_service import default_spell_service
+from model.history import UndoHistory, format_bytes
+from model.native_loader import NativeTreeBuilder
+from model.traversal import walk, ENTER
+from model import metrics
 import os
-from copy import deepcopy
-from bs4 import BeautifulSoup
+import threading
+
+
+#可选的加载器：native直接由HTMLParser事件建树，bs4先构建BeautifulSoup对象树再转换（原实现，作为备用）
+LOADERS = ("native", "bs4")
+
+
+#解析html文件，返回(title, 根元素, id索引)；文件中没有html元素时返回None
+#定义在模块顶层，可以放到进程池中执行，结果中只含普通的str和HTMLElement，能够被pickle
+#cache为TreeCache时，文件未变化则直接读取缓存的元素树，否则解析后写入缓存
+#开启统计（model.metrics）时分阶段计时：read_html.cache（读取/写入缓存）、read_html.read（读文件）、read_html.parse（解析建树）
+def parse_html_file(file_path, cache=None, loader="native"):
+    if cache is not None:
+        with metrics.phase("read_html.cache"):
+            parsed = cache.load(file_path)
+        if parsed is not None:
+            return parsed
+    with metrics.phase("read_html.read"):
+        with open(file_path, 'r', encoding="utf-8") as file:
+            text = file.read()
+    with metrics.phase("read_html.parse"):
+        if loader == "bs4":
+            parsed = _parse_with_bs4(text)
+        else:
+            parsed = NativeTreeBuilder().build(text)
+    if parsed is not None and cache is not None:
+        with metrics.phase("read_html.cache"):
+            cache.store(file_path, parsed)
+    return parsed
+
+
+#BeautifulSoup加载器；bs4只在选用这个加载器时才导入，默认的native加载器不需要它，启动时也不必加载
+def _parse_with_bs4(text):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, "html.parser")
+    if not soup.html:
+        return None
+    title = soup.title.string if soup.title else "Untitled"
+    index = {}
+    html_element = _build_element_tree(soup.html, index=index)
+    return (str(title) if title is not None else None), html_element, index
+
+
+#读取html的辅助函数：把BeautifulSoup的标签树转换为HTMLElement树，跳过字符串节点
+#index为id -> 元素列表的索引，构建过程中按文档顺序填充
+def _build_element_tree(bs_element, parent=None, index=None) -> HTMLElement:
+    root = None
+    parents = [parent]
+    for event, bs_node, _, _ in walk(bs_element, children=_tag_children):
+        if event != ENTER:
+            parents.pop()
+            continue
+        tag_name = bs_node.name
+        element_id = bs_node.get("id", tag_name)
+        content = bs_node.string if bs_node.string else ""
+        element = HTMLElement(tag=tag_name, content=content.strip(), element_id=element_id)
+        if index is not None:
+            index.setdefault(element_id, []).append(element)
+        # 如果有父元素，则添加为父元素的子元素
+        if parents[-1]:
+            parents[-1].add_child(element)
+        if root is None:
+            root = element
+        parents.append(element)
+    return root
+
+
+def _tag_children(bs_element):
+    return [child for child in bs_element.children if child.name]
 
 
 #命令行HTML编辑器，允许用户操作HTML文档
@@ -10,124 +83,182 @@ from bs4 import BeautifulSoup
 class HTMLEditor:
     
     def __init__(self) -> None:
-        self.document = None
+        self._document = None
+        #延迟加载时待读取的文件，第一次访问document时才解析
+        self._pending_path = None
+        #编辑器对应的文件，保存到这个文件时文档才算已保存（另存为其他文件不算）
+        self.file_path = None
         self.initialized = False
-        self.history = []
-        self.redo_stack = []
+        #撤销/重做历史，大小限制由SessionManager按命令行参数设置
+        self.history = UndoHistory()
         self.showid = True
+        #拼写检查服务，由SessionManager替换为会话共享的服务
+        self.spell_service = default_spell_service
+        #解析结果缓存（TreeCache），为None时每次都重新解析
+        self.tree_cache = None
+        #文件加载器，见LOADERS
+        self.loader = "native"
+        #是否为文档维护单词倒排索引（见HTMLDocument.enable_text_index），由SessionManager按命令行参数设置
+        self.text_index = False
+        #执行命令和自动保存读取文档时持有，自动保存不会读到改了一半的文档
+        self.lock = threading.RLock()
+
+    #访问文档时若还有待读取的文件，先完成解析
+    @property
+    def document(self):
+        if self._pending_path is not None:
+            self.ensure_loaded()
+        return self._document
+
+    @document.setter
+    def document(self, document):
+        self._pending_path = None
+        self._document = document
 
     #初始化空html
     def init(self) -> None:
         print("Initializing a new HTML document...")
         self.document = HTMLDocument(title="My Webapp")
+        if self.text_index:
+            self.document.enable_text_index()
         self.initialized = True
+        self._clear_history()
         print("New document created.")
 
     #从html中加载
-    def read_html(self, file_path) -> None:
+    def read_html(self, file_path) -> bool:
         print(f"Reading HTML file from {file_path}...")
         if not os.path.exists(file_path):
             print(f"Error: File '{file_path}' not found.")
-            return
-        with open(file_path, 'r', encoding="utf-8") as file:
-            soup = BeautifulSoup(file, "html.parser")
-        
-        if soup.html:
-            title_tag = soup.title.string if soup.title else "Untitled"
-            self.document = HTMLDocument(title=title_tag)
-            ids = []
-            html_element = self._build_element_tree(soup.html, ids=ids)
-            self.document.html = html_element
-            self.document.set_ids(ids)
-            self.initialized = True
+            return False
+        parsed = parse_html_file(file_path, cache=self.tree_cache, loader=self.loader)
+        if parsed is not None:
+            self.load_parsed(parsed)
+            self.file_path = file_path
             print("Document initialized from file.")
-        else:
-            print("Load html failed.")
-
-    #读取html的辅助函数
-    def _build_element_tree(self, bs_element, parent=None, ids=[]) -> HTMLElement:
-            tag_name = bs_element.name
-            element_id = bs_element.get("id", tag_name)
-            ids.append(element_id)
-            content = bs_element.string if bs_element.string else ""
-            element = HTMLElement(tag=tag_name, content=content.strip(), element_id=element_id)
-            
-            # 如果有父元素，则添加为父元素的子元素
-            if parent:
-                parent.add_child(element)
-            
-            # 遍历子元素并递归添加
-            for child in bs_element.children:
-                if child.name:  # 跳过字符串节点，只处理标签节点
-                    self._build_element_tree(child, element, ids=ids)
-            
-            return element
+            return True
+        print("Load html failed.")
+        return False
+
+    #使用parse_html_file的结果作为当前文档（建立文档和索引计入read_html.build阶段）
+    def load_parsed(self, parsed) -> None:
+        title, html_element, index = parsed
+        with metrics.phase("read_html.build"):
+            self.document = HTMLDocument(title=title)
+            if self.text_index:
+                self.document.enable_text_index()
+            self.document.set_html(html_element, index=index)
+            self.document.mark_saved()
+        self.initialized = True
+        self._clear_history()
+
+    #延迟加载：只记录文件路径，第一次访问文档时再解析
+    def defer_read(self, file_path) -> None:
+        self._document = None
+        self._pending_path = file_path
+        self.file_path = file_path
+
+    #是否已经完成解析（延迟加载的编辑器在首次使用前为False）
+    def is_loaded(self) -> bool:
+        return self._pending_path is None
+
+    #若为延迟加载，立即解析文件
+    def ensure_loaded(self) -> None:
+        if self._pending_path is None:
+            return
+        file_path = self._pending_path
+        self._pending_path = None
+        self.read_html(file_path)
 
     #在某元素前插入元素
-    def insert_before(self, target_id, new_element_id, new_element_content, new_element_tag) -> None:
-        self._save_state()
-        self.document.insert_before(target_id=target_id, new_element=HTMLElement(tag=new_element_tag, content=new_element_content, element_id=new_element_id))
+    def insert_before(self, target_id, new_element_id, new_element_content, new_element_tag) -> bool:
+        new_element = HTMLElement(tag=new_element_tag, content=new_element_content, element_id=new_element_id)
+        return self._execute(InsertCommand(self.document, target_id, new_element, position="before"))
 
 
     #向某元素内部添加子元素
-    def add_into(self, parent_id, new_element_id, new_element_content, new_element_tag) -> None:
-        self._save_state()
-        self.document.add_into(target_id=parent_id, new_element=HTMLElement(tag=new_element_tag, element_id=new_element_id, content=new_element_content, parent=parent_id))
-        print("son element has been added")
+    def add_into(self, parent_id, new_element_id, new_element_content, new_element_tag) -> bool:
+        new_element = HTMLElement(tag=new_element_tag, element_id=new_element_id, content=new_element_content, parent=parent_id)
+        done = self._execute(InsertCommand(self.document, parent_id, new_element, position="into"))
+        if done:
+            print("son element has been added")
+        return done
 
    
     #修改元素id
-    def edit_element_id(self, target_id, new_id) -> None:
-        self._save_state()
-        self.document.edit_element_id(target_id=target_id, new_id=new_id)
+    def edit_element_id(self, target_id, new_id) -> bool:
+        return self._execute(EditIdCommand(self.document, target_id, new_id))
 
     #修改元素文本
-    def edit_element_content(self, target_id, new_content) -> None:
-        self._save_state()
-        self.document.edit_element_content(target_id=target_id, new_content=new_content)
+    def edit_element_content(self, target_id, new_content) -> bool:
+        return self._execute(EditContentCommand(self.document, target_id, new_content))
 
     #删除某元素
-    def delete_element(self, target_id) -> None:
-        self._save_state()
-        self.document.delete_element(element_id=target_id)
+    def delete_element(self, target_id) -> bool:
+        return self._execute(DeleteCommand(self.document, target_id))
+
+    #批量编辑：ops的格式见BatchCommand，先整体校验再一次性执行，整批只占一个撤销项
+    def apply_batch(self, ops) -> bool:
+        return self._execute(BatchCommand(self.document, ops))
 
-    #缩进格式
-    def print_indent(self, indent) -> None:
-        self.document.display_indent_structure(indent=indent)
+    #把targets中各元素的文本分别替换为new_contents中对应的文本（查找替换），只占一个撤销项
+    def replace_contents(self, targets, new_contents) -> bool:
+        return self._execute(ReplaceContentCommand(self.document, targets, new_contents))
 
-    #树的格式
-    def print_tree(self) -> None:
-        self.document.display_tree_structure(showid=self.showid)
+    #缩进格式，可以只显示某个元素的子树（root为其id）、限制层数和行数，或交给分页程序显示
+    def print_indent(self, indent, root=None, max_depth=None, limit=None, pager=False) -> bool:
+        return self.document.display_indent_structure(indent=indent, root=root, max_depth=max_depth, limit=limit,
+                                                      pager=pager)
+
+    #树的格式，参数同print_indent
+    def print_tree(self, root=None, max_depth=None, limit=None, pager=False) -> bool:
+        return self.document.display_tree_structure(showid=self.showid, root=root, max_depth=max_depth, limit=limit,
+                                                    pager=pager)
 
     #拼写检查
     def check_spelling(self) -> None:
-        self.document.check_spelling()
+        self.document.check_spelling(spell_service=self.spell_service)
 
-    #写入html文件
-    def save(self, save_path):
-        self.document.save(file_path=save_path)
+    #写入html文件，staged见HTMLDocument.save；只有写入编辑器自己的文件时文档才记为已保存
+    def save(self, save_path, pretty=False, staged=None) -> bool:
+        own = self.file_path is not None and os.path.abspath(save_path) == os.path.abspath(self.file_path)
+        return self.document.save(file_path=save_path, pretty=pretty, staged=staged, mark=own)
 
     #多步重做
-    def redo(self) -> None:
-        if not self.redo_stack:
+    def redo(self) -> bool:
+        if not self.history.redo():
             print("Nothing to redo.")
-            return
-        self.history.append(deepcopy(self.document))
-        self.document = self.redo_stack.pop()
+            return False
         print("Redo operation completed.")
+        return True
 
     #多步撤销操作
-    def undo(self) -> None:
-        if not self.history:
+    def undo(self) -> bool:
+        if not self.history.undo():
             print("Nothing to undo.")
-            return
-        self.redo_stack.append(deepcopy(self.document))
-        self.document = self.history.pop()  
+            return False
         print("Undo operation completed.")
+        return True
+
+    #撤销历史的深度和占用的内存
+    def print_undo_stats(self) -> None:
+        history = self.history
+        depth, packed, redo, size, packed_size = history.stats()
+        print(f"Undo steps: {depth} ({packed} compressed), redo steps: {redo}")
+        print(f"Estimated memory: {format_bytes(size)} (compressed steps {format_bytes(packed_size)}), "
+              f"limit {history.max_entries} steps / {format_bytes(history.max_bytes)}")
+        print(f"Evicted steps: {history.evicted}, coalesced edits: {history.coalesced}")
+
+    #执行命令，成功的命令记入历史并清空重做栈
+    def _execute(self, command) -> bool:
+        if not command.execute():
+            return False
+        self.history.push(command)
+        return True
 
-    def _save_state(self) -> None:
-        self.history.append(deepcopy(self.document))
-        self.redo_stack.clear()
+    #命令只对创建它的文档有效，更换文档时清空历史
+    def _clear_history(self) -> None:
+        self.history.clear()
 
 
 if __name__=="__main__":
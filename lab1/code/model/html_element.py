@@ -1,19 +1,49 @@
 
+import sys
+from .html_writer import iter_html
+from .traversal import preorder
+
+#没有子元素的元素共用的空子元素序列，添加第一个子元素时才创建列表
+NO_CHILDREN = ()
+
+
 #基础HTML元素类，支持标签、子元素、文本内容的操作
+#使用__slots__不为每个元素创建__dict__；标签名经sys.intern后同名标签共用一个字符串
 #Model层
 class HTMLElement:
 
+    __slots__ = ("tag", "content", "children", "parent", "id")
+
     def __init__(self, tag, content="", parent=None, element_id=None) -> None:
-        self.tag = tag
+        self.tag = sys.intern(tag)
         self.content = content
-        self.children = []
+        self.children = NO_CHILDREN
         self.parent = parent
         self.id = element_id if element_id is not None else self.tag
 
     def add_child(self, child_element) -> None:
-        self.children.append(child_element)
+        if self.children is NO_CHILDREN:
+            self.children = [child_element]
+        else:
+            self.children.append(child_element)
         child_element.set_parent(self)
 
+    #把子元素插入到第index个位置
+    def insert_child(self, index, child_element) -> None:
+        if self.children is NO_CHILDREN:
+            self.children = [child_element]
+        else:
+            self.children.insert(index, child_element)
+        child_element.set_parent(self)
+
+    #移除子元素，返回它原来的位置；最后一个子元素移除后恢复为共用的空序列
+    def remove_child(self, child_element) -> int:
+        index = self.children.index(child_element)
+        del self.children[index]
+        if not self.children:
+            self.children = NO_CHILDREN
+        return index
+
     def set_content(self, content) -> None:
         self.content = content
 
@@ -25,24 +55,17 @@ class HTMLElement:
     
     #测试用
     def collect_ids(self, ids):
-        if self.id:
-            ids.append(self.id)
-        for child in self.children:
-            child.collect_ids(ids)
+        for element in preorder(self):
+            if element.id:
+                ids.append(element.id)
 
     #测试用
     def find_element_by_id(self, target_id):
-        if self.element_id == target_id:
-            return self
-        for child in self.children:
-            result = child.find_element_by_id(target_id)
-            if result:
-                return result
+        for element in preorder(self):
+            if element.id == target_id:
+                return element
         return None
 
     def __str__(self) -> str:
-        tag_open = f"<{self.tag}{' id="'+self.id+'"' if self.id else ''}>"
-        tag_close = f"</{self.tag}>"
-        child_content = '\n'.join(str(child) for child in self.children)
-        return f"{tag_open}{self.content}{child_content}{tag_close}"
+        return "".join(iter_html(self))
 
@@ -0,0 +1,57 @@
+from .traversal import walk, ENTER
+
+#html序列化：以生成器的方式逐段产出文本并直接写入文件，不在内存中拼出整个文档
+#紧凑格式与HTMLElement.__str__完全一致：子元素之间以换行分隔，文本紧跟开始标签
+#Service层
+
+DOCTYPE = "<!DOCTYPE html>\n"
+
+
+def _open_tag(element) -> str:
+    if element.id:
+        return f'<{element.tag} id="{element.id}">'
+    return f"<{element.tag}>"
+
+
+#紧凑格式：进入元素时输出开始标签和文本，离开时输出结束标签，不是最后一个子元素时再跟一个换行
+def _iter_compact(root):
+    for event, item, _, is_last in walk(root):
+        if event == ENTER:
+            yield _open_tag(item) + item.content
+        elif is_last:
+            yield f"</{item.tag}>"
+        else:
+            yield f"</{item.tag}>\n"
+
+
+#美化格式：每个元素独占一行并按层级缩进，有子元素时文本单独成行
+def _iter_pretty(root, indent):
+    for event, item, level, _ in walk(root):
+        pad = " " * (indent * level)
+        if event == ENTER:
+            if not item.children:
+                yield f"{pad}{_open_tag(item)}{item.content}</{item.tag}>\n"
+                continue
+            yield f"{pad}{_open_tag(item)}\n"
+            if item.content:
+                yield f"{pad}{' ' * indent}{item.content}\n"
+        elif item.children:
+            yield f"{pad}</{item.tag}>\n"
+
+
+#逐段产出元素的html文本
+def iter_html(element, pretty=False, indent=2):
+    if pretty:
+        return _iter_pretty(element, indent)
+    return _iter_compact(element)
+
+
+#逐段产出完整文档（含DOCTYPE）
+def iter_document(root, pretty=False, indent=2):
+    yield DOCTYPE
+    yield from iter_html(root, pretty=pretty, indent=indent)
+
+
+#把文档写入已打开的文本文件，由文件对象的缓冲区合并小片段
+def write_document(file, root, pretty=False, indent=2) -> None:
+    file.writelines(iter_document(root, pretty=pretty, indent=indent))
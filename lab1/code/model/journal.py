@@ -0,0 +1,347 @@
+import hashlib
+import io
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from .html_element import HTMLElement
+from .traversal import preorder
+from .tree_cache import TreeCache
+
+#默认每隔1秒fsync一次，每200条命令写一次检查点
+DEFAULT_FSYNC_INTERVAL = 1.0
+DEFAULT_CHECKPOINT_EVERY = 200
+
+
+#会话日志（预写日志）：每个打开的文件一个日志，按顺序记录成功执行的编辑命令，进程崩溃后重放日志即可恢复未保存的修改和撤销历史
+#日志为JSON lines，第一行说明重放的起点：
+#  {"base": 文件名, "mtime_ns": ..., "size": ..., "digest": ...}  从磁盘上的文件开始
+#  {"base": 文件名, "new": true}                                   从新建的空文档开始（文件还不存在）
+#  {"checkpoint": 文件名, "snapshot": 检查点文件, "mtime_ns": ...}  从检查点开始：元素树和文档、撤销历史的完整状态，
+#                                                                  同样记下当时磁盘上文件的状态
+#起点记录中磁盘上文件的状态（mtime、大小、内容摘要，或文件不存在）与恢复时不符，说明文件被外部修改过，不重放日志
+#之后每行一条命令 {"command": "edit-text p1 hello"}
+#每条记录写入后立即flush到操作系统，进程被杀不会丢失；fsync每隔fsync_interval秒做一次，断电时最多丢失这段时间的记录
+#每checkpoint_every条命令和正常退出时（文档有未保存的修改）写检查点，并以检查点开始一个新日志，日志不会无限增长；
+#与磁盘一致的文档（刚保存）不保留检查点，由调用方用forget/start让日志从磁盘上的文件重新开始
+#检查点用pickle保存，载入别人放置的文件等于执行任意代码：日志目录创建为只有当前用户可以访问（0700），
+#目录、日志和检查点文件不属于当前用户或其他用户可以写入时不使用日志
+#Service层
+class Journal:
+
+    def __init__(self, directory=".journal", fsync_interval=DEFAULT_FSYNC_INTERVAL,
+                 checkpoint_every=DEFAULT_CHECKPOINT_EVERY) -> None:
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.checkpoint_every = checkpoint_every
+        #文件名 -> 尚未写入的起点记录（编辑器打开后第一次修改时才创建日志）
+        self._pending = {}
+        #文件名 -> 打开的日志文件
+        self._files = {}
+        #文件名 -> 上次检查点之后记录的命令数
+        self._counts = {}
+        self._last_sync = time.monotonic()
+        #自动保存线程保存文件后也会写检查点
+        self._lock = threading.RLock()
+
+    #编辑器刚从磁盘读入或新建，之后的命令以它为起点
+    def start(self, filename) -> None:
+        with self._lock:
+            self._close_file(filename)
+            self._pending[filename] = {"base": filename, **self._disk_state(filename)}
+            self._counts[filename] = 0
+
+    #记录一条成功执行的命令，达到间隔时写检查点
+    def record(self, filename, editor, command) -> None:
+        with self._lock:
+            file = self._files.get(filename)
+            if file is None:
+                first = self._pending.pop(filename, None)
+                if first is None:
+                    return
+                file = self._rewrite(filename, first)
+            file.write(json.dumps({"command": command}, ensure_ascii=False) + "\n")
+            file.flush()
+            self._counts[filename] = self._counts.get(filename, 0) + 1
+            if self._counts[filename] >= self.checkpoint_every:
+                self.checkpoint(filename, editor)
+            elif time.monotonic() - self._last_sync >= self.fsync_interval:
+                self.sync()
+
+    #把编辑器的当前状态写成检查点，并以它开始新的日志；
+    #还没有记录过命令时（刚打开或刚保存）只需更新起点，force为True时仍写检查点（事务中的修改没有逐条记录）
+    def checkpoint(self, filename, editor, force=False) -> None:
+        with self._lock:
+            if filename not in self._files and not (force and filename in self._pending):
+                if filename in self._pending:
+                    self.start(filename)
+                return
+            self._make_directory()
+            key = self._key(filename)
+            fd, snapshot = tempfile.mkstemp(prefix=key + ".", suffix=".ckpt", dir=self.directory)
+            with os.fdopen(fd, "wb") as file:
+                file.write(self._snapshot(editor))
+                file.flush()
+                os.fsync(file.fileno())
+            old = self._snapshot_of(filename)
+            self._rewrite(filename, {"checkpoint": filename, "snapshot": os.path.basename(snapshot),
+                                     **self._disk_state(filename)})
+            self._pending.pop(filename, None)
+            self._counts[filename] = 0
+            if old is not None and old != snapshot:
+                self._remove(old)
+
+    #文件已关闭，删除它的日志和检查点
+    def forget(self, filename) -> None:
+        with self._lock:
+            snapshot = self._snapshot_of(filename)
+            self._close_file(filename)
+            self._pending.pop(filename, None)
+            self._counts.pop(filename, None)
+            self._remove(self._path(filename))
+            if snapshot is not None:
+                self._remove(snapshot)
+
+    def is_tracked(self, filename) -> bool:
+        return filename in self._files or filename in self._pending
+
+    #把所有日志fsync到磁盘
+    def sync(self) -> None:
+        with self._lock:
+            for file in self._files.values():
+                os.fsync(file.fileno())
+            self._last_sync = time.monotonic()
+
+    def close(self) -> None:
+        with self._lock:
+            self.sync()
+            for filename in list(self._files):
+                self._close_file(filename)
+
+    #磁盘上有日志的文件名；日志目录不可信时为空
+    def journaled_files(self) -> list:
+        filenames = []
+        if not self._trusted(self.directory):
+            return filenames
+        try:
+            with os.scandir(self.directory) as it:
+                paths = sorted(entry.path for entry in it if entry.name.endswith(".log"))
+        except OSError:
+            return filenames
+        for path in paths:
+            first = self._first_record(path)
+            filename = first.get("base", first.get("checkpoint")) if first else None
+            if filename is not None and self._path(filename) == path:
+                filenames.append(filename)
+        return filenames
+
+    #按日志恢复编辑器：载入起点，然后对每条命令调用replay(command)；返回重放的命令数，
+    #无法恢复（起点无法载入或有命令重放失败，replay返回False）时返回None
+    #重放期间撤销历史不丢弃也不压缩任何项（与记录时的上限可能不同），重放完成后再按上限处理
+    #恢复后日志继续追加在原文件后面
+    def recover(self, filename, editor, replay):
+        path = self._path(filename)
+        if not (self._trusted(self.directory) and self._trusted(path)):
+            return None
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        records = []
+        valid = 0
+        for line in data.split(b"\n")[:-1]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid += len(line) + 1
+        if not records or not self._load_start(filename, records[0], editor):
+            return None
+        commands = [record["command"] for record in records[1:] if "command" in record]
+        editor.history.hold()
+        try:
+            for command in commands:
+                if not replay(command):
+                    return None
+        finally:
+            editor.history.release()
+        #截掉崩溃时写了一半的最后一行，之后的记录接在完整的记录后面
+        if valid < len(data):
+            os.truncate(path, valid)
+        self._files[filename] = open(path, "a", encoding="utf-8")
+        self._counts[filename] = len(commands)
+        return len(commands)
+
+    #载入起点；文件在起点之后被外部修改过（或起点记录没有文件的状态）时返回False
+    def _load_start(self, filename, first, editor) -> bool:
+        if not self._disk_unchanged(filename, first):
+            return False
+        if "checkpoint" in first:
+            snapshot = os.path.join(self.directory, os.path.basename(first["snapshot"]))
+            if not self._trusted(snapshot):
+                return False
+            try:
+                with open(snapshot, "rb") as file:
+                    self._restore(file.read(), editor)
+            except (OSError, ValueError, pickle.UnpicklingError, EOFError):
+                return False
+            return True
+        if first.get("new"):
+            editor.init()
+            return True
+        return editor.read_html(filename)
+
+    #磁盘上文件的当前状态：{"mtime_ns", "size", "digest"}，文件不存在时为{"new": True}
+    @staticmethod
+    def _disk_state(filename) -> dict:
+        try:
+            with open(filename, "rb") as file:
+                stat = os.fstat(file.fileno())
+                digest = hashlib.sha256(file.read()).hexdigest()
+        except OSError:
+            return {"new": True}
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "digest": digest}
+
+    #文件是否仍是起点记录中的状态：mtime和大小一致时再比较内容摘要（mtime精度不够时同样能发现修改）
+    @staticmethod
+    def _disk_unchanged(filename, first) -> bool:
+        if first.get("new"):
+            return not os.path.exists(filename)
+        if "mtime_ns" not in first:
+            return False
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            return False
+        if stat.st_mtime_ns != first["mtime_ns"] or stat.st_size != first.get("size"):
+            return False
+        return "digest" not in first or Journal._disk_state(filename).get("digest") == first["digest"]
+
+    #检查点：元素树用TreeCache的格式保存，文档对象和撤销历史用pickle保存，其中树上的元素按先序位置引用
+    #撤销历史中已删除的子树过深无法pickle时，检查点不含历史
+    def _snapshot(self, editor) -> bytes:
+        document = editor.document
+        document.saved_state()
+        positions = {id(element): position for position, element in enumerate(preorder(document.html))}
+        try:
+            state = self._dumps((document, editor.history), positions)
+        except RecursionError:
+            state = self._dumps((document, None), positions)
+        return pickle.dumps({"tree": TreeCache.dumps(document.html), "state": state, "showid": editor.showid},
+                            protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _dumps(obj, positions) -> bytes:
+        buffer = io.BytesIO()
+        pickler = _TreePickler(buffer, positions)
+        pickler.dump(obj)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _restore(data, editor) -> None:
+        snapshot = pickle.loads(data)
+        root, _ = TreeCache.loads(snapshot["tree"])
+        nodes = list(preorder(root))
+        document, history = _TreeUnpickler(io.BytesIO(snapshot["state"]), nodes).load()
+        if history is not None:
+            #大小上限按本次启动的设置
+            current = editor.history
+            history.max_entries, history.max_bytes = current.max_entries, current.max_bytes
+            history.compress, history.plain_entries = current.compress, current.plain_entries
+            editor.history = history
+        else:
+            editor.history.clear()
+        editor.document = document
+        editor.showid = snapshot["showid"]
+        editor.initialized = True
+
+    def _rewrite(self, filename, first):
+        self._close_file(filename)
+        self._make_directory()
+        path = self._path(filename)
+        fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(json.dumps(first, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+        file = self._files[filename] = open(path, "a", encoding="utf-8")
+        return file
+
+    def _close_file(self, filename) -> None:
+        file = self._files.pop(filename, None)
+        if file is not None:
+            file.close()
+
+    def _snapshot_of(self, filename):
+        first = self._first_record(self._path(filename))
+        if first and "snapshot" in first:
+            return os.path.join(self.directory, os.path.basename(first["snapshot"]))
+        return None
+
+    @staticmethod
+    def _first_record(path):
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                return json.loads(file.readline())
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _remove(path) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    #创建日志目录，只有当前用户可以访问（不受umask影响）；已存在的目录不改动，由_trusted检查
+    def _make_directory(self) -> None:
+        try:
+            os.makedirs(self.directory, mode=0o700)
+        except FileExistsError:
+            return
+        os.chmod(self.directory, 0o700)
+
+    #目录或文件属于当前用户且其他用户不能写入；没有用户id的平台上不检查
+    @staticmethod
+    def _trusted(path) -> bool:
+        if not hasattr(os, "getuid"):
+            return True
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+    @staticmethod
+    def _key(filename) -> str:
+        return hashlib.sha1(os.path.abspath(filename).encode("utf-8")).hexdigest()
+
+    def _path(self, filename) -> str:
+        return os.path.join(self.directory, self._key(filename) + ".log")
+
+
+#树上的元素只记录先序位置，其余对象（文档、撤销历史、已删除的子树）照常序列化
+class _TreePickler(pickle.Pickler):
+
+    def __init__(self, file, positions) -> None:
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.positions = positions
+
+    def persistent_id(self, obj):
+        if type(obj) is HTMLElement:
+            return self.positions.get(id(obj))
+        return None
+
+
+class _TreeUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, nodes) -> None:
+        super().__init__(file)
+        self.nodes = nodes
+
+    def persistent_load(self, pid):
+        return self.nodes[pid]
@@ -0,0 +1,256 @@
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from .file_manager import FileManager
+
+#正在收集的Metrics（Metrics.start设置），为None时phase/split什么也不做，不收集时几乎没有开销
+_active = None
+#当前线程正在执行的命令（CommandRecord），阶段耗时同时记到它上面
+_local = threading.local()
+_NULL = nullcontext()
+
+
+#计时一个阶段：with phase("save.write"): ...；没有在收集时直接返回空的上下文
+def phase(name):
+    metrics = _active
+    if metrics is None:
+        return _NULL
+    return metrics.time_phase(name)
+
+
+#把chunks的迭代（生成下一块的时间）计入first阶段，with块中的其余时间计入second阶段，
+#用于边序列化边写入的保存：with split("save.serialize", "save.write", chunks) as chunks: write(chunks)
+def split(first, second, chunks):
+    metrics = _active
+    if metrics is None:
+        return nullcontext(chunks)
+    return metrics.time_split(first, second, chunks)
+
+
+#迭代时累计花在生成下一项上的时间
+class TimedIterator:
+
+    def __init__(self, iterable) -> None:
+        self._iterator = iter(iterable)
+        self.elapsed = 0.0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            return next(self._iterator)
+        finally:
+            self.elapsed += time.perf_counter() - start
+
+
+#一条命令的测量结果：墙上时间、CPU时间（秒），分配的内存块数变化；开启tracemalloc时还有分配的字节数变化和峰值
+#phases为命令执行期间各阶段的耗时（秒）
+class CommandRecord:
+
+    def __init__(self, command) -> None:
+        self.command = command
+        self.name = command.partition(" ")[0]
+        self.time = time.time()
+        self.ok = True
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.blocks = 0
+        self.alloc = None
+        self.peak = None
+        self.phases = {}
+
+    def to_dict(self) -> dict:
+        record = {"command": self.command, "time": round(self.time, 3), "ok": self.ok,
+                  "wall_ms": round(self.wall * 1000, 3), "cpu_ms": round(self.cpu * 1000, 3), "blocks": self.blocks,
+                  "phases": {name: round(seconds * 1000, 3) for name, seconds in self.phases.items()}}
+        if self.alloc is not None:
+            record["alloc_kb"] = round(self.alloc / 1024, 1)
+            record["peak_kb"] = round(self.peak / 1024, 1)
+        return record
+
+
+#同名命令或阶段的累计：次数、总耗时、最长耗时等
+class Summary:
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.wall = 0.0
+        self.max = 0.0
+        self.cpu = 0.0
+        self.blocks = 0
+        self.alloc = 0
+        self.peak = 0
+
+    def add(self, wall, record=None) -> None:
+        self.count += 1
+        self.wall += wall
+        self.max = max(self.max, wall)
+        if record is None:
+            return
+        self.errors += not record.ok
+        self.cpu += record.cpu
+        self.blocks += record.blocks
+        if record.alloc is not None:
+            self.alloc += record.alloc
+            self.peak = max(self.peak, record.peak)
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "errors": self.errors, "total_ms": round(self.wall * 1000, 3),
+                "mean_ms": round(self.wall * 1000 / self.count, 3) if self.count else 0.0,
+                "max_ms": round(self.max * 1000, 3), "cpu_ms": round(self.cpu * 1000, 3), "blocks": self.blocks,
+                "alloc_kb": round(self.alloc / 1024, 1), "peak_kb": round(self.peak / 1024, 1)}
+
+
+#命令和阶段的耗时统计（默认关闭，由 stats on 或 --metrics 开启）：
+#每条命令的墙上时间、CPU时间（整个进程）和内存分配变化，以及读取、保存、拼写检查内部各阶段的耗时；
+#trace_memory为True时用tracemalloc统计分配的字节数和峰值（明显拖慢执行），否则只统计分配的内存块数
+#服务器模式下多条命令可能同时执行，CPU时间和内存变化包含同时执行的其他命令
+#Service层
+class Metrics:
+
+    def __init__(self, trace_memory=False, keep=1000) -> None:
+        self.trace_memory = trace_memory
+        self.started = time.time()
+        #命令名 -> Summary，阶段名 -> Summary
+        self.commands = {}
+        self.phases = {}
+        #最近keep条命令的CommandRecord
+        self.recent = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._tracing = False
+
+    #开始收集，成为phase/split记录的目标
+    def start(self) -> None:
+        global _active
+        _active = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def stop(self) -> None:
+        global _active
+        if _active is self:
+            _active = None
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.commands = {}
+            self.phases = {}
+            self.recent.clear()
+
+    #测量一条命令：with metrics.command(line) as record: ...；命令失败时由调用方把record.ok设为False
+    @contextmanager
+    def command(self, command):
+        record = CommandRecord(command)
+        outer = getattr(_local, "record", None)
+        _local.record = record
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        blocks = sys.getallocatedblocks()
+        cpu = time.process_time()
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record.ok = False
+            raise
+        finally:
+            record.wall = time.perf_counter() - start
+            record.cpu = time.process_time() - cpu
+            record.blocks = sys.getallocatedblocks() - blocks
+            if tracing:
+                current, peak = tracemalloc.get_traced_memory()
+                record.alloc = current - base
+                record.peak = max(peak - base, 0)
+            _local.record = outer
+            with self._lock:
+                self.commands.setdefault(record.name, Summary()).add(record.wall, record)
+                self.recent.append(record)
+
+    #记录一个阶段的耗时（秒）
+    def add_phase(self, name, seconds) -> None:
+        record = getattr(_local, "record", None)
+        if record is not None:
+            record.phases[name] = record.phases.get(name, 0.0) + seconds
+        with self._lock:
+            self.phases.setdefault(name, Summary()).add(seconds)
+
+    @contextmanager
+    def time_phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(name, time.perf_counter() - start)
+
+    @contextmanager
+    def time_split(self, first, second, chunks):
+        timed = TimedIterator(chunks)
+        start = time.perf_counter()
+        try:
+            yield timed
+        finally:
+            self.add_phase(first, timed.elapsed)
+            self.add_phase(second, time.perf_counter() - start - timed.elapsed)
+
+    #可以写成JSON的全部统计
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"started": round(self.started, 3), "trace_memory": self.trace_memory,
+                    "commands": {name: summary.to_dict() for name, summary in sorted(self.commands.items())},
+                    "phases": {name: summary.to_dict() for name, summary in sorted(self.phases.items())},
+                    "recent": [record.to_dict() for record in self.recent]}
+
+    #写入JSON文件（先写临时文件再替换）
+    def dump(self, path) -> None:
+        FileManager.atomic_write(path, [json.dumps(self.to_dict(), indent=2)])
+
+    #stats 命令显示的汇总表
+    def report(self) -> str:
+        data = self.to_dict()
+        memory = ("alloc KB", "peak KB") if self.trace_memory else ("blocks",)
+        since = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.started))
+        lines = [f"Metrics since {since} (tracemalloc {'on' if self.trace_memory else 'off'})"]
+        header = f"{'command':<14} {'count':>6} {'errors':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'cpu ms':>9}"
+        lines.append(header + "".join(f" {title:>9}" for title in memory))
+        for name, summary in data["commands"].items():
+            line = (f"{name:<14} {summary['count']:>6} {summary['errors']:>6} {summary['total_ms']:>10.2f} "
+                    f"{summary['mean_ms']:>9.2f} {summary['max_ms']:>9.2f} {summary['cpu_ms']:>9.2f}")
+            if self.trace_memory:
+                line += f" {summary['alloc_kb']:>9.1f} {summary['peak_kb']:>9.1f}"
+            else:
+                line += f" {summary['blocks']:>9}"
+            lines.append(line)
+        if data["phases"]:
+            lines.append(f"\n{'phase':<22} {'count':>6} {'total ms':>10} {'mean ms':>9} {'max ms':>9}")
+            for name, summary in data["phases"].items():
+                lines.append(f"{name:<22} {summary['count']:>6} {summary['total_ms']:>10.2f} "
+                             f"{summary['mean_ms']:>9.2f} {summary['max_ms']:>9.2f}")
+        return "\n".join(lines)
+
+    #最近count条命令，每条一行，后面列出各阶段的耗时
+    def report_recent(self, count) -> str:
+        with self._lock:
+            records = list(self.recent)[-count:] if count else []
+        lines = []
+        for record in records:
+            line = f"{record.wall * 1000:>9.2f} ms  cpu {record.cpu * 1000:>8.2f} ms  {record.command}"
+            if not record.ok:
+                line += "  (failed)"
+            lines.append(line)
+            for name, seconds in record.phases.items():
+                lines.append(f"{'':>11}{name} {seconds * 1000:.2f} ms")
+        return "\n".join(lines) if lines else "No commands recorded."
@@ -0,0 +1,203 @@
+import gc
+from html.entities import html5
+from html.parser import HTMLParser
+from .html_element import HTMLElement
+
+
+#基于标准库HTMLParser的加载器：边解析边直接创建HTMLElement，不构建BeautifulSoup的对象树
+#结果与BeautifulSoup(file, "html.parser")再经_build_element_tree转换完全一致：
+#  - 空元素（br、img等）开始即结束，随后多余的结束标签被忽略
+#  - 结束标签关闭最近的同名元素及其内部所有未关闭的元素，没有同名的打开元素时忽略
+#  - 元素文本取bs4的.string：唯一的子节点是文本时取该文本，唯一的子节点是元素时取其.string，否则为空
+#  - 注释、DOCTYPE、CDATA等也算作文本子节点；只含空白的文本在pre/textarea之外折叠为一个空格或换行
+#Service层
+
+#bs4的HTMLTreeBuilder中没有结束标签的元素
+VOID_ELEMENTS = frozenset((
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image",
+    "img", "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source",
+    "spacer", "track", "wbr",
+))
+#保留空白的元素
+PRESERVE_WHITESPACE = frozenset(("pre", "textarea"))
+_ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+#实体名（不含分号） -> 字符，与bs4使用的表相同
+_ENTITIES = {name[:-1]: value for name, value in html5.items() if name.endswith(";")}
+
+#栈帧下标：标签名、对应的HTMLElement（不在html子树内时为None）、子节点个数、唯一子节点的文本
+_NAME, _ELEMENT, _COUNT, _STRING = range(4)
+
+
+class NativeTreeBuilder(HTMLParser):
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=False)
+        self.root = None
+        self.title = None
+        self.index = {}
+        self._stack = []
+        self._open = {}
+        self._data = []
+        self._preserve = 0
+        self._closed_void = []
+        self._title_frame = None
+        self._has_title = False
+
+    #解析整个文本，返回(title, 根元素, id索引)；没有html元素时返回None
+    #建树期间只新增对象、不产生垃圾，暂停循环垃圾回收，避免大文件上反复扫描已建好的元素
+    def build(self, text):
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self.feed(text)
+            self.close()
+            self._end_data()
+            while self._stack:
+                self._pop()
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if self.root is None:
+            return None
+        title = self.title if self._has_title else "Untitled"
+        return title, self.root, self.index
+
+    def handle_starttag(self, tag, attrs) -> None:
+        self._start(tag, attrs)
+        if tag in VOID_ELEMENTS:
+            self._end(tag)
+            self._closed_void.append(tag)
+
+    #<tag/>形式：不按空元素处理，直接结束
+    def handle_startendtag(self, tag, attrs) -> None:
+        self._start(tag, attrs)
+        self.handle_endtag(tag)
+
+    def handle_endtag(self, tag) -> None:
+        if tag in self._closed_void:
+            self._closed_void.remove(tag)
+        else:
+            self._end(tag)
+
+    def handle_data(self, data) -> None:
+        self._data.append(data)
+
+    #数字字符引用：小于256的按windows-1252解码，与bs4的兼容处理相同
+    def handle_charref(self, name) -> None:
+        if name.startswith("x"):
+            code = int(name.lstrip("x"), 16)
+        elif name.startswith("X"):
+            code = int(name.lstrip("X"), 16)
+        else:
+            code = int(name)
+        data = None
+        if code < 256:
+            try:
+                data = bytes((code,)).decode("windows-1252")
+            except UnicodeDecodeError:
+                pass
+        if not data:
+            try:
+                data = chr(code)
+            except (ValueError, OverflowError):
+                pass
+        self._data.append(data or "\N{REPLACEMENT CHARACTER}")
+
+    def handle_entityref(self, name) -> None:
+        character = _ENTITIES.get(name)
+        self._data.append(character if character is not None else "&" + name)
+
+    def handle_comment(self, data) -> None:
+        self._separate(data)
+
+    def handle_decl(self, decl) -> None:
+        self._separate(decl[len("DOCTYPE "):])
+
+    def unknown_decl(self, data) -> None:
+        if data.upper().startswith("CDATA["):
+            data = data[len("CDATA["):]
+        self._separate(data)
+
+    def handle_pi(self, data) -> None:
+        self._separate(data)
+
+    #注释等单独成为一个文本节点，不与前后的文本合并
+    def _separate(self, data) -> None:
+        self._end_data()
+        self._data.append(data)
+        self._end_data()
+
+    def _start(self, tag, attrs) -> None:
+        self._end_data()
+        stack = self._stack
+        parent = stack[-1] if stack else None
+        if parent is not None:
+            parent[_COUNT] += 1
+        element = None
+        if self.root is None and tag == "html":
+            element = self.root = self._new_element(tag, attrs)
+        elif parent is not None and parent[_ELEMENT] is not None:
+            element = self._new_element(tag, attrs)
+            parent[_ELEMENT].add_child(element)
+        frame = [tag, element, 0, None]
+        stack.append(frame)
+        self._open[tag] = self._open.get(tag, 0) + 1
+        if tag in PRESERVE_WHITESPACE:
+            self._preserve += 1
+        if tag == "title" and self._title_frame is None and not self._has_title:
+            self._title_frame = frame
+
+    def _new_element(self, tag, attrs) -> HTMLElement:
+        element_id = tag
+        for key, value in attrs:
+            if key == "id":
+                element_id = value if value is not None else ""
+        element = HTMLElement(tag=tag, element_id=element_id)
+        bucket = self.index.get(element_id)
+        if bucket is None:
+            self.index[element_id] = [element]
+        else:
+            bucket.append(element)
+        return element
+
+    #关闭最近的同名元素，中间未关闭的元素一并关闭
+    def _end(self, tag) -> None:
+        self._end_data()
+        if not self._open.get(tag):
+            return
+        while self._pop()[_NAME] != tag:
+            pass
+
+    #元素出栈时子节点已经确定，计算它的文本并交给父元素
+    def _pop(self):
+        stack = self._stack
+        frame = stack.pop()
+        tag = frame[_NAME]
+        self._open[tag] -= 1
+        if tag in PRESERVE_WHITESPACE:
+            self._preserve -= 1
+        string = frame[_STRING] if frame[_COUNT] == 1 else None
+        element = frame[_ELEMENT]
+        if element is not None and string:
+            element.content = string.strip()
+        if stack and stack[-1][_COUNT] == 1:
+            stack[-1][_STRING] = string
+        if frame is self._title_frame:
+            self.title = string
+            self._has_title = True
+            self._title_frame = None
+        return frame
+
+    #把累积的文本作为一个文本子节点加入当前元素
+    def _end_data(self) -> None:
+        if not self._data:
+            return
+        data = "".join(self._data)
+        self._data = []
+        if not self._preserve and not data.strip(_ASCII_SPACES):
+            data = "\n" if "\n" in data else " "
+        if self._stack:
+            frame = self._stack[-1]
+            frame[_COUNT] += 1
+            if frame[_COUNT] == 1:
+                frame[_STRING] = data
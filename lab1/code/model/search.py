@@ -0,0 +1,116 @@
+import os
+import re
+import weakref
+from .dir_walker import DirectoryWalker
+from .html_editor import parse_html_file
+from .text_index import TextIndex
+from .traversal import preorder, ENTER
+
+#正则表达式中的特殊字符，模式中出现（未转义）时不是普通文本
+_META = set(".^$*+?{}[]|()")
+#少于这么多个文件（或只有一个CPU）时直接在当前进程中查找，进程池的启动开销不划算
+_POOL_MIN_FILES = 2
+#单词的写法与倒排索引相同
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+#没有维护倒排索引的文档：文档 -> (文档版本号, 临时索引)，文档修改后下次查找时重建
+_indexes = weakref.WeakKeyDictionary()
+
+
+#文档的单词倒排索引：文档自己维护的索引（HTMLDocument.text_index），没有时用按版本号缓存的临时索引
+def word_index(document) -> TextIndex:
+    if document.text_index is not None:
+        return document.text_index
+    cached = _indexes.get(document)
+    if cached is not None and cached[0] == document.generation:
+        return cached[1]
+    index = TextIndex(document.html)
+    _indexes[document] = (document.generation, index)
+    return index
+
+
+#模式为普通文本（可以含转义的标点，两端可以有\b）时，返回其中的单词以及单词两侧在匹配处是否一定是单词边界：
+#[(小写的单词, 左侧是边界, 右侧是边界)]；模式含有其他正则语法时返回None
+#例如 "new york" 中 new 的右侧、york 的左侧是空格，new 只能是以它结尾的单词，york 只能是以它开头的单词
+def literal_words(pattern):
+    left = pattern.startswith(r"\b")
+    if left:
+        pattern = pattern[2:]
+    right = pattern.endswith(r"\b") and not pattern.endswith(r"\\b")
+    if right:
+        pattern = pattern[:-2]
+    text = []
+    i = 0
+    while i < len(pattern):
+        c = pattern[i]
+        if c == "\\":
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                return None
+            i += 1
+            c = pattern[i]
+        elif c in _META:
+            return None
+        text.append(c)
+        i += 1
+    text = "".join(text)
+    return [(match.group().lower(), match.start() > 0 or left, match.end() < len(text) or right)
+            for match in _TOKEN_PATTERN.finditer(text)]
+
+
+#在文档中查找文本与regex匹配的元素（按文档顺序）：模式是普通文本时先用倒排索引缩小范围，否则逐个元素匹配
+def find_in_document(document, regex) -> list:
+    words = literal_words(regex.pattern)
+    if words:
+        index = word_index(document)
+        candidates = index.ordered(index.candidates(words), document.html)
+    else:
+        candidates = document.iter_elements()
+    return [element for element in candidates if element.content and regex.search(element.content)]
+
+
+#读取并查找一个文件，返回[(元素id, 文本)]；定义在模块顶层，可以放到进程池中执行
+def scan_file(path, pattern, flags=0, cache=None, loader="native") -> list:
+    parsed = parse_html_file(path, cache, loader)
+    if parsed is None:
+        return []
+    regex = re.compile(pattern, flags)
+    return [(element.id, element.content) for element in preorder(parsed[1])
+            if element.content and regex.search(element.content)]
+
+
+#进程池：子进程用forkserver（不支持时用spawn）启动；fork会把自动保存、服务器线程池等其他线程持有的锁
+#原样复制到子进程中，子进程用到这些锁时可能永远等待
+#concurrent.futures（连带multiprocessing、logging）只在用到时导入，不拖慢启动
+def process_pool(max_workers):
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+
+
+#在多个文件中查找，文件较多时在进程池中并行解析和查找；返回 {文件: [(元素id, 文本)]}，读取失败的文件对应异常对象
+def scan_files(paths, pattern, flags=0, cache=None, loader="native", max_workers=None) -> dict:
+    results = {}
+    workers = max_workers or min(len(paths), os.cpu_count() or 1)
+    if len(paths) < _POOL_MIN_FILES or workers < 2:
+        for path in paths:
+            try:
+                results[path] = scan_file(path, pattern, flags, cache, loader)
+            except Exception as e:
+                results[path] = e
+        return results
+    with process_pool(workers) as pool:
+        futures = {path: pool.submit(scan_file, path, pattern, flags, cache, loader) for path in paths}
+        for path, future in futures.items():
+            error = future.exception()
+            results[path] = error if error is not None else future.result()
+    return results
+
+
+#目录下（含子目录）所有的.html文件，按路径排序；与dir-tree相同，跳过以.开头和被.gitignore忽略的文件
+def html_files(directory, cache=None) -> list:
+    paths = []
+    for event, node, depth, _ in DirectoryWalker(cache=cache).walk(os.path.abspath(directory)):
+        if event == ENTER and depth and not node.is_dir and node.name.endswith(".html"):
+            paths.append(node.path)
+    return sorted(set(paths))
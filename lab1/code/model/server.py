@@ -0,0 +1,329 @@
+import asyncio
+import io
+import json
+import os
+import signal
+import stat
+import sys
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+from .client import parse_address
+
+#SessionManager.READ_ONLY以外的命令都会取编辑器的线程锁、可能写日志（fsync或写检查点），与自动保存线程竞争，
+#全部放到线程池中执行，避免阻塞事件循环，它们之间的顺序由文档和会话的读写锁保证；
+#只读命令中显示大文档较耗时，也放到线程池中，其余只读命令直接在事件循环中执行
+OFFLOAD = frozenset({"print-tree", "print-indent"})
+#查文档单词索引的命令：文档没有维护索引（--no-text-index）时要临时建立整个索引，与OFFLOAD一样放到线程池中
+INDEXED = frozenset({"lookup", "words"})
+#不需要活动编辑器、也不修改会话的命令，与其他命令同时执行；其余会话级命令（打开、关闭、保存、事务等）独占会话
+SHARED = frozenset({"help", "find", "dir-tree", "dir-indent"})
+#读取所有打开的文档的命令
+ALL_DOCUMENTS = frozenset({"find"})
+#单个请求的最大长度
+_LINE_LIMIT = 1 << 24
+
+
+#事件循环中的读写锁：读者可以同时持有，写者独占；先来先得，排队的写者之后到达的读者也要等待，写者不会饿死
+class RWLock:
+
+    def __init__(self) -> None:
+        self._readers = 0
+        self._writer = False
+        #(是否为写者, future)
+        self._waiters = deque()
+
+    async def acquire(self, write) -> None:
+        if not self._waiters and not self._writer and not (write and self._readers):
+            self._grant(write)
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append((write, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            #已经分到锁之后才被取消时交还锁；还在排队时让排在它后面的等待者重新检查
+            if future.done() and not future.cancelled():
+                self.release(write)
+            else:
+                self._wake()
+            raise
+
+    def release(self, write) -> None:
+        if write:
+            self._writer = False
+        else:
+            self._readers -= 1
+        self._wake()
+
+    @asynccontextmanager
+    async def hold(self, write):
+        await self.acquire(write)
+        try:
+            yield
+        finally:
+            self.release(write)
+
+    def _grant(self, write) -> None:
+        if write:
+            self._writer = True
+        else:
+            self._readers += 1
+
+    def _wake(self) -> None:
+        while self._waiters:
+            write, future = self._waiters[0]
+            if future.done():
+                self._waiters.popleft()
+                continue
+            if self._writer or (write and self._readers):
+                return
+            self._waiters.popleft()
+            self._grant(write)
+            future.set_result(None)
+            if write:
+                return
+
+
+#替换sys.stdout：设置了缓冲区的线程（正在执行某个请求的命令）输出到自己的缓冲区，其余输出照常
+class _OutputRouter(io.TextIOBase):
+
+    def __init__(self, default) -> None:
+        self.default = default
+        self.local = threading.local()
+
+    def write(self, text) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        return (buffer if buffer is not None else self.default).write(text)
+
+    def flush(self) -> None:
+        if getattr(self.local, "buffer", None) is None:
+            self.default.flush()
+
+
+#一个客户端连接：active为它的活动文件；holding表示它开启了事务，提交或回滚前独占会话
+class _Connection:
+
+    def __init__(self) -> None:
+        self.active = None
+        self.holding = False
+
+
+#编辑服务器：多个客户端通过Unix域套接字或本机TCP共用一个SessionManager，协议见client.EditorClient
+#每行一个请求，可以是JSON对象 {"id", "command"[, "file"]}，也可以直接是一条命令；每个请求返回一行JSON
+#并发控制（事件循环中的读写锁，命令本身在持有锁后执行）：
+#  - 会话级命令（load、close、save、edit、begin等）独占会话；help、find、dir-tree等与其他命令同时执行
+#  - 编辑命令共享会话、独占它作用的文档，同一文档上的修改按到达顺序逐条执行，不同文档上的修改互不等待
+#  - print-tree、lookup等只读命令共享文档，可以同时执行
+#  - 只有lookup、words等不取线程锁的只读命令在事件循环中执行，其余命令在线程池中执行
+#  - begin之后该连接独占会话，直到commit/rollback；连接断开时回滚
+#Controller层
+class EditorServer:
+
+    def __init__(self, session, address, max_workers=4) -> None:
+        self.session = session
+        self.address = address
+        #关闭文件时不询问，与批处理相同
+        session.interactive = False
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="editor-server")
+        self._session_lock = RWLock()
+        #文件名 -> RWLock
+        self._documents = {}
+        self._connections = set()
+        self._router = None
+        self._loop = None
+        self._stopping = None
+        #开始接受连接后设置，供在其他线程中启动服务器的调用方等待
+        self.ready = threading.Event()
+
+    #运行直到收到shutdown请求、SIGINT/SIGTERM或stop()，退出前保存会话状态
+    def run(self) -> None:
+        asyncio.run(self.serve())
+
+    #可以在其他线程中调用，服务器已经退出时什么也不做
+    def stop(self) -> None:
+        if self._loop is None:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        except RuntimeError:
+            pass
+
+    async def serve(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        kind, target = parse_address(self.address)
+        if kind == "unix":
+            #上次没有正常退出时留下的套接字文件
+            if os.path.exists(target) and stat.S_ISSOCK(os.stat(target).st_mode):
+                os.unlink(target)
+            server = await asyncio.start_unix_server(self._handle, path=target, limit=_LINE_LIMIT)
+        else:
+            server = await asyncio.start_server(self._handle, *target, limit=_LINE_LIMIT)
+        if threading.current_thread() is threading.main_thread():
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                self._loop.add_signal_handler(signum, self._stopping.set)
+        print(f"Serving on {self.address}")
+        self._router = _OutputRouter(sys.stdout)
+        sys.stdout = self._router
+        self.ready.set()
+        try:
+            await self._stopping.wait()
+        finally:
+            server.close()
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            #等正在线程池中执行的命令结束后再保存会话
+            await self._loop.run_in_executor(None, self._executor.shutdown)
+            sys.stdout = self._router.default
+            self._close_session()
+            if kind == "unix" and os.path.exists(target):
+                os.unlink(target)
+
+    #与交互模式的exit相同：回滚未提交的事务，保存等待自动保存的文件和会话状态，为日志写检查点，写出统计
+    def _close_session(self) -> None:
+        session = self.session
+        if session.transaction is not None:
+            session.execute("rollback")
+        session.stop_autosave(wait=True)
+        session.save_session_state()
+        session.close_journal()
+        session.write_metrics()
+
+    async def _handle(self, reader, writer) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        connection = _Connection()
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ConnectionError, ValueError):
+                    break
+                if not line:
+                    break
+                request = self._parse(line)
+                if request is None:
+                    continue
+                command = request["command"]
+                if command in ("exit", "quit"):
+                    break
+                if command == "shutdown":
+                    ok, output = True, "Shutting down."
+                elif "error" in request:
+                    ok, output = False, request["error"]
+                else:
+                    ok, output = await self._execute(connection, command, request.get("file"))
+                response = {"id": request.get("id"), "ok": ok, "output": output, "file": connection.active}
+                writer.write(json.dumps(response, ensure_ascii=False).encode("utf-8") + b"\n")
+                try:
+                    await writer.drain()
+                except ConnectionError:
+                    break
+                if command == "shutdown":
+                    self._stopping.set()
+                    break
+            if connection.holding:
+                await self._execute(connection, "rollback", None)
+        finally:
+            #被取消（服务器退出）时仍持有会话：事务由_close_session回滚
+            if connection.holding:
+                connection.holding = False
+                self._session_lock.release(True)
+            self._connections.discard(task)
+            writer.close()
+
+    #一行请求：JSON对象或一条命令；空行返回None
+    @staticmethod
+    def _parse(line):
+        text = line.decode("utf-8", errors="replace").strip()
+        if not text:
+            return None
+        if not text.startswith("{"):
+            return {"command": text}
+        try:
+            request = json.loads(text)
+        except ValueError as e:
+            return {"command": "", "error": f"Invalid request: {e}"}
+        if not isinstance(request, dict) or not isinstance(request.get("command"), str):
+            return {"id": request.get("id") if isinstance(request, dict) else None, "command": "",
+                    "error": "Invalid request: command must be a string"}
+        request["command"] = request["command"].strip()
+        return request
+
+    #取得命令需要的锁后执行，返回(是否成功, 输出)
+    async def _execute(self, connection, command, file):
+        name = command.partition(" ")[0]
+        spec = self.session.COMMANDS.get(name)
+        if connection.holding:
+            result = await self._call(connection, command, file, True)
+            if self.session.transaction is None:
+                connection.holding = False
+                self._session_lock.release(True)
+            return result
+        exclusive = spec is None or (not spec.needs_editor and name not in SHARED)
+        await self._session_lock.acquire(exclusive)
+        try:
+            if exclusive:
+                result = await self._call(connection, command, file, True)
+                #begin成功：直到提交或回滚都不交还会话锁
+                connection.holding = self.session.transaction is not None
+                return result
+            async with AsyncExitStack() as stack:
+                for filename, write in self._document_locks(name, spec, file or connection.active):
+                    await stack.enter_async_context(self._documents.setdefault(filename, RWLock()).hold(write))
+                return await self._call(connection, command, file, False)
+        finally:
+            if not connection.holding:
+                self._session_lock.release(exclusive)
+
+    #命令需要的文档锁 [(文件名, 是否独占)]，多个文档时按文件名排序，避免互相等待
+    def _document_locks(self, name, spec, filename) -> list:
+        editors = self.session.editors
+        if name in ALL_DOCUMENTS:
+            return [(item, False) for item in sorted(editors)]
+        if not spec.needs_editor or filename not in editors:
+            return []
+        #尚未解析的延迟加载文件第一次使用时会被解析，同样需要独占
+        write = name not in self.session.READ_ONLY or not editors[filename].is_loaded()
+        return [(filename, write)]
+
+    async def _call(self, connection, command, file, exclusive):
+        name = command.partition(" ")[0]
+        editor = self.session.editors.get(file or connection.active)
+        inline = name in self.session.READ_ONLY and name not in OFFLOAD
+        if editor is not None and (not editor.is_loaded() or (name in INDEXED and editor.document.text_index is None)):
+            inline = False
+        if not inline:
+            return await self._loop.run_in_executor(self._executor, self._run, connection, command, file, exclusive)
+        return self._run(connection, command, file, exclusive)
+
+    #在事件循环或线程池中执行命令，输出收集到这个线程自己的缓冲区
+    #会话级命令执行时把会话的活动编辑器换成该连接的活动文件，执行后记下切换的结果；其余命令直接指定编辑器
+    def _run(self, connection, command, file, exclusive):
+        session = self.session
+        output = io.StringIO()
+        self._router.local.buffer = output
+        try:
+            target = file or connection.active
+            if exclusive:
+                session.active_editor = target if target in session.editors else None
+                done = session.execute(command)
+                if session.active_editor != target:
+                    connection.active = session.active_editor
+            else:
+                spec = session.COMMANDS[command.partition(" ")[0]]
+                editor = session.editors.get(target) if spec.needs_editor else None
+                if spec.needs_editor and editor is None:
+                    print("No active editor. Please load or edit a file first.")
+                    done = False
+                else:
+                    done = session.execute(command, editor)
+        except Exception as e:
+            print(f"Error: {e}")
+            done = False
+        finally:
+            self._router.local.buffer = None
+        return done is not False, output.getvalue()
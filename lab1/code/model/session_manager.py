@@ -1,70 +1,381 @@
+import io
 import os
+import sys
 import json
-from model.html_editor import HTMLEditor
+import re
+import shlex
+import time
+from collections import namedtuple
+from contextlib import ExitStack, nullcontext, redirect_stdout
+from model.html_editor import HTMLEditor, parse_html_file
 from model.file_manager import FileManager
+from model.dir_walker import DirectoryCache
+from model.spell_service import SpellService
+from model.tree_cache import TreeCache
+from model.history import UndoHistory
+from model.journal import Journal
+from model.autosave import AutosaveWorker, DEFAULT_DELAY
+from model.transaction import Transaction
+from model.metrics import Metrics
+from model.text_index import tokenize
+from model.search import find_in_document, scan_files, html_files, word_index, process_pool
+
+HELP_TEXT = """Available commands:
+  load <filename>         - Load or create a new editor for <filename>
+  save <filename>         - Save the specified file
+  save-all                - Save every modified file
+  close                   - Close the current editor
+  editor-list             - List all open editors
+  edit <filename>         - Switch to the specified editor
+  showid true/false       - Toggle showid for current editor
+  dir-tree [-a] [-d depth] [path] - Display directory in tree format (-a: include hidden and ignored files)
+  dir-indent [-a] [-d depth] [path] - Display directory in indent format
+  insert <tag> <id> <target_id> [content] - Insert new element before target
+  append <tag> <id> <parent_id> [content] - Append new element inside parent
+  edit-id <old_id> <new_id> - Edit the id of an element
+  edit-text <element_id> [new_content] - Edit text content of an element
+  delete <element_id>     - Delete an element
+  apply <op>; <op>; ...   - Check a batch of insert/append/edit-id/edit-text/delete operations, then apply all as one undo step
+  undo                    - Undo the last operation
+  redo                    - Redo the last undone operation
+  undo-stats              - Show the undo history depth and its memory use
+  spell-check             - Perform spell check on the document
+  find [-i] [--dir <path>] <pattern> - Find elements whose text matches a regex in all open files (or in the html files under <path>)
+  replace [-i] [--dir <path>] <pattern> <replacement> - Replace regex matches in element text (one undo step per file)
+  lookup <word>|<prefix>* - List elements of the active document whose text contains the word (or a word with the prefix)
+  words [prefix]          - List the words of the active document (starting with prefix) and how many elements contain each
+  spell-lang <lang> [dictionary] - Set spell check language or dictionary file
+  print-tree [-d depth] [-n lines] [-p] [id] - Display the HTML structure (or the subtree of id) as a tree
+  print-indent [-d depth] [-n lines] [-p] [indent] [id] - Display HTML with indentation
+  begin                   - Start a transaction (apply or discard the following changes as one unit)
+  commit                  - Apply the transaction; it is undone with a single undo
+  rollback                - Discard every change made since begin
+  autosave [on [seconds]|off] - Save modified files automatically after they stay idle
+  stats [on [memory]|off|reset|last [n]|dump <file>] - Show or control the timing and memory metrics of each command
+  profile [-n count] [-s tottime|cumulative] <command> - Run a command under cProfile and list the functions it spent most time in
+  help                    - Display this help message
+  exit                    - Exit the program
+"""
+
+
+# 命令用法错误、没有活动编辑器等无法执行的情况
+class CommandError(Exception):
+    pass
+
+
+# 照常写到 target，同时保留最后 keep 个字符，用于取得命令输出的最后一行；isatty 等按 target 回答，分页显示不受影响
+class _OutputTail(io.TextIOBase):
+
+    def __init__(self, target, keep=4096):
+        self.target = target
+        self.keep = keep
+        self._tail = ""
+
+    def write(self, text):
+        self._tail = (self._tail + text)[-self.keep:]
+        return self.target.write(text)
+
+    def flush(self):
+        self.target.flush()
+
+    def isatty(self):
+        return self.target.isatty()
+
+    def fileno(self):
+        return self.target.fileno()
+
+    def getvalue(self):
+        return self._tail
+
+
+# 命令表的一项：handler 为处理方法名，needs_editor 表示需要活动编辑器，
+# prints 表示命令的输出就是结果（批处理模式下不屏蔽），history 为命令对编辑器历史的影响（"do"/"undo"/"redo"，事务回滚时使用）
+CommandSpec = namedtuple("CommandSpec", "handler needs_editor prints history")
+
 
 class SessionManager:
-    def __init__(self):
+    # 恢复会话的方式：eager 逐个解析；lazy 只登记文件，首次使用时才解析；parallel 在进程池中并行解析
+    RESTORE_MODES = ("eager", "lazy", "parallel")
+
+    # 命令名 -> CommandSpec
+    COMMANDS = {
+        "help": CommandSpec("_cmd_help", False, True, None),
+        "load": CommandSpec("_cmd_load", False, False, None),
+        "save": CommandSpec("_cmd_save", False, False, None),
+        "save-all": CommandSpec("_cmd_save_all", False, False, None),
+        "close": CommandSpec("_cmd_close", False, False, None),
+        "editor-list": CommandSpec("_cmd_editor_list", False, True, None),
+        "edit": CommandSpec("_cmd_edit", False, False, None),
+        "showid": CommandSpec("_cmd_showid", False, False, None),
+        "spell-lang": CommandSpec("_cmd_spell_lang", False, False, None),
+        "dir-tree": CommandSpec("_cmd_dir_tree", False, True, None),
+        "dir-indent": CommandSpec("_cmd_dir_indent", False, True, None),
+        "insert": CommandSpec("_cmd_insert", True, False, "do"),
+        "append": CommandSpec("_cmd_append", True, False, "do"),
+        "edit-id": CommandSpec("_cmd_edit_id", True, False, "do"),
+        "edit-text": CommandSpec("_cmd_edit_text", True, False, "do"),
+        "delete": CommandSpec("_cmd_delete", True, False, "do"),
+        "apply": CommandSpec("_cmd_apply", True, False, "do"),
+        "undo": CommandSpec("_cmd_undo", True, False, "undo"),
+        "redo": CommandSpec("_cmd_redo", True, False, "redo"),
+        "undo-stats": CommandSpec("_cmd_undo_stats", True, True, None),
+        "spell-check": CommandSpec("_cmd_spell_check", True, True, None),
+        "lookup": CommandSpec("_cmd_lookup", True, True, None),
+        "words": CommandSpec("_cmd_words", True, True, None),
+        "find": CommandSpec("_cmd_find", False, True, None),
+        "replace": CommandSpec("_cmd_replace", False, False, None),
+        "print-tree": CommandSpec("_cmd_print_tree", True, True, None),
+        "print-indent": CommandSpec("_cmd_print_indent", True, True, None),
+        "begin": CommandSpec("_cmd_begin", False, False, None),
+        "commit": CommandSpec("_cmd_commit", False, False, None),
+        "rollback": CommandSpec("_cmd_rollback", False, False, None),
+        "autosave": CommandSpec("_cmd_autosave", False, True, None),
+        "stats": CommandSpec("_cmd_stats", False, True, None),
+        "profile": CommandSpec("_cmd_profile", False, True, None),
+    }
+
+    # 只读取文档的命令：不持有编辑器锁，同一文档上的只读命令可以同时执行（服务器模式下由服务器保证期间没有修改）
+    READ_ONLY = frozenset({"print-tree", "print-indent", "undo-stats", "lookup", "words"})
+
+    def __init__(self, restore_mode="eager", tree_cache=True, loader="native", restore=True, undo_options=None,
+                 journal=True, journal_options=None, autosave=None, text_index=True, metrics=None, metrics_file=None):
+        self.restore_mode = restore_mode
+        self.undo_options = undo_options or {}  # UndoHistory 的参数：max_entries、max_bytes、compress
+        self.loader = loader  # 文件加载器，native 直接由 HTMLParser 建树，bs4 为原来的 BeautifulSoup 实现
+        self.tree_cache = TreeCache() if tree_cache else None  # 解析结果缓存，放在session_state.json旁边的.html_cache目录
         self.editors = {}  # 存储所有加载的编辑器，键为文件名，值为 HTMLEditor 实例
         self.active_editor = None  # 当前活动的编辑器
-        self.modified_files = set()  # 记录有修改的文件但未保存的
         self.showid = {}  # 记录每个文件是否显示ID的设置
-        self.load_session_state()  # 尝试恢复上次会话的状态
+        self.text_index = text_index  # 是否为每个文档维护单词倒排索引，关闭时 find/lookup/words 每次修改后临时建立
+        self.spell_service = SpellService()  # 会话内所有编辑器共享的拼写检查服务，词典首次使用时才加载
+        self.interactive = True  # 交互模式下关闭有未保存修改的文件时询问是否保存，批处理模式下不询问
+        self.transaction = None  # 进行中的事务（Transaction），期间的修改可整体回滚
+        self.journal = Journal(**(journal_options or {})) if journal else None  # 会话日志，崩溃后恢复未保存的修改和撤销历史
+        self.dir_cache = DirectoryCache()  # dir-tree/dir-indent 的目录内容缓存
+        self.autosave = None  # 自动保存（AutosaveWorker），autosave 为空闲多少秒后保存，None 表示关闭
+        self.metrics = metrics  # 命令耗时统计（Metrics），None 表示不统计，可由 stats on/off 切换
+        self.metrics_file = metrics_file  # 退出时把统计写入这个 JSON 文件
+        if metrics is not None:
+            metrics.start()
+        if restore:
+            self.load_session_state()  # 尝试恢复上次会话的状态
+        if autosave is not None:
+            self.start_autosave(autosave)
+
+    @property
+    def modified_files(self):
+        # 内容与磁盘上不同的文件，由文档的版本号和内容摘要判断
+        return {filename for filename, editor in self.editors.items() if self._is_modified(editor)}
+
+    def _is_modified(self, editor):
+        # 尚未解析的延迟加载编辑器一定未修改，不为判断而触发解析
+        return editor.is_loaded() and editor.document is not None and editor.document.is_modified()
 
     def load_session_state(self):
-        # 尝试从保存的 session 文件恢复状态
+        # 尝试从保存的 session 文件恢复状态；有日志的文件按日志恢复（包括上次崩溃时打开、未记入 session 文件的文件）
+        state = {}
         if os.path.exists("session_state.json"):
             with open("session_state.json", "r") as session_file:
                 state = json.load(session_file)
-                for filename in state.get("files", []):
-                    self.load_editor(filename)
-                    self.showid[filename] = state.get("showid", {}).get(filename, True)
-                self.active_editor = state.get("active_editor", None)
-                if self.active_editor and self.active_editor in self.editors:
-                    print(f"Restored active editor: {self.active_editor}")
+        spell = state.get("spell", {})
+        self.spell_service.configure(spell.get("language", "en"), spell.get("dictionary"))
+        filenames = state.get("files", [])
+        start = time.perf_counter()
+        recovered = self._recover_journals(filenames)
+        remaining = [filename for filename in filenames if filename not in recovered]
+        if self.restore_mode == "lazy":
+            self._restore_lazy(remaining)
+        elif self.restore_mode == "parallel":
+            self._restore_parallel(remaining)
+        else:
+            for filename in remaining:
+                self.load_editor(filename)
+        elapsed = (time.perf_counter() - start) * 1000
+        order = filenames + [filename for filename in recovered if filename not in filenames]
+        self.editors = {filename: self.editors[filename] for filename in order if filename in self.editors}
+        for filename in filenames:
+            self.showid[filename] = state.get("showid", {}).get(filename, True)
+            if filename in self.editors:
+                self.editors[filename].showid = self.showid[filename]
+        self.active_editor = state.get("active_editor", None)
+        if self.active_editor not in self.editors:
+            self.active_editor = next(iter(self.editors), None)
+        if order:
+            print(f"Restored {len(order)} file(s) in {elapsed:.1f} ms ({self.restore_mode} mode)")
+        if self.active_editor and self.active_editor in self.editors:
+            print(f"Restored active editor: {self.active_editor}")
+
+    def _recover_journals(self, filenames):
+        # 重放日志：从检查点（或磁盘上的文件）开始依次执行日志中的命令，返回恢复了的文件名
+        recovered = []
+        if self.journal is None:
+            return recovered
+        journaled = self.journal.journaled_files()
+        for filename in [name for name in filenames if name in journaled] + [name for name in journaled if name not in filenames]:
+            editor = self._new_editor(filename)
+            with redirect_stdout(io.StringIO()):
+                try:
+                    count = self.journal.recover(filename, editor, lambda command: self.dispatch(command, editor))
+                except (CommandError, OSError):
+                    count = None
+            if count is None:
+                print(f"Journal for {filename} could not be replayed, the file is loaded from disk")
+                continue
+            self.editors[filename] = editor
+            recovered.append(filename)
+            if count or editor.document.is_modified():
+                print(f"Recovered {filename} from journal ({count} change(s) replayed)")
+        return recovered
+
+    def _restore_lazy(self, filenames):
+        # 已存在的文件只登记路径，第一次切换到或操作该文件时才解析
+        for filename in filenames:
+            editor = self._new_editor(filename)
+            if os.path.exists(filename):
+                editor.defer_read(filename)
+            else:
+                editor.init()
+            self.editors[filename] = editor
+            self.active_editor = filename
+            self._journal_start(filename)
+
+    def _restore_parallel(self, filenames):
+        # 在进程池中并行解析所有文件，把构建好的元素树传回主进程；个别文件失败时退回当前进程解析
+        existing = [filename for filename in filenames if os.path.exists(filename)]
+        futures = {}
+        if existing:
+            with process_pool(min(len(existing), os.cpu_count() or 1)) as pool:
+                futures = {filename: pool.submit(parse_html_file, filename, self.tree_cache, self.loader) for filename in existing}
+                for future in futures.values():
+                    future.exception()
+        for filename in filenames:
+            future = futures.get(filename)
+            if future is None:
+                self.load_editor(filename)
+                continue
+            editor = self._new_editor(filename)
+            if future.exception() is not None:
+                if not editor.read_html(filename):
+                    continue
+            elif future.result() is None:
+                print(f"Load html failed: {filename}")
+                continue
+            else:
+                editor.load_parsed(future.result())
+            self.editors[filename] = editor
+            self.active_editor = filename
+            self._journal_start(filename)
 
     def save_session_state(self):
         # 保存当前 session 的状态
         state = {
             "files": list(self.editors.keys()),
             "active_editor": self.active_editor,
-            "showid": self.showid
+            "showid": self.showid,
+            "spell": self.spell_service.to_dict()
         }
         with open("session_state.json", "w") as session_file:
             json.dump(state, session_file)
 
+    def _new_editor(self, filename):
+        editor = HTMLEditor()
+        editor.file_path = filename
+        editor.history = UndoHistory(**self.undo_options)
+        editor.spell_service = self.spell_service
+        editor.tree_cache = self.tree_cache
+        editor.loader = self.loader
+        editor.text_index = self.text_index
+        return editor
+
     def load_editor(self, filename):
         if filename in self.editors:
+            self.editors[filename].ensure_loaded()
             self.active_editor = filename
             print(f"Switched to editor for {filename}")
+            return True
+        editor = self._new_editor(filename)
+        if os.path.exists(filename):
+            # 解析失败的文件不登记编辑器，否则之后的命令会作用在空文档上
+            if not editor.read_html(filename):
+                return False
         else:
-            editor = HTMLEditor()
-            if os.path.exists(filename):
-                editor.read_html(filename)
-            else:
-                editor.init()
-            self.editors[filename] = editor
-            self.active_editor = filename
-            print(f"Loaded editor for {filename}")
+            editor.init()
+        self.editors[filename] = editor
+        self.active_editor = filename
+        self._journal_start(filename)
+        print(f"Loaded editor for {filename}")
+        return True
+
+    def _journal_start(self, filename):
+        # 新打开的文件从磁盘上的内容开始记日志，同名文件之前残留的日志作废
+        if self.journal is not None:
+            self.journal.forget(filename)
+            self.journal.start(filename)
+
+    def _journal_checkpoint(self, filename, force=False):
+        # 保存或提交事务后：文档与磁盘一致时日志从磁盘上的文件重新开始，不保留检查点；
+        # 否则写检查点，force 表示事务中的修改没有逐条记入日志，即使还没有日志也要写
+        if self.journal is None or filename not in self.editors:
+            return
+        if not self._is_modified(self.editors[filename]):
+            self._journal_start(filename)
+            return
+        if force and not self.journal.is_tracked(filename):
+            self.journal.start(filename)
+        self.journal.checkpoint(filename, self.editors[filename], force=force)
 
     def save_editor(self, filename):
-        if filename in self.editors:
-            self.editors[filename].save(filename)
-            self.modified_files.discard(filename)
-            print(f"Saved {filename}")
-        else:
+        if filename not in self.editors:
             print(f"No editor found for {filename}")
+            return False
+        # 事务中只写临时文件，提交时才替换
+        staged = self.transaction.staged if self.transaction is not None else None
+        if not self.editors[filename].save(filename, staged=staged):
+            return False
+        if staged is None:
+            self._journal_checkpoint(filename)
+        print(f"Saved {filename}")
+        return True
+
+    def save_all(self, max_workers=None):
+        # 只保存内容确实与磁盘不同的文件，多个文件在线程池中并发序列化和写入
+        dirty = [filename for filename, editor in self.editors.items() if self._is_modified(editor)]
+        if not dirty:
+            print("No modified files to save.")
+            return []
+        from concurrent.futures import ThreadPoolExecutor
+        workers = max_workers or min(len(dirty), (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            staged = self.transaction.staged if self.transaction is not None else None
+            results = list(pool.map(lambda filename: self.editors[filename].save(filename, staged=staged), dirty))
+        saved = [filename for filename, done in zip(dirty, results) if done]
+        if staged is None:
+            for filename in saved:
+                self._journal_checkpoint(filename)
+        print(f"Saved {len(saved)} of {len(dirty)} modified files.")
+        return saved
 
     def close_editor(self):
         if self.active_editor is None:
             print("No active editor to close.")
-            return
-        if self.active_editor in self.modified_files:
-            save_prompt = input(f"File '{self.active_editor}' has unsaved changes. Save before closing? (yes/no): ")
-            if save_prompt.lower() == "yes":
+            return False
+        if self._is_modified(self.editors[self.active_editor]):
+            if self.autosave is not None:
+                # 开启自动保存时直接保存，不再询问
                 self.save_editor(self.active_editor)
+            elif not self.interactive:
+                # 批处理模式不询问，未保存的修改直接丢弃，需要保留时应在 close 之前 save
+                print(f"Discarded unsaved changes in '{self.active_editor}'")
+            else:
+                save_prompt = input(f"File '{self.active_editor}' has unsaved changes. Save before closing? (yes/no): ")
+                if save_prompt.lower() == "yes":
+                    self.save_editor(self.active_editor)
         del self.editors[self.active_editor]
-        self.modified_files.discard(self.active_editor)
+        if self.autosave is not None:
+            self.autosave.cancel(self.active_editor)
+        # 事务中关闭的文件在提交时才删除日志，回滚后仍可恢复
+        if self.journal is not None and self.transaction is None:
+            self.journal.forget(self.active_editor)
         print(f"Closed editor for {self.active_editor}")
         # 选择新的活动编辑器
         if self.editors:
@@ -72,13 +383,16 @@ class SessionManager:
             print(f"Switched to editor for {self.active_editor}")
         else:
             self.active_editor = None
+        return True
 
     def edit_switch(self, filename):
-        if filename in self.editors:
-            self.active_editor = filename
-            print(f"Switched to editor for {filename}")
-        else:
+        if filename not in self.editors:
             print(f"No editor found for {filename}")
+            return False
+        self.editors[filename].ensure_loaded()
+        self.active_editor = filename
+        print(f"Switched to editor for {filename}")
+        return True
 
     def list_editors(self):
         if not self.editors:
@@ -86,7 +400,7 @@ class SessionManager:
             return
         for filename in self.editors:
             prefix = "> " if filename == self.active_editor else "  "
-            suffix = " *" if filename in self.modified_files else ""
+            suffix = " *" if self._is_modified(self.editors[filename]) else ""
             print(f"{prefix}{filename}{suffix}")
 
     def set_showid(self, value):
@@ -94,149 +408,641 @@ class SessionManager:
             self.showid[self.active_editor] = value
             self.editors[self.active_editor].showid = value  # 更新 HTMLEditor 中的 showid
             print(f"Set showid to {value} for {self.active_editor}")
+            return True
+        print("No active editor to set showid.")
+        return False
+
+    def set_spell_language(self, language, dictionary=None):
+        self.spell_service.configure(language, dictionary)
+        if dictionary:
+            print(f"Spell check will use dictionary {dictionary}")
         else:
-            print("No active editor to set showid.")
+            print(f"Spell check language set to {language}")
 
-    def dir_display(self, style="tree"):
-        FileManager.display_directory(style, self.editors.keys())   
+    def dir_display(self, style="tree", root=None, max_depth=None, show_all=False):
+        # 目录内容按 mtime 缓存，重复显示时只需检查各目录的 mtime
+        return FileManager.display_directory(style, self.editors.keys(), root=root, max_depth=max_depth,
+                                             show_all=show_all, cache=self.dir_cache)
 
     def run(self):
         print("\nWelcome to the HTML Command Line Editor!\n")
-        print("Available commands:")
-        print("  load <filename>         - Load or create a new editor for <filename>")
-        print("  save <filename>         - Save the specified file")
-        print("  close                   - Close the current editor")
-        print("  editor-list             - List all open editors")
-        print("  edit <filename>         - Switch to the specified editor")
-        print("  showid true/false       - Toggle showid for current editor")
-        print("  dir-tree                - Display directory in tree format")
-        print("  dir-indent              - Display directory in indent format")
-        print("  insert <tag> <id> <target_id> [content] - Insert new element before target")
-        print("  append <tag> <id> <parent_id> [content] - Append new element inside parent")
-        print("  edit-id <old_id> <new_id> - Edit the id of an element")
-        print("  edit-text <element_id> [new_content] - Edit text content of an element")
-        print("  delete <element_id>     - Delete an element")
-        print("  undo                    - Undo the last operation")
-        print("  redo                    - Redo the last undone operation")
-        print("  spell-check             - Perform spell check on the document")
-        print("  print-tree              - Display the HTML structure as a tree")
-        print("  print-indent [indent]   - Display HTML with indentation")
-        print("  help                    - Display this help message")
-        print("  exit                    - Exit the program\n")
-
+        print(HELP_TEXT)
         while True:
             command = input("\nhtml-editor> ").strip()
-            if command == "help":
-                print("\nAvailable commands:")
-                print("  load <filename>         - Load or create a new editor for <filename>")
-                print("  save <filename>         - Save the specified file")
-                print("  close                   - Close the current editor")
-                print("  editor-list             - List all open editors")
-                print("  edit <filename>         - Switch to the specified editor")
-                print("  showid true/false       - Toggle showid for current editor")
-                print("  dir-tree                - Display directory in tree format")
-                print("  dir-indent              - Display directory in indent format")
-                print("  insert <tag> <id> <target_id> [content] - Insert new element before target")
-                print("  append <tag> <id> <parent_id> [content] - Append new element inside parent")
-                print("  edit-id <old_id> <new_id> - Edit the id of an element")
-                print("  edit-text <element_id> [new_content] - Edit text content of an element")
-                print("  delete <element_id>     - Delete an element")
-                print("  undo                    - Undo the last operation")
-                print("  redo                    - Redo the last undone operation")
-                print("  spell-check             - Perform spell check on the document")
-                print("  print-tree              - Display the HTML structure as a tree")
-                print("  print-indent [indent]   - Display HTML with indentation")
-                print("  exit                    - Exit the program\n")
-            elif command.startswith("load"):
-                _, filename = command.split(maxsplit=1)
-                self.load_editor(filename)
-            elif command.startswith("save"):
-                _, filename = command.split(maxsplit=1)
-                self.save_editor(filename)
-            elif command == "close":
-                self.close_editor()
-            elif command == "editor-list":
-                self.list_editors()
-            elif command.startswith("edit"):
-                _, filename = command.split(maxsplit=1)
-                self.edit_switch(filename)
-            elif command == "showid true":
-                self.set_showid(True)
-            elif command == "showid false":
-                self.set_showid(False)
-            elif command == "dir-tree":
-                self.dir_display(style="tree")
-            elif command == "dir-indent":
-                self.dir_display(style="indent")
-            elif command == "exit":
+            if command == "exit":
+                if self.transaction is not None:
+                    self.execute("rollback")
+                self.stop_autosave(wait=True)
                 self.save_session_state()
+                self.close_journal()
+                self.write_metrics()
                 print("Session saved. Exiting...")
                 break
+            self.execute(command)
+
+    # 执行一条命令，返回是否成功；editor 为 None 时作用于活动编辑器
+    def execute(self, command, editor=None):
+        try:
+            return self.dispatch(command, editor)
+        except CommandError as e:
+            print(e)
+            return False
+
+    # 按命令表分发，用法错误或没有活动编辑器时抛出 CommandError；开启统计时记录每条命令的耗时和内存变化
+    def dispatch(self, command, editor=None):
+        metrics = self.metrics
+        if metrics is None:
+            return self._dispatch(command, editor)
+        with metrics.command(command.strip()) as record:
+            done = self._dispatch(command, editor)
+            record.ok = done is not False
+            return done
+
+    def _dispatch(self, command, editor=None):
+        name, _, args = command.strip().partition(" ")
+        spec = self.COMMANDS.get(name)
+        if spec is None:
+            raise CommandError("Unknown command. Please try again.")
+        if spec.needs_editor and editor is None:
+            if self.active_editor is None:
+                raise CommandError("No active editor. Please load or edit a file first.")
+            editor = self.editors[self.active_editor]
+        with self._locks(editor if spec.needs_editor else None) if name not in self.READ_ONLY else nullcontext():
+            done = getattr(self, spec.handler)(args, editor)
+            if done and spec.history:
+                self._record(spec.history, editor, command.strip())
+        return done
+
+    # 把统计写入 metrics_file（未开启统计或未指定文件时什么也不做）
+    def write_metrics(self):
+        if self.metrics is None or self.metrics_file is None:
+            return
+        try:
+            self.metrics.dump(self.metrics_file)
+        except OSError as e:
+            print(f"Failed to write metrics to {self.metrics_file}: {e}")
+
+    def _record(self, history, editor, command):
+        # 成功执行的修改：事务中登记到事务，否则写入日志（command 为重放时对这个编辑器执行的命令）；开启自动保存时通知后台线程
+        filename = self._filename_of(editor)
+        if self.transaction is not None:
+            self.transaction.record(history, editor)
+        elif self.journal is not None:
+            self.journal.record(filename, editor, command)
+        if self.autosave is not None and filename is not None:
+            self.autosave.notify(filename)
+
+    def _locks(self, editor):
+        # 命令执行期间持有的锁：编辑命令持有它作用的编辑器的锁，会话级命令（打开、关闭、保存、事务等）持有全部编辑器的锁
+        stack = ExitStack()
+        for item in [editor] if editor is not None else list(self.editors.values()):
+            stack.enter_context(item.lock)
+        return stack
+
+    def _filename_of(self, editor):
+        if self.active_editor is not None and self.editors.get(self.active_editor) is editor:
+            return self.active_editor
+        return next((filename for filename, item in self.editors.items() if item is editor), None)
+
+    def start_autosave(self, delay):
+        self.stop_autosave()
+        self.autosave = AutosaveWorker(self, delay=delay)
+
+    # 停止自动保存，还在等待的文件立即保存；wait 为 True 时等后台线程结束（不能在执行命令期间）
+    def stop_autosave(self, wait=False):
+        if self.autosave is None:
+            return
+        worker, self.autosave = self.autosave, None
+        for filename in worker.stop(wait=wait):
+            if filename in self.editors and self._is_modified(self.editors[filename]):
+                self.save_editor(filename)
+
+    # 自动保存替换了文件之后调用（在后台线程中，持有该编辑器的锁），日志从保存后的状态重新开始
+    def on_autosaved(self, filename):
+        self._journal_checkpoint(filename)
+
+    # 退出时为有未保存修改的文件写检查点，下次启动直接载入，不必重新解析和重放；与磁盘一致的文件删除日志，下次从磁盘读取
+    def close_journal(self):
+        if self.journal is None:
+            return
+        for filename, editor in self.editors.items():
+            if self._is_modified(editor):
+                self.journal.checkpoint(filename, editor)
             else:
-                if self.active_editor is None:
-                    print("No active editor. Please load or edit a file first.")
+                self.journal.forget(filename)
+        self.journal.close()
+
+    # 提交事务：事务中的修改没有逐条记日志，提交后为涉及的文件写检查点；事务中关闭的文件此时删除日志
+    # 保存的文件写入失败时修改仍然提交、日志照常更新，之后抛出 OSError（说明哪些文件已经写入）
+    def _commit_transaction(self, transaction):
+        try:
+            return transaction.commit()
+        finally:
+            if self.journal is not None:
+                touched = {editor for _, editor, _ in transaction.steps}
+                saved = {file_path for _, file_path in transaction.staged}
+                for filename, editor in self.editors.items():
+                    if editor in touched or filename in saved:
+                        self._journal_checkpoint(filename, force=editor in touched)
+                for filename in transaction.editors:
+                    if filename not in self.editors:
+                        self.journal.forget(filename)
+
+    # 批处理：逐行执行命令，空行和 # 开头的行跳过，遇到 exit 结束；
+    # 命令本身的提示信息不输出，失败的命令以“来源:行号: 命令: 原因”报告到 stderr，返回 [(行号, 命令, 原因)]
+    # transactional 为 True 时全部命令成功才生效：第一条失败的命令之后不再执行，之前的修改全部回滚，保存的文件也不会写入
+    def run_batch(self, lines, transactional=False, source="<batch>", verbose=False, errors_to=None):
+        errors_to = errors_to if errors_to is not None else sys.stderr
+        errors = []
+        interactive = self.interactive
+        self.interactive = False
+        own = None
+        if transactional:
+            if self.transaction is not None:
+                raise CommandError("A transaction is already in progress.")
+            own = self.transaction = Transaction(self)
+        lineno = 0
+        try:
+            for lineno, line in enumerate(lines, 1):
+                command = line.strip()
+                if not command or command.startswith("#"):
                     continue
-                
-                editor = self.editors[self.active_editor]
-                if command.startswith("insert"):
-                    commands = command.split(" ")
-                    if len(commands) < 4:
-                        print("Usage: insert <tag> <id> <target_id> [content]")
-                        continue
-                    tag, id, target_id = commands[1:4]
-                    content = "" if len(commands) == 4 else " ".join(commands[4:])
-                    editor.insert_before(target_id=target_id, new_element_id=id, new_element_tag=tag, new_element_content=content)
-                    self.modified_files.add(self.active_editor)  # 标记文件已修改
-                elif command.startswith("append"):
-                    commands = command.split(" ")
-                    if len(commands) < 4:
-                        print("Usage: append <tag> <id> <parent_id> [content]")
-                        continue
-                    tag, id, parent_id = commands[1:4]
-                    content = "" if len(commands) == 4 else " ".join(commands[4:])
-                    editor.add_into(parent_id=parent_id, new_element_id=id, new_element_tag=tag, new_element_content=content)
-                    self.modified_files.add(self.active_editor)  # 标记文件已修改
-                elif command.startswith("edit-id"):
-                    commands = command.split(" ")
-                    if len(commands) != 3:
-                        print("Usage: edit-id <old_id> <new_id>")
-                        continue
-                    target_id, new_id = commands[1:]
-                    editor.edit_element_id(target_id=target_id, new_id=new_id)
-                    self.modified_files.add(self.active_editor)  # 标记文件已修改
-                elif command.startswith("edit-text"):
-                    commands = command.split(" ")
-                    if len(commands) < 2:
-                        print("Usage: edit-text <element_id> [new_content]")
-                        continue
-                    target_id = commands[1]
-                    new_content = "" if len(commands) == 2 else " ".join(commands[2:])
-                    editor.edit_element_content(target_id=target_id, new_content=new_content)
-                    self.modified_files.add(self.active_editor)  # 标记文件已修改
-                elif command.startswith("delete"):
-                    commands = command.split(" ")
-                    if len(commands) != 2:
-                        print("Usage: delete <element_id>")
-                        continue
-                    target_id = commands[1]
-                    editor.delete_element(target_id=target_id)
-                    self.modified_files.add(self.active_editor)  # 标记文件已修改
-                elif command == "undo":
-                    editor.undo()
-                    self.modified_files.add(self.active_editor)  # 标记文件已修改
-                elif command == "redo":
-                    editor.redo()
-                    self.modified_files.add(self.active_editor)  # 标记文件已修改
-                elif command == "spell-check":
-                    editor.check_spelling()
-                elif command == "print-tree":
-                    editor.print_tree()
-                elif command.startswith("print-indent"):
-                    commands = command.split(" ")
-                    indent = 2 if len(commands) == 1 else int(commands[1])
-                    editor.print_indent(indent=indent)
-                else:
-                    print("Unknown command. Please try again.")
+                if command == "exit":
+                    break
+                error = self._run_batch_command(command, verbose)
+                if error is None:
+                    continue
+                errors.append((lineno, command, error))
+                print(f"{source}:{lineno}: {command}: {error}", file=errors_to)
+                if transactional:
+                    break
+        finally:
+            self.interactive = interactive
+        # 脚本中 begin 之后没有 commit 的事务视为失败，回滚
+        if self.transaction is not None and self.transaction is not own:
+            undone = self.transaction.rollback()
+            self.transaction = None
+            errors.append((lineno, "begin", "transaction was not committed"))
+            print(f"{source}: transaction was not committed, rolled back {undone} change(s)", file=errors_to)
+        if own is not None:
+            self.transaction = None
+            if errors:
+                undone = own.rollback()
+                print(f"{source}: rolled back {undone} change(s), no files were written", file=errors_to)
+            else:
+                try:
+                    self._commit_transaction(own)
+                except OSError as e:
+                    errors.append((lineno, "commit", str(e)))
+                    print(f"{source}: {e}", file=errors_to)
+        return errors
+
+    # 执行批处理中的一条命令，成功返回 None，失败返回原因（命令输出的最后一行或异常信息）
+    # 需要显示输出的命令照常输出，同时留下输出的末尾作为失败的原因
+    def _run_batch_command(self, command, verbose):
+        spec = self.COMMANDS.get(command.partition(" ")[0])
+        shown = verbose or (spec is not None and spec.prints)
+        output = _OutputTail(sys.stdout) if shown else io.StringIO()
+        try:
+            with redirect_stdout(output):
+                done = self.dispatch(command)
+        except Exception as e:
+            return str(e)
+        if done is not False:
+            return None
+        lines = output.getvalue().strip().splitlines()
+        return lines[-1] if lines else "command failed"
+
+    # 逐行读取命令文件（"-" 表示标准输入）执行批处理
+    def run_script(self, path, transactional=False, verbose=False):
+        if path == "-":
+            return self.run_batch(sys.stdin, transactional=transactional, source="<stdin>", verbose=verbose)
+        with open(path, "r", encoding="utf-8") as script:
+            return self.run_batch(script, transactional=transactional, source=path, verbose=verbose)
+
+    @staticmethod
+    def _split(args, count, usage, at_least=False):
+        # 按单个空格切分参数（与原来的 command.split(" ") 一致），个数不对时报告用法
+        parts = args.split(" ") if args else []
+        if len(parts) < count or (not at_least and len(parts) > count):
+            raise CommandError(usage)
+        return parts
+
+    def _cmd_help(self, args, editor):
+        print(HELP_TEXT)
+        return True
+
+    def _cmd_load(self, args, editor):
+        if not args.strip():
+            raise CommandError("Usage: load <filename>")
+        return self.load_editor(args.strip())
+
+    def _cmd_save(self, args, editor):
+        if not args.strip():
+            raise CommandError("Usage: save <filename>")
+        return self.save_editor(args.strip())
+
+    def _cmd_save_all(self, args, editor):
+        dirty = self.modified_files
+        return len(self.save_all()) == len(dirty)
+
+    def _cmd_close(self, args, editor):
+        return self.close_editor()
+
+    def _cmd_editor_list(self, args, editor):
+        self.list_editors()
+        return True
+
+    def _cmd_edit(self, args, editor):
+        if not args.strip():
+            raise CommandError("Usage: edit <filename>")
+        return self.edit_switch(args.strip())
+
+    def _cmd_showid(self, args, editor):
+        if args not in ("true", "false"):
+            raise CommandError("Usage: showid true/false")
+        return self.set_showid(args == "true")
+
+    def _cmd_spell_lang(self, args, editor):
+        parts = self._split(args, 1, "Usage: spell-lang <lang> [dictionary]", at_least=True)
+        if len(parts) > 2:
+            raise CommandError("Usage: spell-lang <lang> [dictionary]")
+        self.set_spell_language(parts[0], parts[1] if len(parts) == 2 else None)
+        return True
+
+    def _cmd_dir_tree(self, args, editor):
+        return self.dir_display("tree", *self._dir_args(args, "dir-tree"))
+
+    def _cmd_dir_indent(self, args, editor):
+        return self.dir_display("indent", *self._dir_args(args, "dir-indent"))
+
+    def _dir_args(self, args, name):
+        # 解析 [-a] [-d depth] [path]，返回 (path, max_depth, show_all)
+        usage = f"Usage: {name} [-a] [-d depth] [path]"
+        root, max_depth, show_all = None, None, False
+        parts = args.split()
+        while parts:
+            part = parts.pop(0)
+            if part == "-a":
+                show_all = True
+            elif part == "-d":
+                if not parts or not parts[0].isdigit():
+                    raise CommandError(usage)
+                max_depth = int(parts.pop(0))
+            elif root is None and not part.startswith("-"):
+                root = part
+            else:
+                raise CommandError(usage)
+        return root, max_depth, show_all
+
+    def _cmd_insert(self, args, editor):
+        parts = self._split(args, 3, "Usage: insert <tag> <id> <target_id> [content]", at_least=True)
+        tag, id, target_id = parts[:3]
+        content = " ".join(parts[3:])
+        return editor.insert_before(target_id=target_id, new_element_id=id, new_element_tag=tag, new_element_content=content)
+
+    def _cmd_append(self, args, editor):
+        parts = self._split(args, 3, "Usage: append <tag> <id> <parent_id> [content]", at_least=True)
+        tag, id, parent_id = parts[:3]
+        content = " ".join(parts[3:])
+        return editor.add_into(parent_id=parent_id, new_element_id=id, new_element_tag=tag, new_element_content=content)
+
+    def _cmd_edit_id(self, args, editor):
+        target_id, new_id = self._split(args, 2, "Usage: edit-id <old_id> <new_id>")
+        return editor.edit_element_id(target_id=target_id, new_id=new_id)
+
+    def _cmd_edit_text(self, args, editor):
+        parts = self._split(args, 1, "Usage: edit-text <element_id> [new_content]", at_least=True)
+        return editor.edit_element_content(target_id=parts[0], new_content=" ".join(parts[1:]))
+
+    def _cmd_delete(self, args, editor):
+        target_id, = self._split(args, 1, "Usage: delete <element_id>")
+        return editor.delete_element(target_id=target_id)
+
+    def _cmd_apply(self, args, editor):
+        # 每个操作与对应的编辑命令写法相同，用分号隔开；整批先校验再执行（见 BatchCommand），出错时文档不变
+        if not args.strip():
+            raise CommandError("Usage: apply <op>; <op>; ...")
+        ops = []
+        for op in args.split(";"):
+            parts = op.strip().split(" ")
+            if parts[0] in ("insert", "append") and len(parts) > 4:
+                parts[4:] = [" ".join(parts[4:])]
+            elif parts[0] == "edit-text" and len(parts) > 2:
+                parts[2:] = [" ".join(parts[2:])]
+            ops.append(tuple(parts))
+        return editor.apply_batch(ops)
+
+    def _cmd_undo(self, args, editor):
+        return editor.undo()
+
+    def _cmd_redo(self, args, editor):
+        return editor.redo()
+
+    def _cmd_undo_stats(self, args, editor):
+        editor.print_undo_stats()
+        return True
+
+    def _cmd_spell_check(self, args, editor):
+        editor.check_spelling()
+        return True
+
+    def search(self, regex, directory=None, editor=None):
+        # 查找文本与 regex 匹配的元素，返回 [(文件名, 编辑器, 匹配)]：已载入的文档在内存中查找（按单词倒排索引缩小范围），
+        # 匹配为元素列表；尚未解析的文件（延迟加载或未打开）在进程池中解析并查找，匹配为 (id, 文本) 列表，编辑器可能为 None
+        # 范围：指定了 editor（重放日志时）只查它，指定了 directory 为其中所有的 html 文件，否则为所有打开的文件
+        if editor is not None:
+            targets = [(self._filename_of(editor), editor)]
+        elif directory is not None:
+            if not os.path.isdir(directory):
+                raise CommandError(f"Not a directory: {directory}")
+            opened = {os.path.abspath(filename): filename for filename in self.editors}
+            targets = []
+            for path in html_files(directory, self.dir_cache):
+                filename = opened.get(path, os.path.relpath(path))
+                targets.append((filename, self.editors.get(filename)))
+        else:
+            targets = list(self.editors.items())
+        on_disk = [filename for filename, item in targets if (item is None or not item.is_loaded()) and os.path.exists(filename)]
+        scanned = scan_files(on_disk, regex.pattern, regex.flags, self.tree_cache, self.loader)
+        results = []
+        for filename, item in targets:
+            if item is not None and item.is_loaded():
+                matches = find_in_document(item.document, regex) if item.document is not None else []
+            else:
+                matches = scanned.get(filename, [])
+                if isinstance(matches, Exception):
+                    print(f"Failed to read {filename}: {matches}")
+                    continue
+            if matches:
+                results.append((filename, item, matches))
+        return results
+
+    def _search_args(self, args, count, usage):
+        # 解析 [-i] [--dir <path>] 和 count 个参数（可以用引号括起含空格的参数），返回 (编译好的模式, 目录, 其余参数)
+        try:
+            parts = shlex.split(args)
+        except ValueError:
+            raise CommandError(usage)
+        flags, directory, rest = 0, None, []
+        while parts:
+            part = parts.pop(0)
+            if part == "-i" and not rest:
+                flags |= re.IGNORECASE
+            elif part == "--dir" and not rest and parts:
+                directory = parts.pop(0)
+            else:
+                rest.append(part)
+        if len(rest) != count or not rest[0]:
+            raise CommandError(usage)
+        try:
+            regex = re.compile(rest[0], flags)
+        except re.error as e:
+            raise CommandError(f"Invalid pattern: {e}")
+        return regex, directory, rest[1:]
+
+    def _cmd_find(self, args, editor):
+        regex, directory, _ = self._search_args(args, 1, "Usage: find [-i] [--dir <path>] <pattern>")
+        results = self.search(regex, directory, editor)
+        lines = []
+        for filename, _, matches in results:
+            for match in matches:
+                element_id, content = match if isinstance(match, tuple) else (match.id, match.content)
+                lines.append(f"{filename} #{element_id}: {content}")
+        count = len(lines)
+        lines.append(f"{count} match(es) in {len(results)} file(s)" if results else "No matches found.")
+        print("\n".join(lines))
+        return True
+
+    def _cmd_replace(self, args, editor):
+        usage = "Usage: replace [-i] [--dir <path>] <pattern> <replacement>"
+        regex, directory, (replacement,) = self._search_args(args, 2, usage)
+        results = self.search(regex, directory, editor)
+        # 先对全部匹配计算替换结果，替换模板有误时不打开、不修改任何文件
+        for _, _, matches in results:
+            for match in matches:
+                try:
+                    regex.sub(replacement, match[1] if isinstance(match, tuple) else match.content)
+                except (re.error, IndexError) as e:
+                    raise CommandError(f"Invalid replacement: {e}")
+        active = self.active_editor
+        changed = []
+        for filename, item, matches in results:
+            if item is None:
+                # 目录中未打开的文件：打开后在编辑器中替换，之后可以撤销，需要保存才写入文件
+                if not self.load_editor(filename):
+                    continue
+                item = self.editors[filename]
+            if isinstance(matches[0], tuple):
+                item.ensure_loaded()
+                matches = find_in_document(item.document, regex)
+            targets, contents = [], []
+            for element in matches:
+                content = regex.sub(replacement, element.content)
+                if content != element.content:
+                    targets.append(element)
+                    contents.append(content)
+            if targets and item.replace_contents(targets, contents):
+                changed.append((filename, len(targets)))
+                flag = ["-i"] if regex.flags & re.IGNORECASE else []
+                self._record("do", item, shlex.join(["replace"] + flag + [regex.pattern, replacement]))
+        if active is not None and active in self.editors:
+            self.active_editor = active
+        if not changed:
+            print("No matches found.")
+            return False
+        for filename, count in changed:
+            print(f"Replaced text in {count} element(s) of {filename}")
+        return True
+
+    def _cmd_lookup(self, args, editor):
+        # lookup <word> 列出文本中含有该单词的元素，lookup <prefix>* 列出含有以 prefix 开头的单词的元素（不区分大小写）
+        parts = args.split()
+        is_prefix = len(parts) == 1 and parts[0].endswith("*")
+        word = parts[0][:-1] if is_prefix else parts[0] if len(parts) == 1 else ""
+        if not word or tokenize(word) != [word.lower()]:
+            raise CommandError("Usage: lookup <word>|<prefix>*")
+        document = editor.document
+        index = word_index(document)
+        elements = index.prefix(word) if is_prefix else index.exact(word)
+        lines = [f"{element.tag}{'#' + element.id if element.id else ''}: {element.content}"
+                 for element in index.ordered(elements, document.html)]
+        lines.append(f"{len(lines)} element(s)" if lines else "No matches found.")
+        print("\n".join(lines))
+        return True
+
+    def _cmd_words(self, args, editor):
+        parts = args.split()
+        if len(parts) > 1 or (parts and tokenize(parts[0]) != [parts[0].lower()]):
+            raise CommandError("Usage: words [prefix]")
+        index = word_index(editor.document)
+        words = index.words(parts[0] if parts else "")
+        lines = [f"{word} {index.count(word)}" for word in words]
+        lines.append(f"{len(words)} word(s)")
+        print("\n".join(lines))
+        return True
+
+    def _cmd_print_tree(self, args, editor):
+        root, max_depth, limit, pager, _ = self._print_args(args, "print-tree [-d depth] [-n lines] [-p] [id]")
+        return editor.print_tree(root=root, max_depth=max_depth, limit=limit, pager=pager)
+
+    def _cmd_begin(self, args, editor):
+        if self.transaction is not None:
+            raise CommandError("A transaction is already in progress.")
+        self.transaction = Transaction(self)
+        print("Transaction started. Use commit to apply or rollback to discard the changes.")
+        return True
+
+    def _cmd_commit(self, args, editor):
+        if self.transaction is None:
+            raise CommandError("No transaction in progress.")
+        transaction, self.transaction = self.transaction, None
+        try:
+            count = self._commit_transaction(transaction)
+        except OSError as e:
+            print(e)
+            return False
+        print(f"Committed {count} change(s).")
+        return True
+
+    def _cmd_rollback(self, args, editor):
+        if self.transaction is None:
+            raise CommandError("No transaction in progress.")
+        transaction, self.transaction = self.transaction, None
+        print(f"Rolled back {transaction.rollback()} change(s).")
+        return True
+
+    def _cmd_autosave(self, args, editor):
+        parts = args.split()
+        if parts and parts[0] == "off" and len(parts) == 1:
+            self.stop_autosave()
+            print("Autosave is off.")
+            return True
+        if parts and parts[0] == "on" and len(parts) <= 2:
+            try:
+                delay = float(parts[1]) if len(parts) == 2 else DEFAULT_DELAY
+            except ValueError:
+                raise CommandError("Usage: autosave [on [seconds]|off]")
+            if delay < 0:
+                raise CommandError("Usage: autosave [on [seconds]|off]")
+            self.start_autosave(delay)
+            print(f"Autosave is on: modified files are saved after {delay:g} s without edits.")
+            return True
+        if parts:
+            raise CommandError("Usage: autosave [on [seconds]|off]")
+        if self.autosave is None:
+            print("Autosave is off.")
+            return True
+        worker = self.autosave
+        print(f"Autosave is on ({worker.delay:g} s): {worker.saves} save(s), waiting: {', '.join(worker.pending()) or 'none'}")
+        for filename, error in sorted(worker.errors.items()):
+            print(f"  failed to save {filename}: {error}")
+        return True
+
+    def _cmd_stats(self, args, editor):
+        usage = "Usage: stats [on [memory]|off|reset|last [n]|dump <file>]"
+        parts = args.split()
+        action = parts[0] if parts else ""
+        if action == "on" and parts[1:] in ([], ["memory"]):
+            trace_memory = len(parts) == 2
+            if self.metrics is None or self.metrics.trace_memory != trace_memory:
+                if self.metrics is not None:
+                    self.metrics.stop()
+                self.metrics = Metrics(trace_memory=trace_memory)
+                self.metrics.start()
+            print(f"Metrics are on{' (tracing memory allocations)' if trace_memory else ''}.")
+            return True
+        if action == "off" and len(parts) == 1:
+            if self.metrics is not None:
+                self.metrics.stop()
+                self.metrics = None
+            print("Metrics are off.")
+            return True
+        valid = (not parts or (action == "reset" and len(parts) == 1) or (action == "dump" and len(parts) == 2)
+                 or (action == "last" and (len(parts) == 1 or (len(parts) == 2 and parts[1].isdigit()))))
+        if not valid:
+            raise CommandError(usage)
+        if self.metrics is None:
+            print("Metrics are off. Use 'stats on [memory]' to start collecting.")
+            return not parts
+        if action == "reset":
+            self.metrics.reset()
+            print("Metrics reset.")
+        elif action == "last":
+            print(self.metrics.report_recent(int(parts[1]) if len(parts) == 2 else 10))
+        elif action == "dump":
+            try:
+                self.metrics.dump(parts[1])
+            except OSError as e:
+                print(f"Failed to write metrics: {e}")
+                return False
+            print(f"Metrics written to {parts[1]}")
+        else:
+            print(self.metrics.report())
+        return True
+
+    def _cmd_profile(self, args, editor):
+        # 在 cProfile 下执行一条命令，之后按 tottime（函数自身的耗时）或 cumulative（含调用的函数）列出前 count 个函数
+        usage = "Usage: profile [-n count] [-s tottime|cumulative] <command>"
+        count, sort, rest = 15, "tottime", args.strip()
+        while rest.startswith("-"):
+            option, _, rest = rest.partition(" ")
+            value, _, rest = rest.lstrip().partition(" ")
+            if option == "-n" and value.isdigit() and int(value) > 0:
+                count = int(value)
+            elif option == "-s" and value in ("tottime", "cumulative"):
+                sort = value
+            else:
+                raise CommandError(usage)
+        rest = rest.strip()
+        if not rest:
+            raise CommandError(usage)
+        if rest.partition(" ")[0] == "profile":
+            raise CommandError("profile cannot be nested.")
+        # cProfile 和 pstats 只在用到时导入
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            done = self.execute(rest)
+        finally:
+            profiler.disable()
+        print(f"\nProfile of '{rest}' (top {count} by {sort}):")
+        pstats.Stats(profiler, stream=sys.stdout).strip_dirs().sort_stats(sort).print_stats(count)
+        return done
+
+    def _cmd_print_indent(self, args, editor):
+        usage = "print-indent [-d depth] [-n lines] [-p] [indent] [id]"
+        root, max_depth, limit, pager, indent = self._print_args(args, usage, indent=True)
+        return editor.print_indent(indent=indent, root=root, max_depth=max_depth, limit=limit, pager=pager)
+
+    def _print_args(self, args, usage, indent=False):
+        # 解析 [-d depth] [-n lines] [-p] 和位置参数，返回 (root, max_depth, limit, pager, indent)；
+        # print-indent 的位置参数为 [indent] [id]，只有一个且全是数字时为缩进（与原来的 print-indent 4 一致）
+        usage = f"Usage: {usage}"
+        options = {"-d": None, "-n": None}
+        pager = False
+        positional = []
+        parts = args.split()
+        while parts:
+            part = parts.pop(0)
+            if part in options:
+                if not parts or not parts[0].isdigit():
+                    raise CommandError(usage)
+                options[part] = int(parts.pop(0))
+            elif part == "-p":
+                pager = True
+            elif part.startswith("-"):
+                raise CommandError(usage)
+            else:
+                positional.append(part)
+        width = 2
+        if indent and positional and positional[0].isdigit() and len(positional) <= 2:
+            width = int(positional.pop(0))
+        if len(positional) > 1:
+            raise CommandError(usage)
+        return (positional[0] if positional else None), options["-d"], options["-n"], pager, width
 
 if __name__ == "__main__":
     session = SessionManager()
@@ -0,0 +1,163 @@
+import re
+import threading
+from collections import OrderedDict
+from . import metrics
+
+
+#单词：由字母组成，允许中间带撇号（如don't），数字和标点不参与拼写检查
+_WORD_PATTERN = re.compile(r"[^\W\d_]+(?:'[^\W\d_]+)*")
+
+
+#按标点切分文本，返回小写单词列表
+def tokenize(text) -> list:
+    return [word.lower() for word in _WORD_PATTERN.findall(text)]
+
+
+#有容量上限的LRU缓存，多线程安全
+class LRUCache:
+
+    def __init__(self, maxsize=4096) -> None:
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+#拼写检查服务，保存语言/词典配置；真正的SpellChecker在进程内按配置共享，
+#第一次拼写检查时才加载词典，文档本身不再持有SpellChecker
+#Service层
+class SpellService:
+
+    #(language, local_dictionary) -> SpellChecker，整个进程共享
+    _checkers = {}
+    _lock = threading.Lock()
+
+    def __init__(self, language="en", local_dictionary=None, cache_size=4096) -> None:
+        self.language = language
+        self.local_dictionary = local_dictionary
+        #拼写建议缓存，键包含语言配置，切换语言后不会取到旧结果
+        self.suggestions = LRUCache(cache_size)
+
+    #修改语言或自定义词典路径，对之后的拼写检查生效
+    def configure(self, language="en", local_dictionary=None) -> None:
+        self.language = language
+        self.local_dictionary = local_dictionary
+
+    #当前配置对应的键，同一个键共享同一个SpellChecker
+    def key(self):
+        return (self.language, self.local_dictionary)
+
+    #获取共享的SpellChecker，首次使用时加载
+    def get_checker(self):
+        key = self.key()
+        checker = SpellService._checkers.get(key)
+        if checker is None:
+            with SpellService._lock:
+                checker = SpellService._checkers.get(key)
+                if checker is None:
+                    with metrics.phase("spell.load_dictionary"):
+                        from spellchecker import SpellChecker
+                        if self.local_dictionary:
+                            checker = SpellChecker(language=None, local_dictionary=self.local_dictionary)
+                        else:
+                            checker = SpellChecker(language=self.language)
+                    SpellService._checkers[key] = checker
+        return checker
+
+    #检查一组元素的拼写，返回 {单词: (建议列表, 出现位置的元素id列表)}
+    def check_elements(self, elements) -> dict:
+        return self.report(self.find_unknown(elements).items())
+
+    #找出每个元素中不认识的单词：先汇总这些元素中不重复的单词，批量判断一次，
+    #返回 {元素: 排好序的不认识单词列表}，没有错误的元素不出现在结果中
+    #开启统计时切分单词计入spell.tokenize阶段，查词典计入spell.unknown阶段
+    def find_unknown(self, elements) -> dict:
+        words_by_element = {}
+        vocabulary = set()
+        with metrics.phase("spell.tokenize"):
+            for element in elements:
+                if not element.content:
+                    continue
+                words = set(tokenize(element.content))
+                if words:
+                    words_by_element[element] = words
+                    vocabulary.update(words)
+        if not vocabulary:
+            return {}
+        checker = self.get_checker()
+        with metrics.phase("spell.unknown"):
+            unknown = checker.unknown(vocabulary)
+        result = {}
+        for element, words in words_by_element.items():
+            misspelled = words & unknown
+            if misspelled:
+                result[element] = sorted(misspelled)
+        return result
+
+    #汇总各元素的错误单词生成报告，每个拼错的单词只计算一次候选词（开启统计时计入spell.candidates阶段）
+    #element_words按文档顺序给出，每个单词出现的元素id按这个顺序列出
+    def report(self, element_words) -> dict:
+        with metrics.phase("spell.candidates"):
+            return self._report(element_words)
+
+    def _report(self, element_words) -> dict:
+        locations = {}
+        for element, words in element_words:
+            for word in words:
+                ids = locations.get(word)
+                if ids is None:
+                    locations[word] = [element.id]
+                else:
+                    ids.append(element.id)
+        errors = {}
+        for word in sorted(locations):
+            suggestions = self.suggest(word)
+            if suggestions is None:
+                continue
+            errors[word] = (suggestions, locations[word])
+        return errors
+
+    #单词的拼写建议，结果缓存；没有候选词时返回None
+    def suggest(self, word):
+        key = (self.key(), word)
+        cached = self.suggestions.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        candidates = self.get_checker().candidates(word)
+        suggestions = sorted(candidates) if candidates is not None else None
+        self.suggestions.put(key, suggestions)
+        return suggestions
+
+    #服务是共享的，复制编辑器时不复制服务，更不会复制词典
+    def __deepcopy__(self, memo):
+        return self
+
+    def to_dict(self) -> dict:
+        return {"language": self.language, "dictionary": self.local_dictionary}
+
+    @staticmethod
+    def from_dict(state):
+        return SpellService(state.get("language", "en"), state.get("dictionary"))
+
+
+_MISSING = object()
+
+
+#未归属任何会话的编辑器使用的默认服务
+default_spell_service = SpellService()
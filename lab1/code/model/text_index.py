@@ -0,0 +1,154 @@
+import re
+from bisect import bisect_left, insort
+from .traversal import preorder, tree_path
+
+#索引中的单词：连续的字母、数字和下划线（与正则的\w相同），统一转为小写
+_TOKEN_PATTERN = re.compile(r"\w+")
+#一次新增或删除的单词超过这么多个时整体重排单词表，否则逐个二分插入/删除
+_BULK_WORDS = 64
+#还没有先序位置表时，结果不超过这么多个元素就按各自在树中的路径排序，否则先生成位置表
+_PATH_SORT_LIMIT = 16
+
+
+def tokenize(text) -> list:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+#文档的单词倒排索引：单词 -> 文本中含有该单词的元素，随文档的修改增量维护（见HTMLDocument）
+#单词表按字典序排列，前缀查找用二分定位
+#Service层
+class TextIndex:
+
+    def __init__(self, root=None) -> None:
+        #单词 -> {元素: None}，用字典作为保持插入顺序的集合
+        self.postings = {}
+        self.vocabulary = []
+        #已登记的元素个数（含没有文本的元素）
+        self.size = 0
+        #元素 -> 先序位置，按文档顺序排列结果时生成，树的结构改变后作废
+        self._order = None
+        if root is not None:
+            self.add_subtree(root)
+
+    #登记子树中的所有元素
+    def add_subtree(self, root) -> None:
+        self._order = None
+        new_words = []
+        for element in preorder(root):
+            self.size += 1
+            if element.content:
+                new_words.extend(self._add(element, set(tokenize(element.content))))
+        self._add_words(new_words)
+
+    #移除子树中的所有元素，元素的文本必须与登记时相同
+    def remove_subtree(self, root) -> None:
+        self._order = None
+        gone = []
+        for element in preorder(root):
+            self.size -= 1
+            if element.content:
+                gone.extend(self._discard(element, set(tokenize(element.content))))
+        self._remove_words(gone)
+
+    #元素的文本由old_content改为new_content
+    def update(self, element, old_content, new_content) -> None:
+        old = set(tokenize(old_content)) if old_content else set()
+        new = set(tokenize(new_content)) if new_content else set()
+        self._remove_words(list(self._discard(element, old - new)))
+        self._add_words(list(self._add(element, new - old)))
+
+    #文本中含有单词word的元素
+    def exact(self, word) -> set:
+        return set(self.postings.get(word.lower(), ()))
+
+    #以prefix开头的单词（按字典序）
+    def words(self, prefix="") -> list:
+        prefix = prefix.lower()
+        vocabulary = self.vocabulary
+        start = bisect_left(vocabulary, prefix)
+        end = start
+        while end < len(vocabulary) and vocabulary[end].startswith(prefix):
+            end += 1
+        return vocabulary[start:end]
+
+    #文本中含有以prefix开头的单词的元素
+    def prefix(self, prefix) -> set:
+        result = set()
+        for word in self.words(prefix):
+            result.update(self.postings[word])
+        return result
+
+    #含有该单词的元素个数
+    def count(self, word) -> int:
+        return len(self.postings.get(word.lower(), ()))
+
+    #文本中可能含有这些单词的元素；words为[(小写的单词, 左侧是边界, 右侧是边界)]（见search.literal_words）
+    #有完整的单词时只查这些单词（从出现次数最少的开始求交集），其余的单词留给调用方核对；
+    #只有不完整的单词时，左侧是边界的按前缀二分查找，其余的扫描整个单词表
+    def candidates(self, words) -> set:
+        exact = sorted((self.postings.get(word, ()) for word, left, right in words if left and right), key=len)
+        result = None
+        for bucket in exact:
+            result = set(bucket) if result is None else result.intersection(bucket)
+            if not result:
+                return set()
+        if result is not None:
+            return result
+        for word, left, right in words:
+            if left:
+                elements = self.prefix(word)
+            else:
+                elements = set()
+                for token, bucket in self.postings.items():
+                    if token.endswith(word) if right else word in token:
+                        elements.update(bucket)
+            result = elements if result is None else result & elements
+            if not result:
+                return set()
+        return result
+
+    #把root下的一组元素按文档顺序排列
+    def ordered(self, elements, root) -> list:
+        if self._order is None and len(elements) <= _PATH_SORT_LIMIT:
+            return sorted(elements, key=tree_path)
+        if self._order is None:
+            self._order = {element: position for position, element in enumerate(preorder(root))}
+        return sorted(elements, key=self._order.__getitem__)
+
+    #把元素登记到tokens中的每个单词下，产出新出现的单词
+    def _add(self, element, tokens):
+        for token in tokens:
+            bucket = self.postings.get(token)
+            if bucket is None:
+                self.postings[token] = {element: None}
+                yield token
+            else:
+                bucket[element] = None
+
+    #把元素从tokens中的每个单词下移除，产出不再有元素的单词
+    def _discard(self, element, tokens):
+        for token in tokens:
+            bucket = self.postings.get(token)
+            if bucket is None:
+                continue
+            bucket.pop(element, None)
+            if not bucket:
+                del self.postings[token]
+                yield token
+
+    def _add_words(self, words) -> None:
+        if len(words) > _BULK_WORDS:
+            self.vocabulary.extend(words)
+            self.vocabulary.sort()
+        else:
+            for word in words:
+                insort(self.vocabulary, word)
+
+    def _remove_words(self, words) -> None:
+        if len(words) > _BULK_WORDS:
+            self.vocabulary = [word for word in self.vocabulary if word in self.postings]
+            return
+        for word in words:
+            i = bisect_left(self.vocabulary, word)
+            if i < len(self.vocabulary) and self.vocabulary[i] == word:
+                del self.vocabulary[i]
@@ -0,0 +1,114 @@
+import io
+from contextlib import redirect_stdout
+from model.file_manager import FileManager
+from model.commands import CompositeCommand
+
+
+#会话级事务：开始时记下会话状态，期间每一步对编辑器历史的操作连同命令登记在steps中，
+#期间的保存只写临时文件；提交时才把临时文件替换到位，并把每个编辑器在事务中新增的历史项合并为一项，
+#回滚时按相反顺序直接撤销或重做这些命令（不依赖撤销/重做栈，事务中撤销后又执行新命令时重做栈已被清空），
+#丢弃临时文件并恢复会话状态；事务期间编辑器的历史不压缩也不丢弃（hold），回滚后恢复的历史仍完整
+#Service层
+class Transaction:
+
+    def __init__(self, session) -> None:
+        self.session = session
+        self.editors = dict(session.editors)
+        self.active_editor = session.active_editor
+        self.showid = dict(session.showid)
+        self.spell = session.spell_service.key()
+        #编辑器 -> (历史快照, 历史位置, showid, 文档, 文档与磁盘同步的状态)，只记录事务开始前已打开的编辑器
+        #事务中每一步都单独占一项历史（不与前一步合并），回滚时才能逐步撤销
+        self.editor_states = {}
+        for editor in self.editors.values():
+            document = editor.document if editor.is_loaded() else None
+            state = document.saved_state() if document is not None else None
+            editor.history.seal()
+            editor.history.hold()
+            self.editor_states[editor] = (editor.history.snapshot(), editor.history.mark(), editor.showid, document, state)
+        #(操作, 编辑器, 命令)，操作为"do"（执行了一条编辑命令）、"undo"或"redo"，命令为被执行、撤销或重做的命令
+        self.steps = []
+        #期间保存的文件：(临时文件, 目标路径)
+        self.staged = []
+
+    def record(self, action, editor) -> None:
+        history = editor.history
+        history.hold()
+        history.seal()
+        self.steps.append((action, editor, history.last(redo=action == "undo")))
+
+    #事务涉及的编辑器：开始前已打开的和事务中修改过的
+    def _editors(self) -> set:
+        return set(self.editor_states) | {editor for _, editor, _ in self.steps}
+
+    #合并历史，把期间保存的文件替换到位，返回事务中的步数；
+    #有文件写入失败时内存中的修改仍然提交，抛出OSError说明哪些文件已经写入、哪些没有写入
+    def commit(self) -> int:
+        for editor in {editor for _, editor, _ in self.steps}:
+            self._fold_history(editor)
+        for editor in self._editors():
+            editor.history.release()
+        self._commit_files()
+        return len(self.steps)
+
+    #依次替换保存的文件；某个文件替换失败时丢弃其余的临时文件，没有写入的文档恢复为未保存的状态
+    def _commit_files(self) -> None:
+        written = []
+        for index, (temp_path, file_path) in enumerate(self.staged):
+            try:
+                FileManager.commit_write(temp_path, file_path)
+            except OSError as e:
+                remaining = self.staged[index:]
+                for rest, _ in remaining:
+                    FileManager.discard_write(rest)
+                missing = list(dict.fromkeys(path for _, path in remaining))
+                for path in missing:
+                    self._mark_unsaved(path)
+                raise OSError(f"Failed to write {file_path}: {e}. Written: {', '.join(written) or 'none'}; "
+                              f"not written: {', '.join(missing)}.") from e
+            written.append(file_path)
+
+    #文件没有写入：文档回到事务开始时与磁盘同步的状态（事务中打开的文档视为未保存）
+    def _mark_unsaved(self, file_path) -> None:
+        editor = self.session.editors.get(file_path)
+        if editor is None or not editor.is_loaded():
+            return
+        state = self.editor_states.get(editor)
+        if state is not None and state[3] is editor.document:
+            editor.document.restore_saved_state(state[4])
+        else:
+            editor.document.restore_saved_state((None, None))
+
+    #事务开始后新增的历史项合并为一个组合命令，整个事务只需一次撤销；
+    #事务没有留下修改（历史与开始时相同，例如执行后又撤销）时恢复开始时的历史，事务前的重做栈仍然可用
+    def _fold_history(self, editor) -> None:
+        state = self.editor_states.get(editor)
+        if state is not None and editor.history.snapshot()[0] == state[0][0]:
+            editor.history.restore(state[0])
+            return
+        mark = state[1] if state is not None else 0
+        editor.history.fold(mark, lambda commands: CompositeCommand(editor.document, commands))
+
+    #撤销事务中的全部修改，返回撤销的步数
+    def rollback(self) -> int:
+        with redirect_stdout(io.StringIO()):
+            for action, _, command in reversed(self.steps):
+                if action == "undo":
+                    command.redo()
+                else:
+                    command.undo()
+        for editor, (history, _, showid, document, state) in self.editor_states.items():
+            editor.history.restore(history)
+            editor.showid = showid
+            if document is not None:
+                document.restore_saved_state(state)
+        for editor in self._editors():
+            editor.history.release()
+        for temp_path, _ in self.staged:
+            FileManager.discard_write(temp_path)
+        session = self.session
+        session.editors = self.editors
+        session.active_editor = self.active_editor
+        session.showid = self.showid
+        session.spell_service.configure(*self.spell)
+        return len(self.steps)
@@ -0,0 +1,73 @@
+#元素树的遍历：全部用显式栈实现，树再深也不会触发RecursionError，也省去每个节点一次函数调用
+#children参数为取子节点的函数，默认取node.children，也可用于BeautifulSoup等其他树
+#Service层
+
+#walk产出的事件类型：进入节点（子节点之前）和离开节点（子节点之后）
+ENTER = 0
+EXIT = 1
+
+
+def _children_of(node):
+    return node.children
+
+
+#先序遍历：父节点先于子节点，兄弟节点按文档顺序
+def preorder(root, children=_children_of):
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        yield node
+        nodes = children(node)
+        if nodes:
+            stack.extend(reversed(nodes))
+
+
+#后序遍历：子节点全部产出后才产出父节点，适合删除、释放等需要先处理子树的操作
+#栈中done为True的项表示子节点已经处理完，轮到该节点本身
+def postorder(root, children=_children_of):
+    stack = [(root, False)]
+    while stack:
+        node, done = stack.pop()
+        if done:
+            yield node
+            continue
+        stack.append((node, True))
+        nodes = children(node)
+        if nodes:
+            for i in range(len(nodes) - 1, -1, -1):
+                stack.append((nodes[i], False))
+
+
+#进入/离开事件遍历，产出(事件, 节点, 深度, 是否为父节点的最后一个子节点)，根节点深度为0且视为最后一个；
+#每个节点先产出ENTER，其子树遍历完后产出EXIT，相当于递归遍历时函数的开头和结尾
+#max_depth不为None时不进入深度为max_depth的节点的子节点
+#栈中深度取反（~depth）的项表示该节点的EXIT
+def walk(root, children=_children_of, max_depth=None):
+    stack = [(root, 0, True)]
+    while stack:
+        node, depth, is_last = stack.pop()
+        if depth < 0:
+            yield EXIT, node, ~depth, is_last
+            continue
+        yield ENTER, node, depth, is_last
+        stack.append((node, ~depth, is_last))
+        if depth == max_depth:
+            continue
+        nodes = children(node)
+        if nodes:
+            depth += 1
+            stack.append((nodes[-1], depth, True))
+            for i in range(len(nodes) - 2, -1, -1):
+                stack.append((nodes[i], depth, False))
+
+
+#节点在树中的路径：从根开始每层在父节点的子节点中的下标（按对象本身查找），按路径比较即为先序（文档顺序）；
+#每层线性查找兄弟节点，代价为深度乘以兄弟节点数，只在需要比较少数节点的先后时使用
+def tree_path(node) -> list:
+    path = []
+    while node.parent is not None:
+        parent = node.parent
+        path.append(next(i for i, child in enumerate(parent.children) if child is node))
+        node = parent
+    path.reverse()
+    return path
@@ -0,0 +1,191 @@
+import hashlib
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from .html_element import HTMLElement
+from .traversal import preorder
+
+
+#解析结果的磁盘缓存：未修改过的html文件重新打开时直接反序列化元素树，跳过BeautifulSoup解析
+#每个文件一个缓存项，文件名为路径的哈希；缓存项记录源文件的mtime、大小和内容sha256，任一不符即失效
+#缓存项格式（小端）：
+#  MAGIC | mtime_ns(q) size(q) | sha256(32字节) | title在字符串表中的下标(i，-1表示无) | 字符串个数(I) 节点个数(I) 字符串字节长度(I)
+#  | 每个字符串的字符数(I数组) | 全部字符串拼接后的utf-8 | 节点表：先序排列，每个节点4个I：tag、id、content在字符串表中的下标、子元素个数
+#Service层
+class TreeCache:
+
+    MAGIC = b"HTC1"
+    _HEADER = struct.Struct("<qq32siIII")
+
+    def __init__(self, directory=".html_cache", max_bytes=256 * 1024 * 1024) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    #命中时返回与parse_html_file相同的(title, 根元素, id索引)，否则返回None
+    def load(self, file_path):
+        entry = self._entry_path(file_path)
+        try:
+            stat = os.stat(file_path)
+            with open(entry, "rb") as file:
+                data = file.read()
+        except OSError:
+            return None
+        if not data.startswith(self.MAGIC) or len(data) < len(self.MAGIC) + self._HEADER.size:
+            return None
+        mtime_ns, size, digest = self._HEADER.unpack_from(data, len(self.MAGIC))[:3]
+        if mtime_ns != stat.st_mtime_ns or size != stat.st_size or digest != self._file_digest(file_path):
+            return None
+        try:
+            parsed = self._decode(data)
+        except (ValueError, IndexError, struct.error, UnicodeDecodeError):
+            return None
+        #命中后更新修改时间，淘汰时按它判断最近使用
+        try:
+            os.utime(entry)
+        except OSError:
+            pass
+        return parsed
+
+    #写入缓存项，随后按容量上限淘汰最久未使用的项
+    def store(self, file_path, parsed) -> None:
+        try:
+            stat = os.stat(file_path)
+            digest = self._file_digest(file_path)
+            os.makedirs(self.directory, exist_ok=True)
+            data = self._encode(parsed, stat.st_mtime_ns, stat.st_size, digest)
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, self._entry_path(file_path))
+        except OSError:
+            return
+        self._evict()
+
+    #不带源文件信息的序列化，会话日志的检查点用它保存元素树
+    @classmethod
+    def dumps(cls, root) -> bytes:
+        return cls._encode((None, root, None), 0, 0, bytes(32))
+
+    #dumps的逆操作，返回(根元素, id索引)，数据损坏时抛出ValueError
+    @classmethod
+    def loads(cls, data):
+        if not data.startswith(cls.MAGIC) or len(data) < len(cls.MAGIC) + cls._HEADER.size:
+            raise ValueError("not a tree snapshot")
+        try:
+            _, root, index = cls._decode(data)
+        except (IndexError, struct.error, UnicodeDecodeError) as e:
+            raise ValueError(f"corrupt tree snapshot: {e}")
+        return root, index
+
+    def _entry_path(self, file_path) -> str:
+        key = hashlib.sha1(os.path.abspath(file_path).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key + ".bin")
+
+    @staticmethod
+    def _file_digest(file_path) -> bytes:
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                hasher.update(block)
+        return hasher.digest()
+
+    #总大小超过上限时，按最近使用时间从旧到新删除
+    def _evict(self) -> None:
+        entries = []
+        total = 0
+        try:
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if entry.name.endswith(".bin"):
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                        total += stat.st_size
+        except OSError:
+            return
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    @classmethod
+    def _encode(cls, parsed, mtime_ns, size, digest) -> bytes:
+        title, root, _ = parsed
+        positions = {}
+        strings = []
+        nodes = array("I")
+
+        def intern(text):
+            position = positions.get(text)
+            if position is None:
+                position = positions[text] = len(strings)
+                strings.append(text)
+            return position
+
+        for element in preorder(root):
+            nodes.extend((intern(element.tag), intern(element.id), intern(element.content), len(element.children)))
+        title_index = intern(title) if title is not None else -1
+        lengths = array("I", (len(text) for text in strings))
+        blob = "".join(strings).encode("utf-8")
+        if sys.byteorder == "big":
+            lengths.byteswap()
+            nodes.byteswap()
+        header = cls._HEADER.pack(mtime_ns, size, digest, title_index, len(strings), len(nodes) // 4, len(blob))
+        return b"".join((cls.MAGIC, header, lengths.tobytes(), blob, nodes.tobytes()))
+
+    @classmethod
+    def _decode(cls, data):
+        offset = len(cls.MAGIC)
+        _, _, _, title_index, string_count, node_count, blob_size = cls._HEADER.unpack_from(data, offset)
+        offset += cls._HEADER.size
+        lengths = array("I")
+        lengths.frombytes(data[offset:offset + 4 * string_count])
+        offset += 4 * string_count
+        text = data[offset:offset + blob_size].decode("utf-8")
+        offset += blob_size
+        nodes = array("I")
+        nodes.frombytes(data[offset:offset + 16 * node_count])
+        if sys.byteorder == "big":
+            lengths.byteswap()
+            nodes.byteswap()
+        if len(lengths) != string_count or len(nodes) != 4 * node_count or node_count == 0:
+            raise ValueError("truncated cache entry")
+
+        strings = []
+        start = 0
+        for length in lengths:
+            strings.append(text[start:start + length])
+            start += length
+
+        #按先序重建：栈中保存[元素, 还需挂上的子元素个数]
+        root = None
+        index = {}
+        stack = []
+        for i in range(0, len(nodes), 4):
+            element_id = strings[nodes[i + 1]]
+            element = HTMLElement(tag=strings[nodes[i]], content=strings[nodes[i + 2]], element_id=element_id)
+            bucket = index.get(element_id)
+            if bucket is None:
+                index[element_id] = [element]
+            else:
+                bucket.append(element)
+            if stack:
+                top = stack[-1]
+                top[0].add_child(element)
+                top[1] -= 1
+                if top[1] == 0:
+                    stack.pop()
+            else:
+                root = element
+            if nodes[i + 3]:
+                stack.append([element, nodes[i + 3]])
+        title = strings[title_index] if title_index >= 0 else None
+        return title, root, index